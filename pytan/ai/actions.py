@@ -0,0 +1,119 @@
+from pytan.core import hexmesh
+from pytan.core.state import GameStates
+from pytan.core.player import RESOURCES
+from functools import lru_cache
+import numpy as np
+
+# Discard patterns are listed for up to this many cards. Game accepts any
+# discard of at most half the hand, in the env bigger hands discard
+# MAX_DISCARD cards, as ids and as tuples alike.
+MAX_DISCARD = 10
+MIN_DISCARD = 4
+MAX_PLAYERS = 4
+
+def bounded_compositions(total: int, limits: tuple[int]):
+    # Every way to split total into counts with counts[i] <= limits[i], each
+    # distinct count vector once. Branches that cannot reach total are cut.
+    if len(limits) == 1:
+        if total <= limits[0]:
+            yield (total,)
+        return
+    rest = sum(limits[1:])
+    for n in range(min(total, limits[0]), max(0, total - rest) - 1, -1):
+        for counts in bounded_compositions(total - n, limits[1:]):
+            yield (n,) + counts
+
+class ActionCatalogue(object):
+    # A fixed integer id for every action the env can offer. Ids are templates,
+    # action() fills in what depends on the game (trade ratios, player ids).
+    def __init__(self, n_layers: int):
+        topology = hexmesh.get_topology(n_layers)
+        self._topology = topology
+        actions = [('roll', []), ('pass_turn', []), ('buy_dev_card', []), ('play_knight', []),
+                   ('play_road_builder', []), ('accept_trade', []), ('decline_trade', [])]
+        self.ROLL, self.PASS_TURN, self.BUY_DEV_CARD, self.PLAY_KNIGHT, self.PLAY_ROAD_BUILDER, \
+            self.ACCEPT_TRADE, self.DECLINE_TRADE = range(len(actions))
+
+        def section(templates: list) -> int:
+            start = len(actions)
+            actions.extend(templates)
+            return start
+
+        self.MONOPOLY = section([('play_monopoly', [card]) for card in RESOURCES])
+        self.YEAR_PLENTY = section([('play_year_plenty', (card1, card2)) for card1 in RESOURCES for card2 in RESOURCES])
+        self._trades = [(give, want) for give in RESOURCES for want in RESOURCES if want != give]
+        self.TRADE = section([('offer_trade', trade) for trade in self._trades])
+        self.ROAD = section([('build_road', [coord]) for coord in topology.edges])
+        self.SETTLEMENT = section([('build_settlement', [coord]) for coord in topology.nodes])
+        self.CITY = section([('build_city', [coord]) for coord in topology.nodes])
+        self.ROBBER = section([('move_robber', [coord]) for coord in topology.tiles])
+        self.STEAL = section([('steal', slot) for slot in range(MAX_PLAYERS)])
+        patterns = [pattern for total in range(MIN_DISCARD, MAX_DISCARD + 1) for pattern in bounded_compositions(total, (total,) * len(RESOURCES))]
+        self._discard_ids = {pattern: i for i, pattern in enumerate(patterns)}
+        self.DISCARD = section([('discard', [[(card, n) for card, n in zip(RESOURCES, pattern) if n > 0]]) for pattern in patterns])
+        self._actions = actions
+
+    @property
+    def size(self) -> int:
+        return len(self._actions)
+
+    def __len__(self) -> int:
+        return len(self._actions)
+
+    def action(self, i: int, game: 'Game') -> tuple:
+        # The action tuple of id i, as listed by CatanEnv.legal_actions
+        function, args = self._actions[i]
+        if function == 'offer_trade':
+            give, want = args
+            return (function, [[(give, game.best_trade_ratio(game.current_player.id, give))], [(want, 1)], []])
+        if function == 'steal':
+            return (function, [game.players[args].id])
+        return (function, args)
+
+    def mask(self, game: 'Game', discards: list[tuple[int]]) -> np.ndarray:
+        # The ids of CatanEnv.legal_actions, the discards it offers are passed
+        # in as count vectors as they may be capped or sampled
+        topology = self._topology
+        state = game.state
+        player = game.current_player
+        mask = np.zeros(len(self._actions), dtype=bool)
+        mask[self.ROLL] = bool(state.can_roll())
+        if state == GameStates.DISCARDING:
+            for discard in discards:
+                mask[self.DISCARD + self._discard_ids[discard]] = True
+        if state == GameStates.MOVING_ROBBER:
+            for coord in game.board.legal_robber_placements():
+                mask[self.ROBBER + topology.tile_index[coord]] = True
+        if state == GameStates.STEALING:
+            for victim in game.players_to_steal_from:
+                mask[self.STEAL + game.players.index(victim)] = True
+        if state == GameStates.ACCEPTING_TRADE:
+            mask[self.ACCEPT_TRADE] = mask[self.DECLINE_TRADE] = True
+        mask[self.BUY_DEV_CARD] = state.can_buy_dev_card()
+        mask[self.PLAY_KNIGHT] = state.can_play_knight()
+        if state.can_play_monopoly():
+            mask[self.MONOPOLY:self.MONOPOLY + len(RESOURCES)] = True
+        if state.can_play_year_plenty():
+            mask[self.YEAR_PLENTY:self.YEAR_PLENTY + len(RESOURCES) ** 2] = True
+        mask[self.PLAY_ROAD_BUILDER] = state.can_play_road_builder()
+        if state.can_trade():
+            hand = player.hand
+            for k, (give, want) in enumerate(self._trades):
+                if hand[RESOURCES.index(give)] >= game.best_trade_ratio(player.id, give):
+                    mask[self.TRADE + k] = True
+        if state.can_build_road() or state == GameStates.STARTING_ROAD:
+            for coord in game.legal_road_placements():
+                mask[self.ROAD + topology.edge_index[coord]] = True
+        if state.can_build_settlement() or state == GameStates.STARTING_SETTLEMENT:
+            for coord in game.legal_settlement_placements():
+                mask[self.SETTLEMENT + topology.node_index[coord]] = True
+        if state.can_build_city():
+            for coord in game.legal_city_placements():
+                mask[self.CITY + topology.node_index[coord]] = True
+        if state.can_pass_turn() and not mask.any():
+            mask[self.PASS_TURN] = True
+        return mask
+
+@lru_cache(maxsize=None)
+def action_catalogue(n_layers: int) -> ActionCatalogue:
+    return ActionCatalogue(n_layers)
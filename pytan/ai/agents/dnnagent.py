@@ -4,7 +4,6 @@ import torch.nn as nn
 import torch.optim as optim
 from torch.nn import functional as F
 import numpy as np
-from pytan.core.game import Game
 from pytan.core.player import Player
 from . import BotAgent
 
@@ -60,13 +59,13 @@ class DNNAgent(BotAgent):
 
         #print(game.get_state())
 
-        game = Game.create_from_state(env.game.get_state())
+        game = env.game
 
         scores = []
-        for function, args in actions:
-            getattr(game, function)(*args)
+        for action in actions:
+            token = game.apply(action)
             scores.append(self.score_state(env.get_state_vector(game)))
-            game.undo()
+            game.unapply(token)
         m = max(scores)
         c = scores.count(m)
         if c > 1:
@@ -2,7 +2,6 @@ import numpy as np
 import copy
 import random
 from pytan.core.player import Player
-from pytan.core.game import Game
 from . import BotAgent
 import uuid
 import math
@@ -28,13 +27,13 @@ class EvolutionAgent(BotAgent):
 
         #print(game.get_state())
 
-        game = Game.create_from_state(env.game.get_state())
+        game = env.game
 
         scores = []
-        for function, args in actions:
-            getattr(game, function)(*args)
+        for action in actions:
+            token = game.apply(action)
             scores.append(self.score(env.get_state_vector()))
-            game.undo()
+            game.unapply(token)
         m = max(scores)
         c = scores.count(m)
         if c > 1:
@@ -1,7 +1,6 @@
 import random
 import pytan
 from pytan.core.player import Player
-from pytan.core.game import Game
 from . import BotAgent
 
 class GreedyAgent(BotAgent):
@@ -15,13 +14,13 @@ class GreedyAgent(BotAgent):
 
         #print(game.get_state())
 
-        game = Game.create_from_state(env.game.get_state())
+        game = env.game
 
         scores = []
-        for function, args in actions:
-            getattr(game, function)(*args)
+        for action in actions:
+            token = game.apply(action)
             scores.append(self.score_state(game))
-            game.undo()
+            game.unapply(token)
         m = max(scores)
         c = scores.count(m)
         if c > 1:
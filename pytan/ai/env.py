@@ -1,28 +1,43 @@
 import random
-from itertools import combinations
+from itertools import islice
+from numbers import Integral
+import numpy as np
 import gym
 
 from pytan.core.game import Game
 from pytan.core.cards import ResourceCards
 from pytan.core.state import GameStates
-from pytan.core.ports import PortTypes
 from pytan.log.logging import Logger
 from pytan.ai.agents import Agent
+from pytan.ai.actions import action_catalogue, bounded_compositions, MAX_DISCARD
+from pytan.core.player import RESOURCES
+
+STATE_VECTOR_SIZE = 17
 
 class CatanEnv(gym.Env):
-    def __init__(self, agents: list[Agent], logger = None, verbose = False, manual = False):
+    def __init__(self, agents: list[Agent], logger = None, verbose = False, manual = False, lean = False, history_limit = None, rng = None, discard_limit = None, sample_discards = False, undoable = False):
         super(CatanEnv, self).__init__()
         self.name = 'catan'
         self.manual = manual
 
         self.agents = dict(zip([agent.player_id for agent in agents], agents))
 
-        self.game = Game(players=[agent.player for agent in agents], logger=logger)
+        self.game = Game(players=[agent.player for agent in agents], logger=logger, lean=lean, history_limit=history_limit, rng=rng)
+
+        # Lean games keep no history, undoable ones keep an undo token of the
+        # last step for unstep. Building it costs, so plain lean steps skip it.
+        self.undoable = undoable
+        self._undo_token = None
 
-        #self.valid_actions = []
+        # Actions are ids in a fixed catalogue, tuples from legal_actions are still accepted
+        self.catalogue = action_catalogue(self.game.board.n_layers)
+        self.action_space = gym.spaces.Discrete(self.catalogue.size)
+        self.observation_space = gym.spaces.Box(-np.inf, np.inf, (STATE_VECTOR_SIZE,), dtype=np.float32)
 
-        #self.action_space = gym.spaces.Discrete()
-        #self.observation_space = gym.spaces.Box(0, 1, (self.total_cards * self.total_positions + self.n_players + self.action_space.n ,))
+        # Agents that only need a few discard candidates can cap them, sampled
+        # ones are drawn at random instead of taking the first in order
+        self.discard_limit = discard_limit
+        self.sample_discards = sample_discards
 
         self.verbose = verbose
 
@@ -32,6 +47,10 @@ class CatanEnv(gym.Env):
 
     @property
     def legal_actions(self):
+        # Shared until the game changes, do not modify the returned list
+        return self.game.cached('legal_actions', self._legal_actions)
+
+    def _legal_actions(self):
         actions = []
         if self.game.state.can_roll():
             actions.append(('roll', []))
@@ -64,17 +83,56 @@ class CatanEnv(gym.Env):
 
         return actions
 
+    def legal_action_mask(self) -> np.ndarray:
+        # legal_actions as a bool vector over the catalogue ids, shared like legal_actions
+        return self.game.cached('legal_action_mask', self._legal_action_mask)
+
+    def _legal_action_mask(self):
+        discards = self.discard_vectors() if self.game.state == GameStates.DISCARDING else ()
+        return self.catalogue.mask(self.game, discards)
+
+    def action(self, action_id: int) -> tuple:
+        return self.catalogue.action(action_id, self.game)
+
     def is_legal(self, action):
+        if isinstance(action, Integral):
+            return bool(self.legal_action_mask()[action])
         return action in self.legal_actions
 
-    def get_discard_options(self):
-        actions = []
-        n = self.game.current_player.n_resource_cards // 2
-        discards = set(combinations(self.game.current_player.resource_cards_list, n))
-        for discard in discards:
-            unique = set(discard)
-            actions.append(('discard', [[(card, discard.count(card)) for card in unique]]))
-        return actions
+    def get_discard_options(self, limit = None, sample = None):
+        if limit is None and sample is None:
+            discards = self.discard_vectors()
+        else:
+            discards = self._discard_vectors(limit, sample)
+        return [('discard', [[(card, k) for card, k in zip(RESOURCES, discard) if k > 0]]) for discard in discards]
+
+    def discard_vectors(self):
+        # The discards of legal_actions, shared with legal_action_mask so sampled ones agree
+        return self.game.cached('discard_vectors', self._discard_vectors)
+
+    def _discard_vectors(self, limit = None, sample = None):
+        # Distinct discards as count vectors, at most limit of them. Half the
+        # hand up to MAX_DISCARD cards, the most the action catalogue lists.
+        limit = self.discard_limit if limit is None else limit
+        sample = self.sample_discards if sample is None else sample
+        hand = self.game.current_player.hand
+        n = min(sum(hand) // 2, MAX_DISCARD)
+        if sample and limit is not None:
+            return self.sample_discard_options(hand, n, limit)
+        return list(islice(bounded_compositions(n, hand), limit))
+
+    def sample_discard_options(self, hand, n, limit):
+        # Up to limit distinct discards, each n random cards of the hand
+        cards = [i for i, k in enumerate(hand) for _ in range(k)]
+        discards = {}
+        for _ in range(4 * limit):
+            discard = [0] * len(hand)
+            for i in random.sample(cards, n):
+                discard[i] += 1
+            discards[tuple(discard)] = None
+            if len(discards) == limit:
+                break
+        return list(discards)
 
     def get_valid_robber(self):
         return [('move_robber', [coord]) for coord in self.game.board.legal_robber_placements()]
@@ -108,11 +166,7 @@ class CatanEnv(gym.Env):
     def get_valid_trades(self):
         trades = []
         for g_card in ResourceCards:
-            e = 4
-            if self.game.board.is_player_on_port(self.game.current_player.id, PortTypes(g_card.value)):
-                e = 2
-            elif self.game.board.is_player_on_port(self.game.current_player.id, PortTypes.ANY):
-                e = 3
+            e = self.game.best_trade_ratio(self.game.current_player.id, g_card)
             n = self.game.current_player.count_resource_cards(g_card)
             if n >= e:
                 for w_card in [c for c in ResourceCards if c != g_card]:
@@ -120,13 +174,25 @@ class CatanEnv(gym.Env):
         return trades
     
     def reset(self):
+        self._undo_token = None
         self.game.start_game(randomize=True)
         return self.get_state_vector(self.game)
 
     def step(self, action):
+        """
+        Plays action, a catalogue id or a tuple from legal_actions. Illegal
+        actions are ignored. Discards are half the hand up to MAX_DISCARD cards,
+        limited by discard_limit and sample_discards, the same for ids and tuples.
+        """
+        self._undo_token = None
         if self.is_legal(action):
-            function, args = action
-            getattr(self.game, function)(*args)
+            if isinstance(action, Integral):
+                action = self.action(action)
+            if self.game.lean and self.undoable:
+                self._undo_token = self.game.apply(action)
+            else:
+                function, args = action
+                getattr(self.game, function)(*args)
         done = self.game.state == GameStates.GAME_OVER
         current_player = self.game.current_player
         if not self.game.has_rolled:
@@ -135,7 +201,15 @@ class CatanEnv(gym.Env):
         return self.get_state_vector(self.game), reward, done, None
     
     def unstep(self):
-        success = self.game.undo()
+        if self.game.lean:
+            if not self.undoable:
+                raise RuntimeError("Lean env is not undoable, create it with undoable=True")
+            success = self._undo_token is not None
+            if success:
+                self.game.unapply(self._undo_token)
+                self._undo_token = None
+        else:
+            success = self.game.undo()
         if not success:
             raise RuntimeError("Failed to undo")
     
@@ -5,7 +5,6 @@ import random
 import threading
 from pytan.core.player import Player
 from pytan.ai.agents.evolutionagent import EvolutionAgent
-from pytan.log.logging import Logger
 from pytan.ai.env import CatanEnv
 
 class Ecosystem():
@@ -69,7 +68,7 @@ def main():
     organism_creator = lambda : EvolutionAgent(Player('Player', uuid.uuid1().int, 'red'), [17, 8, 1], output='linear')
 
     def simulate_and_evaluate(agents):
-        env = CatanEnv(agents=agents, logger=Logger(log_file=None, console_log=False))
+        env = CatanEnv(agents=agents, lean=True)
         scores = []
         turns = []
         game = env.game
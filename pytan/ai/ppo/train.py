@@ -5,12 +5,10 @@ import torch
 from torch.nn import functional as F
 from torch import nn
 import numpy as np
-from pytan.core.game import Game
 from pytan.core.player import Player
 from pytan.ai.env import CatanEnv
 from pytan.ai.agents import DNNAgent
 from pytan.ai.agents.dnnagent import Policy
-from pytan.log.logging import Logger
 
 @click.command()
 @click.option('--checkpoint', type=str)
@@ -23,7 +21,7 @@ def main(checkpoint):
         DNNAgent(Player('P4', 3, 'orange'))
     ]
 
-    env = CatanEnv(agents, logger=Logger(log_file=None, console_log=False))
+    env = CatanEnv(agents, lean=True, undoable=True)
 
     policy = Policy()
 
@@ -52,7 +50,7 @@ def main(checkpoint):
                     print(env.game.state)
                     raise RuntimeError('No actions')
                 
-                game = Game.create_from_state(env.game.get_state())
+                game = env.game.fork()
 
                 values = []
                 for action in legal_actions:
@@ -0,0 +1,161 @@
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+import multiprocessing as mp
+import numpy as np
+import random
+import gym
+
+from pytan.ai.env import CatanEnv
+
+# Buffers shared by the workers, one row per env
+BUFFERS = {
+    'actions': np.int64,
+    'observations': np.float32,
+    'final_observations': np.float32,
+    'rewards': np.float32,
+    'terminated': np.bool_,
+    'legal_action_masks': np.bool_,
+}
+
+def _buffer_shapes(num_envs: int, observation_size: int, n_actions: int) -> dict[str, tuple]:
+    return {
+        'actions': (num_envs,),
+        'observations': (num_envs, observation_size),
+        'final_observations': (num_envs, observation_size),
+        'rewards': (num_envs,),
+        'terminated': (num_envs,),
+        'legal_action_masks': (num_envs, n_actions),
+    }
+
+def _attach(memory: dict[str, shared_memory.SharedMemory], shapes: dict[str, tuple]) -> dict[str, np.ndarray]:
+    return {name: np.ndarray(shapes[name], dtype=BUFFERS[name], buffer=memory[name].buf) for name in BUFFERS}
+
+def _worker(index: int, env_fn: callable, pipe: Connection, names: dict[str, str], shapes: dict[str, tuple]):
+    # Only commands go through the pipe, the data is read and written in place
+    memory = {name: shared_memory.SharedMemory(name=names[name]) for name in BUFFERS}
+    buffers = _attach(memory, shapes)
+    env = None
+    # Forked workers would otherwise share the parent's random state and deal the same games
+    random.seed()
+    try:
+        env = env_fn()
+        def observe(observation: list):
+            buffers['observations'][index] = observation
+            buffers['legal_action_masks'][index] = env.legal_action_mask()
+        while True:
+            command, arg = pipe.recv()
+            if command == 'reset':
+                if arg is not None:
+                    random.seed(arg)
+                observe(env.reset())
+            elif command == 'step':
+                observation, reward, done, _ = env.step(int(buffers['actions'][index]))
+                buffers['rewards'][index] = reward
+                buffers['terminated'][index] = done
+                if done:
+                    buffers['final_observations'][index] = observation
+                    observation = env.reset()
+                observe(observation)
+            elif command == 'close':
+                break
+            pipe.send((True, None))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception as e:
+        pipe.send((False, repr(e)))
+    finally:
+        del buffers
+        for block in memory.values():
+            block.close()
+        if env is not None:
+            env.close()
+
+class VectorCatanEnv(gym.vector.VectorEnv):
+    # K CatanEnvs in worker processes, stepped with catalogue action ids. Follows
+    # gym's vector envs: batched spaces, step returns (observations, rewards,
+    # terminated, truncated, infos) and finished envs reset themselves, their
+    # last observation is in infos['final_observation'].
+    def __init__(self, env_fns: list[callable], context: str = None):
+        env = env_fns[0]()
+        assert isinstance(env, CatanEnv)
+        observation_size = env.observation_space.shape[0]
+        super().__init__(len(env_fns), env.observation_space, env.action_space)
+        shapes = _buffer_shapes(self.num_envs, observation_size, env.catalogue.size)
+        env.close()
+
+        self._memory = {}
+        for name, dtype in BUFFERS.items():
+            nbytes = max(int(np.prod(shapes[name])) * np.dtype(dtype).itemsize, 1)
+            self._memory[name] = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._buffers = _attach(self._memory, shapes)
+        self._buffers['actions'][:] = 0
+
+        ctx = mp.get_context(context)
+        names = {name: block.name for name, block in self._memory.items()}
+        self._pipes = []
+        self._processes = []
+        for index, env_fn in enumerate(env_fns):
+            parent_pipe, child_pipe = ctx.Pipe()
+            process = ctx.Process(target=_worker, args=(index, env_fn, child_pipe, names, shapes), daemon=True)
+            process.start()
+            child_pipe.close()
+            self._pipes.append(parent_pipe)
+            self._processes.append(process)
+
+    @property
+    def legal_action_masks(self) -> np.ndarray:
+        # Legal action ids of every env after the last reset or step
+        return self._buffers['legal_action_masks'].copy()
+
+    def _send(self, command: str, args: list = None):
+        for i, pipe in enumerate(self._pipes):
+            pipe.send((command, None if args is None else args[i]))
+
+    def _wait(self):
+        errors = []
+        for i, pipe in enumerate(self._pipes):
+            success, error = pipe.recv()
+            if not success:
+                errors.append(f'worker {i}: {error}')
+        if errors:
+            raise RuntimeError('; '.join(errors))
+
+    def reset_async(self, seed: int = None, options: dict = None):
+        if seed is None or isinstance(seed, int):
+            seed = [None if seed is None else seed + i for i in range(self.num_envs)]
+        self._send('reset', seed)
+
+    def reset_wait(self, seed: int = None, options: dict = None) -> tuple[np.ndarray, dict]:
+        self._wait()
+        return self._buffers['observations'].copy(), {}
+
+    def step_async(self, actions: np.ndarray):
+        self._buffers['actions'][:] = actions
+        self._send('step')
+
+    def step_wait(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict]:
+        self._wait()
+        terminated = self._buffers['terminated'].copy()
+        infos = {}
+        if terminated.any():
+            infos['final_observation'] = self._buffers['final_observations'].copy()
+            infos['_final_observation'] = terminated
+        return (self._buffers['observations'].copy(), self._buffers['rewards'].copy(), terminated,
+                np.zeros(self.num_envs, dtype=bool), infos)
+
+    def close_extras(self, **kwargs):
+        for pipe, process in zip(self._pipes, self._processes):
+            if process.is_alive():
+                try:
+                    pipe.send(('close', None))
+                except (BrokenPipeError, OSError):
+                    pass
+        for pipe, process in zip(self._pipes, self._processes):
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            pipe.close()
+        del self._buffers
+        for block in self._memory.values():
+            block.close()
+            block.unlink()
@@ -37,7 +37,7 @@ def play_replay_file(replay_file):
     replaygui.pack()
     app.mainloop()
 
-def setup_catan_env(human_player, bot, log):
+def setup_catan_env(human_player, bot, log, lean=False):
     agents = []
     i = 0
     for h in human_player:
@@ -52,7 +52,7 @@ def setup_catan_env(human_player, bot, log):
         agents.append(agent)
         i += 1
 
-    env = CatanEnv(agents=agents, logger=Logger(log_file=(log if log else None), console_log=False))
+    env = CatanEnv(agents=agents, logger=None if lean else Logger(log_file=(log if log else None), console_log=False), lean=lean)
     return env
 
 def run_human_game(env, human_only_game):
@@ -152,7 +152,7 @@ def main(human_player, bot, replay_file, simulate, log, help):
         if bot_game:
             print('Bots: ', bot)
 
-        env = setup_catan_env(human_player, bot, log)
+        env = setup_catan_env(human_player, bot, log, lean=bool(simulate))
 
         if not simulate:
             if human_game:
@@ -0,0 +1,231 @@
+from pytan.core import hexmesh
+from pytan.core.board import Board
+from pytan.core.piece import PieceTypes, Piece
+from collections import namedtuple
+from collections.abc import MutableMapping
+from functools import lru_cache
+import numpy as np
+
+EMPTY = -1
+
+PIECE_TYPES = tuple(PieceTypes)
+
+AdjacencyArrays = namedtuple('AdjacencyArrays', ['node_nodes', 'node_edges', 'edge_nodes', 'edge_edges', 'tile_nodes'])
+
+@lru_cache(maxsize=None)
+def adjacency_arrays(n_layers: int) -> AdjacencyArrays:
+    # Neighbor index arrays padded with the index one past the end, which points
+    # at a sentinel slot in the occupancy vectors that always stays EMPTY
+    topology = hexmesh.get_topology(n_layers)
+    def padded(rows: tuple[tuple[int]], width: int, pad: int) -> np.ndarray:
+        a = np.full((len(rows), width), pad, dtype=np.intp)
+        for i, row in enumerate(rows):
+            a[i, :len(row)] = row
+        return a
+    return AdjacencyArrays(
+        padded(topology.node_node_indices, 3, topology.n_nodes),
+        padded(topology.node_edge_indices, 3, topology.n_edges),
+        padded(topology.edge_node_indices, 2, topology.n_nodes),
+        padded(topology.edge_edge_indices, 4, topology.n_edges),
+        padded(topology.tile_node_indices, 6, topology.n_nodes)
+    )
+
+class PieceView(MutableMapping):
+    # dict[int, Piece] facade over an owner/piece-type vector pair, pieces are built on access
+    def __init__(self, board: 'ArrayBoard', coords: tuple[int], index: dict[int, int], owner: np.ndarray, piece_type: np.ndarray):
+        self._board = board
+        self._coords = coords
+        self._index = index
+        self._owner = owner
+        self._piece_type = piece_type
+
+    def __getitem__(self, coord: int) -> Piece:
+        i = self._index[coord]
+        slot = self._owner[i]
+        if slot == EMPTY:
+            return None
+        return self._board.materialize(coord, slot, self._piece_type[i])
+
+    def __setitem__(self, coord: int, piece: Piece):
+        i = self._index[coord]
+        if piece is None:
+            self._owner[i] = EMPTY
+            self._piece_type[i] = EMPTY
+        else:
+            self._owner[i] = self._board.owner_slot(piece)
+            self._piece_type[i] = piece.piece_type.value
+
+    def __delitem__(self, coord: int):
+        self[coord] = None
+
+    def __iter__(self):
+        return iter(self._coords)
+
+    def __len__(self) -> int:
+        return len(self._coords)
+
+    def __contains__(self, coord: int) -> bool:
+        return coord in self._index
+
+    def copy(self) -> dict[int, Piece]:
+        pieces = dict.fromkeys(self._coords)
+        for i in np.flatnonzero(self._owner[:-1] != EMPTY):
+            coord = self._coords[i]
+            pieces[coord] = self._board.materialize(coord, self._owner[i], self._piece_type[i])
+        return pieces
+
+class ArrayBoard(Board):
+    # Board whose occupancy lives in small int8 vectors indexed by the dense topology
+    # indices. _nodes and _edges stay available as PieceView facades so the Piece
+    # based API keeps working, queries run as vector operations on the backend.
+    def __init__(self, *args, **kwargs):
+        self._owners = []
+        self._owner_slots = {}
+        super().__init__(*args, **kwargs)
+
+    def init_nodes(self):
+        n = self._topology.n_nodes
+        self._node_owner = np.full(n + 1, EMPTY, dtype=np.int8)
+        self._node_type = np.full(n + 1, EMPTY, dtype=np.int8)
+        self._nodes = PieceView(self, self._topology.nodes, self._topology.node_index, self._node_owner, self._node_type)
+
+    def init_edges(self):
+        n = self._topology.n_edges
+        self._edge_owner = np.full(n + 1, EMPTY, dtype=np.int8)
+        self._edge_type = np.full(n + 1, EMPTY, dtype=np.int8)
+        self._edges = PieceView(self, self._topology.edges, self._topology.edge_index, self._edge_owner, self._edge_type)
+
+    @property
+    def adjacency(self) -> AdjacencyArrays:
+        return adjacency_arrays(self._n_layers)
+
+    @property
+    def node_owners(self) -> np.ndarray:
+        return self._node_owner[:-1]
+
+    @property
+    def node_types(self) -> np.ndarray:
+        return self._node_type[:-1]
+
+    @property
+    def edge_owners(self) -> np.ndarray:
+        return self._edge_owner[:-1]
+
+    def owner_slot(self, piece: Piece) -> int:
+        slot = self._owner_slots.get(piece.owner_id)
+        if slot is None:
+            slot = len(self._owners)
+            self._owners.append((piece.owner_id, piece.owner_name, piece.color))
+            self._owner_slots[piece.owner_id] = slot
+        return slot
+
+    def materialize(self, coord: int, slot: int, piece_type: int) -> Piece:
+        owner_id, owner_name, color = self._owners[slot]
+        return Piece(coord, owner_id, owner_name, color, PIECE_TYPES[piece_type])
+
+    def _slot(self, player_id: int) -> int:
+        return self._owner_slots.get(player_id, -2)
+
+    def _node_pieces(self, mask: np.ndarray) -> dict[int, Piece]:
+        coords = self._topology.nodes
+        return {coords[i]: self.materialize(coords[i], self._node_owner[i], self._node_type[i]) for i in np.flatnonzero(mask)}
+
+    def _edge_pieces(self, mask: np.ndarray) -> dict[int, Piece]:
+        coords = self._topology.edges
+        return {coords[i]: self.materialize(coords[i], self._edge_owner[i], self._edge_type[i]) for i in np.flatnonzero(mask)}
+
+    def _blocked_node_mask(self) -> np.ndarray:
+        occupied = self._node_owner != EMPTY
+        return occupied[:-1] | occupied[self.adjacency.node_nodes].any(axis=1)
+
+    @property
+    def empty_nodes(self) -> list[int]:
+        coords = self._topology.nodes
+        return [coords[i] for i in np.flatnonzero(self.node_owners == EMPTY)]
+
+    @property
+    def empty_edges(self) -> list[int]:
+        coords = self._topology.edges
+        return [coords[i] for i in np.flatnonzero(self.edge_owners == EMPTY)]
+
+    @property
+    def occupied_nodes(self) -> dict[int, Piece]:
+        return self._node_pieces(self.node_owners != EMPTY)
+
+    @property
+    def occupied_edges(self) -> dict[int, Piece]:
+        return self._edge_pieces(self.edge_owners != EMPTY)
+
+    @property
+    def roads(self) -> dict[int, Piece]:
+        return self.occupied_edges
+
+    @property
+    def settlements(self) -> dict[int, Piece]:
+        return self._node_pieces(self.node_types == PieceTypes.SETTLEMENT.value)
+
+    @property
+    def cities(self) -> dict[int, Piece]:
+        return self._node_pieces(self.node_types == PieceTypes.CITY.value)
+
+    def is_player_on_tile(self, tile_coord: int, player_id: int) -> bool:
+        nodes = self.adjacency.tile_nodes[self._topology.tile_index[tile_coord]]
+        return bool((self._node_owner[nodes] == self._slot(player_id)).any())
+
+    def players_on_tile(self, tile_coord: int) -> list[int]:
+        nodes = self.adjacency.tile_nodes[self._topology.tile_index[tile_coord]]
+        slots = np.unique(self._node_owner[nodes])
+        return [self._owners[slot][0] for slot in slots if slot != EMPTY]
+
+    def _pieces_on_tile(self, tile_coord: int, piece_type: PieceTypes) -> dict[int, Piece]:
+        coords = self._topology.nodes
+        nodes = self.adjacency.tile_nodes[self._topology.tile_index[tile_coord]]
+        return {coords[i]: self.materialize(coords[i], self._node_owner[i], self._node_type[i]) for i in nodes[self._node_type[nodes] == piece_type.value]}
+
+    def settlements_on_tile(self, tile_coord: int) -> dict[int, Piece]:
+        return self._pieces_on_tile(tile_coord, PieceTypes.SETTLEMENT)
+
+    def cities_on_tile(self, tile_coord: int) -> dict[int, Piece]:
+        return self._pieces_on_tile(tile_coord, PieceTypes.CITY)
+
+    def settlement_neighboring_settlement(self, node_coord: int) -> bool:
+        nodes = self.adjacency.node_nodes[self._topology.node_index[node_coord]]
+        return bool((self._node_owner[nodes] != EMPTY).any())
+
+    def settlement_neighboring_friendly_road(self, node_coord: int, player_id: int) -> bool:
+        edges = self.adjacency.node_edges[self._topology.node_index[node_coord]]
+        return bool((self._edge_owner[edges] == self._slot(player_id)).any())
+
+    def _scan_legal_starting_settlement_placements(self, player_id: int) -> list[int]:
+        coords = self._topology.nodes
+        return [coords[i] for i in np.flatnonzero(~self._blocked_node_mask())]
+
+    def _scan_legal_settlement_placements(self, player_id: int) -> list[int]:
+        coords = self._topology.nodes
+        near_road = (self._edge_owner[self.adjacency.node_edges] == self._slot(player_id)).any(axis=1)
+        return [coords[i] for i in np.flatnonzero(~self._blocked_node_mask() & near_road)]
+
+    def _fork_pieces(self):
+        self._owners = self._owners.copy()
+        self._owner_slots = self._owner_slots.copy()
+        self._node_owner = self._node_owner.copy()
+        self._node_type = self._node_type.copy()
+        self._edge_owner = self._edge_owner.copy()
+        self._edge_type = self._edge_type.copy()
+        self._nodes = PieceView(self, self._topology.nodes, self._topology.node_index, self._node_owner, self._node_type)
+        self._edges = PieceView(self, self._topology.edges, self._topology.edge_index, self._edge_owner, self._edge_type)
+
+    def restore(self, state: dict):
+        super().restore(state)
+        nodes, edges = self._nodes, self._edges
+        self.init_nodes()
+        self.init_edges()
+        for coord, node in nodes.items():
+            self._nodes[coord] = node
+        for coord, edge in edges.items():
+            self._edges[coord] = edge
+        self._index_pieces()
+
+    @staticmethod
+    def create_from_state(state: dict) -> 'ArrayBoard':
+        return ArrayBoard(state=state)
@@ -0,0 +1,539 @@
+from pytan.core import hexmesh
+from pytan.core.arrayboard import adjacency_arrays
+from pytan.core.tiles import TILE_TYPES_TO_RESOURCE
+from pytan.core.piece import PieceTypes
+from pytan.core.state import GameStates
+from pytan.core.player import RESOURCES, ROAD_VECTOR, SETTLEMENT_VECTOR, CITY_VECTOR
+from pytan.core.longestroad import longest_trail, connected_roads
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+
+# N games stepped in lockstep, held as a structure of arrays. Covers the rules
+# of Game for the setup, rolls, production, the robber (discard, move, steal),
+# roads, settlements, cities, longest road and turn passing. Dev cards and
+# trades are not simulated. Node and edge vectors carry a sentinel slot at the
+# end that always stays EMPTY, as in ArrayBoard.
+EMPTY = -1
+MAX_PLAYERS = 4
+MAX_ROADS, MAX_SETTLEMENTS, MAX_CITIES = 15, 5, 4
+
+GAME_STATES = tuple(GameStates)
+PHASE = {state: i for i, state in enumerate(GAME_STATES)}
+STARTING_SETTLEMENT = PHASE[GameStates.STARTING_SETTLEMENT]
+STARTING_ROAD = PHASE[GameStates.STARTING_ROAD]
+INGAME = PHASE[GameStates.INGAME]
+DISCARDING = PHASE[GameStates.DISCARDING]
+MOVING_ROBBER = PHASE[GameStates.MOVING_ROBBER]
+STEALING = PHASE[GameStates.STEALING]
+GAME_OVER = PHASE[GameStates.GAME_OVER]
+
+SETTLEMENT = PieceTypes.SETTLEMENT.value
+CITY = PieceTypes.CITY.value
+
+COSTS = np.array([ROAD_VECTOR, SETTLEMENT_VECTOR, CITY_VECTOR], dtype=np.int16)
+ROAD_COST, SETTLEMENT_COST, CITY_COST = COSTS
+
+# Offsets of each action kind in the flat action ids of a legality mask
+ActionLayout = namedtuple('ActionLayout', ['roll', 'pass_turn', 'discard', 'road', 'settlement', 'city', 'robber', 'steal', 'size'])
+
+@lru_cache(maxsize=None)
+def action_layout(n_layers: int) -> ActionLayout:
+    topology = hexmesh.get_topology(n_layers)
+    road = 3
+    settlement = road + topology.n_edges
+    city = settlement + topology.n_nodes
+    robber = city + topology.n_nodes
+    steal = robber + topology.n_tiles
+    return ActionLayout(0, 1, 2, road, settlement, city, robber, steal, steal + MAX_PLAYERS)
+
+@lru_cache(maxsize=None)
+def node_tile_indices(n_layers: int) -> np.ndarray:
+    # Padded with the index one past the last tile
+    topology = hexmesh.get_topology(n_layers)
+    a = np.full((topology.n_nodes, 3), topology.n_tiles, dtype=np.intp)
+    for i, node in enumerate(topology.nodes):
+        tiles = [topology.tile_index[t] for t in topology.node_tiles[node] if t in topology.tile_index]
+        a[i, :len(tiles)] = tiles
+    return a
+
+class BatchGame(object):
+    def __init__(self, n_games: int, n_players: int, n_layers: int = 2, seed: int = None):
+        topology = hexmesh.get_topology(n_layers)
+        self._topology = topology
+        self._adjacency = adjacency_arrays(n_layers)
+        self._node_tiles = node_tile_indices(n_layers)
+        self._layout = action_layout(n_layers)
+        self._rng = np.random.default_rng(seed)
+        self._n_games = n_games
+        self._n_players = n_players
+        n, p = n_games, n_players
+
+        # Static per game: the board layout and the player ids
+        self._tile_resource = np.full((n, topology.n_tiles + 1), EMPTY, dtype=np.int8)
+        self._tile_prob = np.zeros((n, topology.n_tiles + 1), dtype=np.int8)
+        self._player_ids = np.zeros((n, p), dtype=np.int32)
+        self._points_to_win = np.full(n, 15 if p == 2 else 10, dtype=np.int16)
+
+        self._hands = np.zeros((n, p, len(RESOURCES)), dtype=np.int16)
+        self._bank = np.zeros((n, len(RESOURCES)), dtype=np.int16)
+        self._node_owner = np.full((n, topology.n_nodes + 1), EMPTY, dtype=np.int8)
+        self._node_type = np.full((n, topology.n_nodes + 1), EMPTY, dtype=np.int8)
+        self._edge_owner = np.full((n, topology.n_edges + 1), EMPTY, dtype=np.int8)
+        self._robber = np.zeros(n, dtype=np.int16)
+        self._phase = np.full(n, STARTING_SETTLEMENT, dtype=np.int8)
+        self._current_player = np.zeros(n, dtype=np.int8)
+        self._has_rolled = np.zeros(n, dtype=bool)
+        self._current_roll = np.zeros(n, dtype=np.int8)
+        self._turn = np.zeros(n, dtype=np.int32)
+
+        self._roads = np.zeros((n, p), dtype=np.int8)
+        self._settlements = np.zeros((n, p), dtype=np.int8)
+        self._cities = np.zeros((n, p), dtype=np.int8)
+        self._vps = np.zeros((n, p), dtype=np.int8)
+        self._last_settlement = np.full((n, p), topology.n_nodes, dtype=np.intp)
+        self._road_chain = np.zeros((n, p), dtype=np.int8)
+        self._longest_road = np.full(n, EMPTY, dtype=np.int8)
+        self._largest_army = np.full(n, EMPTY, dtype=np.int8)
+        # Discarding players go in player order, so the queue is a mask
+        self._discarding = np.zeros((n, p), dtype=bool)
+        self._victims = np.zeros((n, p), dtype=bool)
+
+    @staticmethod
+    def create_from_states(states: list[dict], seed: int = None) -> 'BatchGame':
+        # From Game.get_state() dicts of games with the same board size and player count
+        layout = states[0]['board']['layout']
+        batch = BatchGame(len(states), len(states[0]['players']), layout.n_layers, seed)
+        for i, state in enumerate(states):
+            batch._load(i, state)
+        return batch
+
+    def _load(self, i: int, state: dict):
+        topology = self._topology
+        board = state['board']
+        players = state['players']
+        slots = {player['id']: slot for slot, player in enumerate(players)}
+        for t, coord in enumerate(topology.tiles):
+            tile = board['layout'].tiles[coord]
+            resource = TILE_TYPES_TO_RESOURCE[tile.tile_type]
+            self._tile_resource[i, t] = EMPTY if resource is None else RESOURCES.index(resource)
+            self._tile_prob[i, t] = tile.prob
+        self._robber[i] = topology.tile_index[board['robber'].coord]
+        for v, node in enumerate(board['nodes']):
+            if node is not None:
+                self._node_owner[i, v] = slots[node.owner_id]
+                self._node_type[i, v] = node.piece_type.value
+        for e, edge in enumerate(board['edges']):
+            if edge is not None:
+                self._edge_owner[i, e] = slots[edge.owner_id]
+        for slot, player in enumerate(players):
+            self._player_ids[i, slot] = player['id']
+            self._hands[i, slot] = [player['resource_cards'].get(card, 0) for card in RESOURCES]
+            self._roads[i, slot] = player['roads']
+            self._settlements[i, slot] = player['settlements']
+            self._cities[i, slot] = player['cities']
+            self._vps[i, slot] = player['vps']
+            self._road_chain[i, slot] = player['longest_road_chain']
+            if player['last_settlement_built'] in topology.node_index:
+                self._last_settlement[i, slot] = topology.node_index[player['last_settlement_built']]
+        self._bank[i] = [state['resource_card_counts'][card] for card in RESOURCES]
+        self._points_to_win[i] = state['points_to_win']
+        self._phase[i] = PHASE[state['state']]
+        self._current_player[i] = state['current_player_idx']
+        self._has_rolled[i] = state['has_rolled']
+        self._current_roll[i] = state['current_roll']
+        self._turn[i] = state['turn']
+        self._longest_road[i] = slots.get(state['longest_road'], EMPTY)
+        self._largest_army[i] = slots.get(state['largest_army'], EMPTY)
+        for player_id in state['discarding_players']:
+            self._discarding[i, slots[player_id]] = True
+        for player_id in state['players_to_steal_from']:
+            self._victims[i, slots[player_id]] = True
+
+    @property
+    def n_games(self) -> int:
+        return self._n_games
+
+    @property
+    def n_players(self) -> int:
+        return self._n_players
+
+    @property
+    def topology(self) -> hexmesh.Topology:
+        return self._topology
+
+    @property
+    def action_layout(self) -> ActionLayout:
+        return self._layout
+
+    @property
+    def player_ids(self) -> np.ndarray:
+        return self._player_ids
+
+    @property
+    def hands(self) -> np.ndarray:
+        return self._hands
+
+    @property
+    def bank(self) -> np.ndarray:
+        return self._bank
+
+    @property
+    def node_owners(self) -> np.ndarray:
+        return self._node_owner[:, :-1]
+
+    @property
+    def node_types(self) -> np.ndarray:
+        return self._node_type[:, :-1]
+
+    @property
+    def edge_owners(self) -> np.ndarray:
+        return self._edge_owner[:, :-1]
+
+    @property
+    def robber(self) -> np.ndarray:
+        return self._robber
+
+    @property
+    def phase(self) -> np.ndarray:
+        # Indexes into GAME_STATES
+        return self._phase
+
+    @property
+    def current_player(self) -> np.ndarray:
+        # The player to act, which is the first discarding player while discarding
+        discarding = self._discarding.any(1)
+        return np.where(discarding, self._discarding.argmax(1), self._current_player).astype(np.int8)
+
+    @property
+    def current_turn_player(self) -> np.ndarray:
+        return self._current_player
+
+    @property
+    def has_rolled(self) -> np.ndarray:
+        return self._has_rolled
+
+    @property
+    def current_roll(self) -> np.ndarray:
+        return self._current_roll
+
+    @property
+    def turn(self) -> np.ndarray:
+        return self._turn
+
+    @property
+    def roads(self) -> np.ndarray:
+        return self._roads
+
+    @property
+    def settlements(self) -> np.ndarray:
+        return self._settlements
+
+    @property
+    def cities(self) -> np.ndarray:
+        return self._cities
+
+    @property
+    def longest_road_chains(self) -> np.ndarray:
+        return self._road_chain
+
+    @property
+    def longest_road(self) -> np.ndarray:
+        return self._longest_road
+
+    @property
+    def discarding(self) -> np.ndarray:
+        return self._discarding
+
+    @property
+    def victims(self) -> np.ndarray:
+        return self._victims
+
+    @property
+    def victory_points(self) -> np.ndarray:
+        slots = np.arange(self._n_players)
+        return self._settlements + 2 * self._cities + self._vps \
+            + 2 * (self._longest_road[:, None] == slots) + 2 * (self._largest_army[:, None] == slots)
+
+    @property
+    def is_over(self) -> np.ndarray:
+        return self._phase == GAME_OVER
+
+    def legal_mask(self) -> np.ndarray:
+        # N x action_layout.size, True where Game would accept the action
+        layout = self._layout
+        adjacency = self._adjacency
+        n = np.arange(self._n_games)
+        current = self._current_player.astype(np.int16)
+        hand = self._hands[n, current]
+        ingame = self._phase == INGAME
+        rolled = ingame & self._has_rolled
+        mask = np.zeros((self._n_games, layout.size), dtype=bool)
+        mask[:, layout.roll] = ingame & ~self._has_rolled
+        mask[:, layout.pass_turn] = rolled
+        mask[:, layout.discard] = self._phase == DISCARDING
+
+        node_owner = self._node_owner
+        edge_owner = self._edge_owner
+        free_edges = edge_owner[:, :-1] == EMPTY
+        # A road extends from an own piece, or from an own road with no enemy piece at either end
+        edge_nodes = node_owner[:, adjacency.edge_nodes]
+        own_node = (edge_nodes == current[:, None, None]).any(2)
+        enemy_node = ((edge_nodes != EMPTY) & (edge_nodes != current[:, None, None])).any(2)
+        extends = np.zeros_like(edge_owner, dtype=bool)
+        extends[:, :-1] = (edge_owner[:, :-1] == current[:, None]) & ~enemy_node
+        roads = free_edges & (own_node | extends[:, adjacency.edge_edges].any(2))
+        can_road = rolled & (hand >= ROAD_COST).all(1) & (self._roads[n, current] < MAX_ROADS)
+        starting_road = np.zeros_like(edge_owner, dtype=bool)
+        starting = np.flatnonzero(self._phase == STARTING_ROAD)
+        last = self._last_settlement[starting, current[starting]]
+        starting_road[starting[:, None], adjacency.node_edges[last]] = True
+        mask[:, layout.road:layout.settlement] = (roads & can_road[:, None]) | (starting_road[:, :-1] & free_edges)
+
+        occupied = node_owner != EMPTY
+        open_nodes = ~(occupied[:, :-1] | occupied[:, adjacency.node_nodes].any(2))
+        own_road = (edge_owner[:, adjacency.node_edges] == current[:, None, None]).any(2)
+        can_settle = rolled & (hand >= SETTLEMENT_COST).all(1) & (self._settlements[n, current] < MAX_SETTLEMENTS)
+        settlements = open_nodes & ((own_road & can_settle[:, None]) | (self._phase == STARTING_SETTLEMENT)[:, None])
+        mask[:, layout.settlement:layout.city] = settlements
+
+        can_city = rolled & (hand >= CITY_COST).all(1) & (self._cities[n, current] < MAX_CITIES)
+        own_settlements = (node_owner[:, :-1] == current[:, None]) & (self._node_type[:, :-1] == SETTLEMENT)
+        mask[:, layout.city:layout.robber] = own_settlements & can_city[:, None]
+
+        tiles = np.arange(self._topology.n_tiles)
+        mask[:, layout.robber:layout.steal] = (self._phase == MOVING_ROBBER)[:, None] & (tiles != self._robber[:, None])
+        mask[:, layout.steal:layout.steal + self._n_players] = (self._phase == STEALING)[:, None] & self._victims
+        return mask
+
+    def step(self, actions: np.ndarray, dice: np.ndarray = None, discards: np.ndarray = None, stolen: np.ndarray = None) -> np.ndarray:
+        # One action id per game, -1 skips the game. Illegal actions are ignored
+        # as Game ignores them, the returned mask tells which ones were applied.
+        # dice (rolls), discards (N x 5 cards) and stolen (resource indexes)
+        # replace the random outcomes of the games that roll, discard or steal,
+        # by default discards are half the hand at random.
+        layout = self._layout
+        actions = np.asarray(actions)
+        legal = self.legal_mask()[np.arange(self._n_games), np.clip(actions, 0, layout.size - 1)]
+        applied = (actions >= 0) & legal
+
+        def games(start: int, stop: int) -> np.ndarray:
+            return np.flatnonzero(applied & (actions >= start) & (actions < stop))
+
+        idx = games(layout.roll, layout.roll + 1)
+        if len(idx):
+            self._roll(idx, None if dice is None else np.asarray(dice)[idx])
+        idx = games(layout.pass_turn, layout.pass_turn + 1)
+        if len(idx):
+            self._pass_turn(idx)
+        idx = games(layout.discard, layout.discard + 1)
+        if len(idx):
+            cards = self._random_discards(idx) if discards is None else np.asarray(discards, dtype=np.int16)[idx]
+            applied[idx] = self._discard(idx, cards)
+        idx = games(layout.road, layout.settlement)
+        if len(idx):
+            self._build_road(idx, actions[idx] - layout.road)
+        idx = games(layout.settlement, layout.city)
+        if len(idx):
+            self._build_settlement(idx, actions[idx] - layout.settlement)
+        idx = games(layout.city, layout.robber)
+        if len(idx):
+            self._build_city(idx, actions[idx] - layout.city)
+        idx = games(layout.robber, layout.steal)
+        if len(idx):
+            self._move_robber(idx, actions[idx] - layout.robber)
+        idx = games(layout.steal, layout.size)
+        if len(idx):
+            self._steal(idx, actions[idx] - layout.steal, None if stolen is None else np.asarray(stolen)[idx])
+
+        # As Game.notify, any player can have reached the points to win
+        over = applied & (self.victory_points >= self._points_to_win[:, None]).any(1)
+        self._phase[over] = GAME_OVER
+        return applied
+
+    def _pay(self, idx: np.ndarray, cost: np.ndarray):
+        self._hands[idx, self._current_player[idx]] -= cost
+        self._bank[idx] += cost
+
+    def _roll(self, idx: np.ndarray, dice: np.ndarray = None):
+        if dice is None:
+            dice = self._rng.integers(1, 7, size=(len(idx), 2)).sum(1)
+        self._has_rolled[idx] = True
+        self._current_roll[idx] = dice
+        seven = dice == 7
+        robber = idx[seven]
+        if len(robber):
+            self._discarding[robber] = self._hands[robber].sum(2) > 7
+            self._phase[robber] = np.where(self._discarding[robber].any(1), DISCARDING, MOVING_ROBBER)
+        producing = idx[~seven]
+        if len(producing):
+            self._produce(producing, dice[~seven])
+
+    def _produce(self, idx: np.ndarray, dice: np.ndarray):
+        tile_nodes = self._adjacency.tile_nodes
+        n_tiles = self._topology.n_tiles
+        resource = self._tile_resource[idx, :n_tiles]
+        producing = (self._tile_prob[idx, :n_tiles] == dice[:, None]) & (resource != EMPTY) \
+            & (np.arange(n_tiles) != self._robber[idx, None])
+        owner = self._node_owner[idx][:, tile_nodes]
+        amount = np.where(self._node_type[idx][:, tile_nodes] == CITY, 2, 1) * (producing[:, :, None] & (owner != EMPTY))
+        slots = owner[..., None] == np.arange(self._n_players)
+        cards = resource[..., None] == np.arange(len(RESOURCES))
+        pickups = np.einsum('kts,ktsp,ktr->kpr', amount, slots, cards)
+        quantity = pickups.sum(1)
+        # Game hands out in order of each player's first production, tile by
+        # tile, and checks the total of a card against what the bank has left
+        first = (np.arange(n_tiles)[:, None] * 3 + amount) * 6 + np.arange(6)
+        first = np.where(slots & (amount > 0)[..., None], first[..., None], np.iinfo(np.int64).max).min((1, 2))
+        order = np.argsort(first, axis=1, kind='stable')
+        ordered = np.take_along_axis(pickups, order[:, :, None], 1)
+        before = np.cumsum(ordered, 1) - ordered
+        granted = np.where(quantity[:, None] < self._bank[idx, None] - before, ordered, 0)
+        given = np.zeros_like(pickups)
+        np.put_along_axis(given, order[:, :, None], granted, 1)
+        self._hands[idx] += given.astype(np.int16)
+        self._bank[idx] -= given.sum(1).astype(np.int16)
+
+    def _pass_turn(self, idx: np.ndarray):
+        n = self._n_players
+        self._has_rolled[idx] = False
+        self._turn[idx] += 1
+        turn = self._turn[idx]
+        # The setup goes round once forward and once backward
+        d = np.where((turn == n) | (turn == 2 * n), 0, np.where((turn >= n + 1) & (turn < 2 * n), -1, 1))
+        self._phase[idx[turn >= 2 * n]] = INGAME
+        self._current_player[idx] = (self._current_player[idx] + d) % n
+
+    def _random_discards(self, idx: np.ndarray) -> np.ndarray:
+        # Half the hand, drawn a card at a time without replacement
+        hand = self._hands[idx, self._discarding[idx].argmax(1)].copy()
+        cards = np.zeros_like(hand)
+        left = hand.sum(1) // 2
+        for _ in range(left.max()):
+            drawing = left > 0
+            k = self._rng.integers(0, np.maximum(hand.sum(1), 1))
+            card = (np.cumsum(hand, 1) > k[:, None]).argmax(1)
+            rows = np.flatnonzero(drawing)
+            hand[rows, card[rows]] -= 1
+            cards[rows, card[rows]] += 1
+            left -= drawing
+        return cards
+
+    def _discard(self, idx: np.ndarray, cards: np.ndarray) -> np.ndarray:
+        player = self._discarding[idx].argmax(1)
+        hand = self._hands[idx, player]
+        valid = (cards.sum(1) <= hand.sum(1) // 2) & (cards >= 0).all(1) & (cards <= hand).all(1)
+        idx, player, cards = idx[valid], player[valid], cards[valid]
+        self._hands[idx, player] -= cards
+        self._bank[idx] += cards
+        self._discarding[idx, player] = False
+        done = idx[~self._discarding[idx].any(1)]
+        self._phase[done] = MOVING_ROBBER
+        return valid
+
+    def _build_road(self, idx: np.ndarray, edges: np.ndarray):
+        current = self._current_player[idx]
+        self._edge_owner[idx, edges] = current
+        self._roads[idx, current] += 1
+        starting = self._phase[idx] == STARTING_ROAD
+        self._pay(idx[~starting], ROAD_COST)
+        self._update_longest_road(idx, [[slot] for slot in current])
+        self._phase[idx[starting]] = STARTING_SETTLEMENT
+        self._pass_turn(idx[starting])
+
+    def _build_settlement(self, idx: np.ndarray, nodes: np.ndarray):
+        current = self._current_player[idx]
+        # Enemy roads on the node may be cut in two
+        owners = self._edge_owner[idx[:, None], self._adjacency.node_edges[nodes]]
+        split = [set(row[(row != EMPTY) & (row != slot)].tolist()) for row, slot in zip(owners, current)]
+        self._node_owner[idx, nodes] = current
+        self._node_type[idx, nodes] = SETTLEMENT
+        self._settlements[idx, current] += 1
+        self._last_settlement[idx, current] = nodes
+        starting = self._phase[idx] == STARTING_SETTLEMENT
+        self._pay(idx[~starting], SETTLEMENT_COST)
+        second = starting & (self._settlements[idx, current] == 2)
+        if second.any():
+            self._collect(idx[second], nodes[second])
+        self._phase[idx[starting]] = STARTING_ROAD
+        self._update_longest_road(idx, split)
+
+    def _collect(self, idx: np.ndarray, nodes: np.ndarray):
+        # The second starting settlement picks up one card from each of its tiles
+        tiles = self._node_tiles[nodes]
+        resource = self._tile_resource[idx[:, None], tiles]
+        producing = (resource != EMPTY) & (tiles != self._robber[idx, None])
+        cards = ((resource[..., None] == np.arange(len(RESOURCES))) & producing[..., None]).sum(1).astype(np.int16)
+        cards *= cards < self._bank[idx]
+        self._hands[idx, self._current_player[idx]] += cards
+        self._bank[idx] -= cards
+
+    def _build_city(self, idx: np.ndarray, nodes: np.ndarray):
+        current = self._current_player[idx]
+        self._node_type[idx, nodes] = CITY
+        self._settlements[idx, current] -= 1
+        self._cities[idx, current] += 1
+        self._pay(idx, CITY_COST)
+
+    def _move_robber(self, idx: np.ndarray, tiles: np.ndarray):
+        self._robber[idx] = tiles
+        current = self._current_player[idx]
+        owners = self._node_owner[idx[:, None], self._adjacency.tile_nodes[tiles]]
+        on_tile = (owners[..., None] == np.arange(self._n_players)).any(1)
+        self._victims[idx] = on_tile & (self._hands[idx].sum(2) > 0) & (np.arange(self._n_players) != current[:, None])
+        self._phase[idx] = np.where(self._victims[idx].any(1), STEALING, INGAME)
+
+    def _steal(self, idx: np.ndarray, victims: np.ndarray, stolen: np.ndarray = None):
+        hand = self._hands[idx, victims]
+        if stolen is None:
+            # Every card in the hand is equally likely
+            k = self._rng.integers(0, hand.sum(1))
+            stolen = (np.cumsum(hand, 1) > k[:, None]).argmax(1)
+        self._hands[idx, victims, stolen] -= 1
+        self._hands[idx, self._current_player[idx], stolen] += 1
+        self._victims[idx] = False
+        self._phase[idx] = INGAME
+
+    def _longest_chain(self, i: int, slot: int) -> int:
+        topology = self._topology
+        node_owner = self._node_owner[i]
+        roads = {topology.edges[e] for e in np.flatnonzero(self._edge_owner[i, :-1] == slot)}
+        def is_blocked(node_coord: int) -> bool:
+            owner = node_owner[topology.node_index[node_coord]]
+            return owner != EMPTY and owner != slot
+        return max((longest_trail(component, topology, is_blocked) for component in connected_roads(roads, topology, is_blocked)), default=0)
+
+    def _update_longest_road(self, idx: np.ndarray, slots: list[list[int]]):
+        # reducer._update_longest_road per game, road chains are not vectorized
+        for i, touched in zip(idx.tolist(), slots):
+            if not touched:
+                continue
+            for slot in touched:
+                self._road_chain[i, slot] = self._longest_chain(i, slot)
+            chains = self._road_chain[i]
+            best = chains.max()
+            holder = self._longest_road[i]
+            if holder != EMPTY and chains[holder] == best and best >= 5:
+                continue
+            leaders = np.flatnonzero(chains == best)
+            self._longest_road[i] = leaders[0] if best >= 5 and len(leaders) == 1 else EMPTY
+
+    def game_action(self, i: int, action: int, discard: np.ndarray = None) -> tuple:
+        # The Game action of action id in game i
+        layout = self._layout
+        topology = self._topology
+        if action == layout.roll:
+            return ('roll', [])
+        if action == layout.pass_turn:
+            return ('pass_turn', [])
+        if action == layout.discard:
+            return ('discard', [[(RESOURCES[r], int(n)) for r, n in enumerate(discard) if n > 0]])
+        if action < layout.settlement:
+            return ('build_road', [topology.edges[action - layout.road]])
+        if action < layout.city:
+            return ('build_settlement', [topology.nodes[action - layout.settlement]])
+        if action < layout.robber:
+            return ('build_city', [topology.nodes[action - layout.city]])
+        if action < layout.steal:
+            return ('move_robber', [topology.tiles[action - layout.robber]])
+        return ('steal', [int(self._player_ids[i, action - layout.steal])])
@@ -0,0 +1,207 @@
+from pytan.core import hexmesh
+from pytan.core.board import Board
+from pytan.core.player import Player
+from collections import namedtuple, defaultdict
+from functools import lru_cache
+
+AdjacencyMasks = namedtuple('AdjacencyMasks', ['node_nodes', 'node_edges', 'edge_nodes', 'edge_edges', 'all_nodes', 'all_edges'])
+
+@lru_cache(maxsize=None)
+def adjacency_masks(n_layers: int) -> AdjacencyMasks:
+    # Per dense index, the neighbors packed as bits of a python int
+    topology = hexmesh.get_topology(n_layers)
+    def masks(rows: tuple[tuple[int]]) -> tuple[int]:
+        return tuple(sum(1 << i for i in row) for row in rows)
+    return AdjacencyMasks(
+        masks(topology.node_node_indices),
+        masks(topology.node_edge_indices),
+        masks(topology.edge_node_indices),
+        masks(topology.edge_edge_indices),
+        (1 << topology.n_nodes) - 1,
+        (1 << topology.n_edges) - 1
+    )
+
+def iter_bits(mask: int):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def spread(mask: int, table: tuple[int]) -> int:
+    # OR of the adjacency masks of every set bit
+    result = 0
+    for i in iter_bits(mask):
+        result |= table[i]
+    return result
+
+class BitBoard(Board):
+    # Board that mirrors occupancy into python int bitboards, node and edge bits
+    # follow the dense topology indices. Legality becomes a few AND/OR operations
+    # and the *_mask methods expose the raw masks for search code.
+    @property
+    def masks(self) -> AdjacencyMasks:
+        return adjacency_masks(self._n_layers)
+
+    def _index_pieces(self):
+        super()._index_pieces()
+        node_index = self._topology.node_index
+        edge_index = self._topology.edge_index
+        self._road_bits = defaultdict(int)
+        self._settlement_bits = defaultdict(int)
+        self._city_bits = defaultdict(int)
+        for player_id, roads in self._player_roads.items():
+            for coord in roads:
+                self._road_bits[player_id] |= 1 << edge_index[coord]
+        for player_id, nodes in self._player_settlements.items():
+            for coord in nodes:
+                self._settlement_bits[player_id] |= 1 << node_index[coord]
+        for player_id, nodes in self._player_cities.items():
+            for coord in nodes:
+                self._city_bits[player_id] |= 1 << node_index[coord]
+        masks = self.masks
+        self._occupied_node_bits = 0
+        self._occupied_edge_bits = 0
+        self._road_node_bits = defaultdict(int)
+        for player_id in list(self._settlement_bits) + list(self._city_bits):
+            self._occupied_node_bits |= self.piece_mask(player_id)
+        for player_id, roads in self._road_bits.items():
+            self._occupied_edge_bits |= roads
+            self._road_node_bits[player_id] = spread(roads, masks.edge_nodes)
+        self._blocked_node_bits = self._occupied_node_bits | spread(self._occupied_node_bits, masks.node_nodes)
+
+    def _fork_indexes(self):
+        super()._fork_indexes()
+        self._road_bits = self._road_bits.copy()
+        self._settlement_bits = self._settlement_bits.copy()
+        self._city_bits = self._city_bits.copy()
+        self._road_node_bits = self._road_node_bits.copy()
+
+    def road_mask(self, player_id: int) -> int:
+        return self._road_bits[player_id]
+
+    def settlement_mask(self, player_id: int) -> int:
+        return self._settlement_bits[player_id]
+
+    def city_mask(self, player_id: int) -> int:
+        return self._city_bits[player_id]
+
+    def piece_mask(self, player_id: int) -> int:
+        return self._settlement_bits[player_id] | self._city_bits[player_id]
+
+    @property
+    def occupied_node_mask(self) -> int:
+        return self._occupied_node_bits
+
+    @property
+    def occupied_edge_mask(self) -> int:
+        return self._occupied_edge_bits
+
+    @property
+    def blocked_node_mask(self) -> int:
+        return self._blocked_node_bits
+
+    def legal_starting_settlement_mask(self) -> int:
+        return self.masks.all_nodes & ~self._blocked_node_bits
+
+    def legal_settlement_mask(self, player_id: int) -> int:
+        return self._road_node_bits[player_id] & ~self._blocked_node_bits
+
+    def legal_road_mask(self, player_id: int) -> int:
+        masks = self.masks
+        own_nodes = self.piece_mask(player_id)
+        enemy_nodes = self._occupied_node_bits & ~own_nodes
+        # Roads touching an enemy piece do not extend the network
+        open_roads = self._road_bits[player_id] & ~spread(enemy_nodes, masks.node_edges)
+        reach = spread(own_nodes, masks.node_edges) | spread(open_roads, masks.edge_edges)
+        return reach & ~self._occupied_edge_bits
+
+    def legal_city_mask(self, player_id: int) -> int:
+        return self._settlement_bits[player_id]
+
+    def _node_coords(self, mask: int) -> list[int]:
+        nodes = self._topology.nodes
+        return [nodes[i] for i in iter_bits(mask)]
+
+    def _edge_coords(self, mask: int) -> list[int]:
+        edges = self._topology.edges
+        return [edges[i] for i in iter_bits(mask)]
+
+    def legal_road_placements(self, player_id: int) -> list[int]:
+        placements = self._edge_coords(self.legal_road_mask(player_id))
+        if self.check_incremental:
+            self._check_placements('legal_road_placements', placements, self._scan_legal_road_placements(player_id))
+        return placements
+
+    def legal_starting_settlement_placements(self, player_id: int) -> list[int]:
+        placements = self._node_coords(self.legal_starting_settlement_mask())
+        if self.check_incremental:
+            self._check_placements('legal_starting_settlement_placements', placements, self._scan_legal_starting_settlement_placements(player_id))
+        return placements
+
+    def legal_settlement_placements(self, player_id: int) -> list[int]:
+        placements = self._node_coords(self.legal_settlement_mask(player_id))
+        if self.check_incremental:
+            self._check_placements('legal_settlement_placements', placements, self._scan_legal_settlement_placements(player_id))
+        return placements
+
+    def legal_city_placements(self, player_id: int) -> list[int]:
+        return self._node_coords(self.legal_city_mask(player_id))
+
+    def build_road(self, edge_coord: int, player: Player) -> bool:
+        if super().build_road(edge_coord, player):
+            i = self._topology.edge_index[edge_coord]
+            self._road_bits[player.id] |= 1 << i
+            self._occupied_edge_bits |= 1 << i
+            self._road_node_bits[player.id] |= self.masks.edge_nodes[i]
+            return True
+        return False
+
+    def build_settlement(self, node_coord: int, player: Player) -> bool:
+        if super().build_settlement(node_coord, player):
+            i = self._topology.node_index[node_coord]
+            self._settlement_bits[player.id] |= 1 << i
+            self._occupied_node_bits |= 1 << i
+            self._blocked_node_bits |= (1 << i) | self.masks.node_nodes[i]
+            return True
+        return False
+
+    def build_city(self, node_coord: int, player: Player) -> bool:
+        if super().build_city(node_coord, player):
+            bit = 1 << self._topology.node_index[node_coord]
+            self._settlement_bits[player.id] &= ~bit
+            self._city_bits[player.id] |= bit
+            return True
+        return False
+
+    def unbuild_road(self, edge_coord: int) -> bool:
+        player_id = self._edges[edge_coord].owner_id if self._edges[edge_coord] else None
+        if super().unbuild_road(edge_coord):
+            bit = 1 << self._topology.edge_index[edge_coord]
+            self._road_bits[player_id] &= ~bit
+            self._occupied_edge_bits &= ~bit
+            self._road_node_bits[player_id] = spread(self._road_bits[player_id], self.masks.edge_nodes)
+            return True
+        return False
+
+    def unbuild_settlement(self, node_coord: int) -> bool:
+        player_id = self._nodes[node_coord].owner_id if self._nodes[node_coord] else None
+        if super().unbuild_settlement(node_coord):
+            bit = 1 << self._topology.node_index[node_coord]
+            self._settlement_bits[player_id] &= ~bit
+            self._occupied_node_bits &= ~bit
+            self._blocked_node_bits = self._occupied_node_bits | spread(self._occupied_node_bits, self.masks.node_nodes)
+            return True
+        return False
+
+    def unbuild_city(self, node_coord: int) -> bool:
+        if super().unbuild_city(node_coord):
+            node = self._nodes[node_coord]
+            bit = 1 << self._topology.node_index[node_coord]
+            self._city_bits[node.owner_id] &= ~bit
+            self._settlement_bits[node.owner_id] |= bit
+            return True
+        return False
+
+    @staticmethod
+    def create_from_state(state: dict) -> 'BitBoard':
+        return BitBoard(state=state)
@@ -1,40 +1,130 @@
 from pytan.core import hexmesh
 from pytan.core.piece import PieceTypes, Piece, place_piece
-from pytan.core.ports import PortTypes, Port, PORT_TYPE_COUNTS
+from pytan.core.ports import PortTypes, Port, port_type_counts
 from pytan.core.tiles import *
 from pytan.core.player import Player
+from collections import defaultdict, namedtuple
 import random
-import copy
+
+# Everything fixed once the seed is set. Snapshots share it by reference, so the
+# tiles and ports dicts are never modified after setup, set_seed builds new ones.
+BoardLayout = namedtuple('BoardLayout', ['n_layers', 'seed', 'tiles', 'ports'])
 
 class Board(hexmesh.HexMesh):
-    def __init__(self, seed: float = random.random()):
-        super().__init__(n_layers = 2)
+    # Verify the incremental placement sets against full board scans on every query
+    check_incremental = False
+
+    def __init__(self, seed: float = random.random(), n_layers: int = 2, state: dict = None):
+        super().__init__(n_layers = n_layers if state is None else state['layout'].n_layers)
         self._prng = random.Random()
-        self.set_seed(seed)
-        self.reset()
+        if state is None:
+            self.set_seed(seed)
+            self.reset()
+        else:
+            # Skip generating a layout the snapshot would replace
+            self.restore(state)
         
     def reset(self):
         self.init_nodes()
         self.init_edges()
+        self._index_pieces()
+
+    def _index_pieces(self):
+        # Per player coords of owned pieces, kept in sync by the build methods
+        self._player_roads = defaultdict(set)
+        self._player_settlements = defaultdict(set)
+        self._player_cities = defaultdict(set)
+        for coord, edge in self._edges.items():
+            if isinstance(edge, Piece):
+                self._player_roads[edge.owner_id].add(coord)
+        for coord, node in self._nodes.items():
+            if isinstance(node, Piece):
+                if node.piece_type == PieceTypes.SETTLEMENT:
+                    self._player_settlements[node.owner_id].add(coord)
+                elif node.piece_type == PieceTypes.CITY:
+                    self._player_cities[node.owner_id].add(coord)
+        self._index_placements()
+
+    def fork(self) -> 'Board':
+        # Independent copy sharing the layout, skips the get_state/restore round trip
+        board = type(self).__new__(type(self))
+        board.__dict__.update(self.__dict__)
+        board._fork_pieces()
+        board._fork_indexes()
+        return board
+
+    def _fork_pieces(self):
+        # Runs on the shallow copy, replaces the containers still shared with the original
+        self._nodes = self._nodes.copy()
+        self._edges = self._edges.copy()
+
+    def _fork_indexes(self):
+        def sets(index: defaultdict) -> defaultdict:
+            return defaultdict(set, {key: value.copy() for key, value in index.items()})
+        self._player_roads = sets(self._player_roads)
+        self._player_settlements = sets(self._player_settlements)
+        self._player_cities = sets(self._player_cities)
+        self._blocked_nodes = self._blocked_nodes.copy()
+        self._open_nodes = self._open_nodes.copy()
+        self._settlement_frontier = sets(self._settlement_frontier)
+        self._road_frontier = sets(self._road_frontier)
+
+    def _index_placements(self):
+        # Nodes ruled out by the distance rule, and per player frontiers of legal
+        # settlement nodes and road edges, updated by the build methods
+        topology = self._topology
+        self._blocked_nodes = set()
+        for nodes in list(self._player_settlements.values()) + list(self._player_cities.values()):
+            for coord in nodes:
+                self._blocked_nodes.add(coord)
+                self._blocked_nodes.update(topology.node_nodes[coord])
+        self._open_nodes = set(self._nodes) - self._blocked_nodes
+        self._settlement_frontier = defaultdict(set)
+        self._road_frontier = defaultdict(set)
+        for player_id, roads in self._player_roads.items():
+            for road in roads:
+                for coord in topology.edge_nodes[road]:
+                    if coord not in self._blocked_nodes:
+                        self._settlement_frontier[player_id].add(coord)
+                if not self.road_neighboring_enemy_settlement(road, player_id):
+                    for coord in topology.edge_edges[road]:
+                        if self._edges[coord] is None:
+                            self._road_frontier[player_id].add(coord)
+        for player_id, nodes in list(self._player_settlements.items()) + list(self._player_cities.items()):
+            for node in nodes:
+                for coord in topology.node_edges[node]:
+                    if self._edges[coord] is None:
+                        self._road_frontier[player_id].add(coord)
+
+    def _ordered_nodes(self, coords: set[int]) -> list[int]:
+        return sorted(coords, key=self._topology.node_index.__getitem__)
+
+    def _ordered_edges(self, coords: set[int]) -> list[int]:
+        return sorted(coords, key=self._topology.edge_index.__getitem__)
 
     def set_seed(self, seed: int):
         self._seed = seed
         self._prng.seed(self._seed)
         self.setup_tiles()
         self.setup_ports()
+        self._layout = BoardLayout(self._n_layers, self._seed, self._tiles, self._ports)
 
     def setup_tiles(self):
+        self._tiles = dict.fromkeys(self._topology.tiles)
         self._robber = None
         
         available_tiles = []
         available_probs = []
 
-        for tile in TILE_COUNTS:
-            for _ in range(TILE_COUNTS[tile]):
+        # Distributions scale with the mesh, the 2 layer board gets the standard counts
+        tiles = tile_counts(self._n_tiles)
+        for tile in tiles:
+            for _ in range(tiles[tile]):
                 available_tiles.append(tile)
 
-        for prob in PROB_COUNTS:
-            for _ in range(PROB_COUNTS[prob]):
+        probs = prob_counts(self._n_tiles - tiles[TileTypes.DESERT])
+        for prob in probs:
+            for _ in range(probs[prob]):
                 available_probs.append(prob)
 
         for coord in self._tiles:
@@ -57,31 +147,46 @@ class Board(hexmesh.HexMesh):
         for i in range(rotate):
             edge_tiles.append(edge_tiles.pop(0))
 
+        # Every fourth tile around the coast is left without a port
+        n_ports = sum(1 for j in range(2, len(edge_tiles) + 2) if j % 4 != 0)
         available_ports = []
-        for port_type in PORT_TYPE_COUNTS:
-            for _ in range(PORT_TYPE_COUNTS[port_type]):
+        port_types = port_type_counts(n_ports)
+        for port_type in port_types:
+            for _ in range(port_types[port_type]):
                 available_ports.append(port_type)
 
-        directions = [hexmesh.Directions.NE, hexmesh.Directions.E, hexmesh.Directions.SE, hexmesh.Directions.SW, hexmesh.Directions.W, hexmesh.Directions.NW]
-        
-        dir_to_tile = hexmesh.direction_to_tile(edge_tiles[0], edge_tiles[1])
-        i = directions.index(dir_to_tile) - 2
+        port_nodes = set()
+        sides = 0
         j = 2
         for tile in edge_tiles:
+            coast = self._coast_directions(tile)
+            if len(coast) == 3:
+                # Corner tiles face straight out
+                preferred = [coast[1], coast[0], coast[2]]
+            else:
+                # Tiles along a side alternate between their two coastal edges
+                preferred = [coast[1], coast[0]] if sides % 2 == 0 else [coast[0], coast[1]]
+                sides += 1
             if j % 4 != 0:
-                port_dir = directions[i]
-                if (j+1) % 4 != 0:
-                    i += 1
-                    if i > len(directions) - 1:
-                        i = 0
-                edge = hexmesh.edge_in_direction(tile, port_dir)
-                node1, node2 = tuple(self.edge_neighboring_nodes(edge).keys())
+                # Skip edges that would share a node with an earlier port
+                nodes = [tuple(self.edge_neighboring_nodes(hexmesh.edge_in_direction(tile, d, self._topology.base)).keys()) for d in preferred]
+                k = next((k for k, pair in enumerate(nodes) if port_nodes.isdisjoint(pair)), 0)
+                port_dir = preferred[k]
+                node1, node2 = nodes[k]
+                port_nodes.update(nodes[k])
                 port_type = self._prng.choice(available_ports)
                 available_ports.remove(port_type)
                 self._ports[tile] = Port(node1, node2, tile, port_dir, port_type)
 
             j += 1
 
+    def _coast_directions(self, tile_coord: int) -> list[hexmesh.Directions]:
+        # Directions of the tile edges on the outside of the mesh, clockwise
+        directions = [hexmesh.Directions.NE, hexmesh.Directions.E, hexmesh.Directions.SE, hexmesh.Directions.SW, hexmesh.Directions.W, hexmesh.Directions.NW]
+        coastal = [len(self._topology.edge_tiles[hexmesh.edge_in_direction(tile_coord, d, self._topology.base)]) == 1 for d in directions]
+        start = next(i for i in range(len(directions)) if coastal[i] and not coastal[i - 1])
+        return [directions[(start + i) % 6] for i in range(6) if coastal[(start + i) % 6]]
+
     @property
     def roads(self) -> dict[int, Piece]:
         return {coord: edge for coord, edge in self._edges.items() if type(edge) == Piece and edge.piece_type == PieceTypes.ROAD}
@@ -102,15 +207,6 @@ class Board(hexmesh.HexMesh):
     def robber(self) -> Piece:
         return self._robber
 
-    def is_player_on_port(self, player_id: int, port_type: PortTypes) -> bool:
-        for port in self._ports.values():
-            if port.port_type == port_type:
-                p1 = self._nodes[port.coord_1]
-                p2 = self._nodes[port.coord_2]
-                if (type(p1) == Piece and p1.owner_id == player_id) or (type(p2) == Piece  and p2.owner_id == player_id):
-                    return True
-        return False
-
     def is_player_on_tile(self, tile_coord: int, player_id: int) -> bool:
         for node_coord in self.tile_neighboring_nodes(tile_coord):
             node = self._nodes[node_coord]
@@ -153,22 +249,22 @@ class Board(hexmesh.HexMesh):
         return cities
     
     def friendly_roads(self, player_id: int) -> dict[int, Piece]:
-        return {coord: edge for coord, edge in self.occupied_edges.items() if type(edge) == Piece and edge.owner_id == player_id}
+        return {coord: self._edges[coord] for coord in self._ordered_edges(self._player_roads[player_id])}
 
     def friendly_settlements(self, player_id: int) -> dict[int, Piece]:
-        return {coord: node for coord, node in self.occupied_nodes.items() if isinstance(node, Piece) and node.piece_type == PieceTypes.SETTLEMENT and node.owner_id == player_id}
+        return {coord: self._nodes[coord] for coord in self._ordered_nodes(self._player_settlements[player_id])}
  
     def friendly_cities(self, player_id: int) -> dict[int, Piece]:
-        return {coord: node for coord, node in self.occupied_nodes.items() if isinstance(node, Piece) and node.piece_type == PieceTypes.CITY and node.owner_id == player_id}
+        return {coord: self._nodes[coord] for coord in self._ordered_nodes(self._player_cities[player_id])}
 
     def friendly_pieces(self, player_id: int) -> list[Piece]:
         pieces = []
         for edge in self.friendly_roads(player_id).values():
             pieces.append(edge)
         for node in self.friendly_settlements(player_id).values():
-            pieces.append(edge)
+            pieces.append(node)
         for node in self.friendly_cities(player_id).values():
-            pieces.append(edge)
+            pieces.append(node)
         return pieces
 
     def settlement_neighboring_settlement(self, node_coord: int) -> bool:
@@ -200,28 +296,50 @@ class Board(hexmesh.HexMesh):
         return False
     
     def open_ended_roads(self, player_id: int) -> list[int]:
-        roads = self.friendly_roads(player_id)
+        roads = self._player_roads[player_id]
         def is_open(edge_coord: int) -> bool:
-            d1, d2 = hexmesh.hex_digits(edge_coord)
-            if d1 % 2 == 0 and d2 % 2 == 0:
-                if edge_coord + hexmesh.EE_DIRS['SE'] not in roads and edge_coord + hexmesh.EE_DIRS['SW']not in roads:
-                    return True
-                elif edge_coord + hexmesh.EE_DIRS['NE'] not in roads and edge_coord + hexmesh.EE_DIRS['NW']not in roads:
-                    return True
-            elif d1 % 2 == 0:
-                if edge_coord + hexmesh.EE_DIRS['NE'] not in roads and edge_coord + hexmesh.EE_DIRS['E']not in roads:
-                    return True
-                elif edge_coord + hexmesh.EE_DIRS['SW'] not in roads and edge_coord + hexmesh.EE_DIRS['W']not in roads:
-                    return True
-            else:
-                if edge_coord + hexmesh.EE_DIRS['E'] not in roads and edge_coord + hexmesh.EE_DIRS['SE']not in roads:
-                    return True
-                elif edge_coord + hexmesh.EE_DIRS['W'] not in roads and edge_coord + hexmesh.EE_DIRS['NW']not in roads:
+            for node in self._topology.edge_nodes[edge_coord]:
+                if not any(edge in roads for edge in self._topology.node_edges[node] if edge != edge_coord):
                     return True
             return False
-        return [road for road in roads if is_open(road)]
+        return [road for road in self.friendly_roads(player_id) if is_open(road)]
+
+    def _is_legal_road(self, edge_coord: int, player_id: int) -> bool:
+        if self._edges[edge_coord] is not None:
+            return False
+        for coord in self._topology.edge_nodes[edge_coord]:
+            node = self._nodes[coord]
+            if node is not None and node.owner_id == player_id:
+                return True
+        for coord in self._topology.edge_edges[edge_coord]:
+            edge = self._edges[coord]
+            if edge is not None and edge.owner_id == player_id and not self.road_neighboring_enemy_settlement(coord, player_id):
+                return True
+        return False
+
+    def _check_placements(self, name: str, placements: list[int], expected: list[int]):
+        if set(placements) != set(expected):
+            raise AssertionError(f'{name} out of sync: incremental {sorted(placements)} != scan {sorted(expected)}')
 
     def legal_road_placements(self, player_id: int) -> list[int]:
+        placements = self._ordered_edges(self._road_frontier[player_id])
+        if self.check_incremental:
+            self._check_placements('legal_road_placements', placements, self._scan_legal_road_placements(player_id))
+        return placements
+
+    def legal_starting_settlement_placements(self, player_id: int) -> list[int]:
+        placements = self._ordered_nodes(self._open_nodes)
+        if self.check_incremental:
+            self._check_placements('legal_starting_settlement_placements', placements, self._scan_legal_starting_settlement_placements(player_id))
+        return placements
+
+    def legal_settlement_placements(self, player_id: int) -> list[int]:
+        placements = self._ordered_nodes(self._settlement_frontier[player_id])
+        if self.check_incremental:
+            self._check_placements('legal_settlement_placements', placements, self._scan_legal_settlement_placements(player_id))
+        return placements
+
+    def _scan_legal_road_placements(self, player_id: int) -> list[int]:
         legal_road_placements = []
         for piece in self.friendly_pieces(player_id):
             edges = []
@@ -236,14 +354,14 @@ class Board(hexmesh.HexMesh):
                     legal_road_placements.append(coord)
         return list(set(legal_road_placements))
 
-    def legal_starting_settlement_placements(self, player_id: int) -> list[int]:
+    def _scan_legal_starting_settlement_placements(self, player_id: int) -> list[int]:
         legal_settlement_placements = []
         for coord in self.empty_nodes:
             if not self.settlement_neighboring_settlement(coord):
                 legal_settlement_placements.append(coord)
         return legal_settlement_placements
     
-    def legal_settlement_placements(self, player_id: int) -> list[int]:
+    def _scan_legal_settlement_placements(self, player_id: int) -> list[int]:
         legal_settlement_placements = []
         for coord in self.empty_nodes:
             if not self.settlement_neighboring_settlement(coord) and self.settlement_neighboring_friendly_road(coord, player_id):
@@ -251,16 +369,22 @@ class Board(hexmesh.HexMesh):
         return legal_settlement_placements
 
     def legal_city_placements(self, player_id: int) -> list[int]:
-        legal_city_placements = []
-        for coord, node in self.occupied_nodes.items():
-            if isinstance(node, Piece) and node.piece_type == PieceTypes.SETTLEMENT and node.owner_id == player_id:
-                legal_city_placements.append(coord)
-        return legal_city_placements
+        return self._ordered_nodes(self._player_settlements[player_id])
 
     def build_road(self, edge_coord: int, player: Player) -> bool:
         edge = self._edges[edge_coord]
         if not edge:
             self._edges[edge_coord] = place_piece(edge_coord, player.id, player.name, player.color, PieceTypes.ROAD)
+            self._player_roads[player.id].add(edge_coord)
+            for frontier in self._road_frontier.values():
+                frontier.discard(edge_coord)
+            for coord in self._topology.edge_nodes[edge_coord]:
+                if coord not in self._blocked_nodes:
+                    self._settlement_frontier[player.id].add(coord)
+            if not self.road_neighboring_enemy_settlement(edge_coord, player.id):
+                for coord in self._topology.edge_edges[edge_coord]:
+                    if self._edges[coord] is None:
+                        self._road_frontier[player.id].add(coord)
             return True
         return False
         
@@ -268,6 +392,22 @@ class Board(hexmesh.HexMesh):
         node = self._nodes[node_coord]
         if not node:
             self._nodes[node_coord] = place_piece(node_coord, player.id, player.name, player.color, PieceTypes.SETTLEMENT)
+            self._player_settlements[player.id].add(node_coord)
+            for coord in (node_coord,) + self._topology.node_nodes[node_coord]:
+                self._blocked_nodes.add(coord)
+                self._open_nodes.discard(coord)
+                for frontier in self._settlement_frontier.values():
+                    frontier.discard(coord)
+            for coord in self._topology.node_edges[node_coord]:
+                edge = self._edges[coord]
+                if edge is None:
+                    self._road_frontier[player.id].add(coord)
+                elif edge.owner_id != player.id:
+                    # Enemy roads touching the new settlement stop extending the network
+                    frontier = self._road_frontier[edge.owner_id]
+                    for e_coord in self._topology.edge_edges[coord]:
+                        if e_coord in frontier and not self._is_legal_road(e_coord, edge.owner_id):
+                            frontier.discard(e_coord)
             return True
         return False
     
@@ -276,60 +416,103 @@ class Board(hexmesh.HexMesh):
         if isinstance(node, Piece) and node.piece_type == PieceTypes.SETTLEMENT:
             if node.owner_id == player.id:
                 self._nodes[node_coord] = place_piece(node_coord, player.id, player.name, player.color, PieceTypes.CITY)
+                self._player_settlements[player.id].discard(node_coord)
+                self._player_cities[player.id].add(node_coord)
                 return True
         return False
 
-    def _neighboring_friendly_roads(self, road_coord: int, player_id: int) -> list[int]:
-        return [coord for coord, road in self.edge_neighboring_edges(road_coord).items() if type(road) == Piece and road.owner_id == player_id]
-
-    def find_longest_road_chain(self, player_id: int) -> int:
-        roads = self.open_ended_roads(player_id)
-        if not any(roads):
-            return 0
-        chains = []
-        for road in roads:
-            explored = set()
-            explored.add(road)
-            chains.append(self._explore_road(road, player_id, explored, 1))
-        return max(chains)
-
-    def _explore_road(self, road_coord: int, player_id: int, explored: set, chain_length: int):
-        neighbors = self._neighboring_friendly_roads(road_coord, player_id)
-        unexplored_neighbors = list(set(neighbors) - explored)
-        if any(unexplored_neighbors):
-            explored_copy = explored.copy()
-            explored_copy.update(unexplored_neighbors)
-            chain_length += 1
-            chain_length = max([self._explore_road(neighbor, player_id, explored_copy, chain_length) for neighbor in unexplored_neighbors])
-        return chain_length
+    # Inverses of the build methods for make/unmake search, each keeps the indexes in sync
+
+    def _piece_owners(self, node_coords: tuple[int], edge_coords: tuple[int]) -> set[int]:
+        pieces = [self._nodes[coord] for coord in node_coords] + [self._edges[coord] for coord in edge_coords]
+        return {piece.owner_id for piece in pieces if piece is not None}
+
+    def unbuild_road(self, edge_coord: int) -> bool:
+        edge = self._edges[edge_coord]
+        if isinstance(edge, Piece) and edge.piece_type == PieceTypes.ROAD:
+            player_id = edge.owner_id
+            topology = self._topology
+            self._edges[edge_coord] = None
+            self._player_roads[player_id].discard(edge_coord)
+            for owner_id in self._piece_owners(topology.edge_nodes[edge_coord], topology.edge_edges[edge_coord]):
+                if self._is_legal_road(edge_coord, owner_id):
+                    self._road_frontier[owner_id].add(edge_coord)
+            frontier = self._road_frontier[player_id]
+            for coord in topology.edge_edges[edge_coord]:
+                if coord in frontier and not self._is_legal_road(coord, player_id):
+                    frontier.discard(coord)
+            roads = self._player_roads[player_id]
+            for coord in topology.edge_nodes[edge_coord]:
+                if not any(e_coord in roads for e_coord in topology.node_edges[coord]):
+                    self._settlement_frontier[player_id].discard(coord)
+            return True
+        return False
+
+    def unbuild_settlement(self, node_coord: int) -> bool:
+        node = self._nodes[node_coord]
+        if isinstance(node, Piece) and node.piece_type == PieceTypes.SETTLEMENT:
+            player_id = node.owner_id
+            topology = self._topology
+            self._nodes[node_coord] = None
+            self._player_settlements[player_id].discard(node_coord)
+            for coord in (node_coord,) + topology.node_nodes[node_coord]:
+                if self._nodes[coord] is None and all(self._nodes[n_coord] is None for n_coord in topology.node_nodes[coord]):
+                    self._blocked_nodes.discard(coord)
+                    self._open_nodes.add(coord)
+                    for owner_id in self._piece_owners((), topology.node_edges[coord]):
+                        self._settlement_frontier[owner_id].add(coord)
+            frontier = self._road_frontier[player_id]
+            for coord in topology.node_edges[node_coord]:
+                if coord in frontier and not self._is_legal_road(coord, player_id):
+                    frontier.discard(coord)
+            for coord in topology.node_edges[node_coord]:
+                edge = self._edges[coord]
+                if edge is not None and edge.owner_id != player_id:
+                    # Enemy roads through the node extend the network again
+                    for e_coord in topology.edge_edges[coord]:
+                        if self._is_legal_road(e_coord, edge.owner_id):
+                            self._road_frontier[edge.owner_id].add(e_coord)
+            return True
+        return False
+
+    def unbuild_city(self, node_coord: int) -> bool:
+        node = self._nodes[node_coord]
+        if isinstance(node, Piece) and node.piece_type == PieceTypes.CITY:
+            self._nodes[node_coord] = place_piece(node_coord, node.owner_id, node.owner_name, node.color, PieceTypes.SETTLEMENT)
+            self._player_cities[node.owner_id].discard(node_coord)
+            self._player_settlements[node.owner_id].add(node_coord)
+            return True
+        return False
+
+    @property
+    def layout(self) -> BoardLayout:
+        return self._layout
 
     def get_state(self) -> dict:
+        # Occupancy as tuples in topology order, the static layout is shared
         return {
-            'tiles': self._tiles.copy(),
-            'nodes': self._nodes.copy(),
-            'edges': self._edges.copy(),
-            'ports': self._ports.copy(),
-            'n_tiles': self._n_tiles,
-            'n_layers': self._n_layers,
-            'robber': copy.copy(self._robber),
-            'seed': self._seed,
+            'layout': self._layout,
+            'nodes': tuple(self._nodes.values()),
+            'edges': tuple(self._edges.values()),
+            'robber': self._robber,
         }
 
     def restore(self, state: dict):
-        self._tiles = state['tiles'].copy()
-        self._nodes = state['nodes'].copy()
-        self._edges = state['edges'].copy()
-        self._ports = state['ports'].copy()
-        self._n_tiles = state['n_tiles']
-        self._n_layers = state['n_layers']
-        self._robber = copy.copy(state['robber'])
-        self._seed = state['seed']
+        self._layout = state['layout']
+        self._tiles = self._layout.tiles
+        self._ports = self._layout.ports
+        self._seed = self._layout.seed
+        self._n_layers = self._layout.n_layers
+        self._n_tiles = len(self._tiles)
+        self._topology = hexmesh.get_topology(self._n_layers)
+        self._nodes = dict(zip(self._topology.nodes, state['nodes']))
+        self._edges = dict(zip(self._topology.edges, state['edges']))
+        self._robber = state['robber']
+        self._index_pieces()
 
     @staticmethod
     def create_from_state(state: dict) -> 'Board':
-        board = Board()
-        board.restore(state)
-        return board
+        return Board(state=state)
 
     def __repr__(self):
         s = 'Board\n\n'
@@ -0,0 +1,333 @@
+from pytan.core import hexmesh
+from pytan.core.board import Board, BoardLayout
+from pytan.core.piece import PieceTypes, Piece, place_piece
+from pytan.core.cards import ResourceCards, DevCards, DEV_CARD_COUNTS
+from pytan.core.tiles import TileTypes
+from pytan.core.state import GameStates
+from pytan.core.rng import CounterState
+from collections import defaultdict
+from functools import lru_cache
+import numpy as np
+import struct
+
+# Binary snapshot of Game.get_state() without the logs. A fixed layout for a
+# given board size and player count, followed by the player roster. The board
+# layout is not stored, it is regenerated from the board seed.
+MAGIC = b'PYTN'
+CODEC_VERSION = 4
+
+RESOURCES = tuple(ResourceCards)
+TILE_TYPES = tuple(TileTypes)
+DEV_CARDS = tuple(DevCards)
+PIECE_TYPES = tuple(PieceTypes)
+GAME_STATES = tuple(GameStates)
+N_DEV_CARDS = sum(DEV_CARD_COUNTS.values())
+MAX_PLAYERS = 4
+EMPTY = -1
+NO_ROBBER = 0xFFFF
+
+# magic, version, n_layers, n_players
+HEADER = struct.Struct('<4sBBB')
+# Board seed kind and the size of its value. Seeds are stored exactly, versions
+# 1 and 2 kept a double and regenerated a different layout from big int seeds.
+SEED_FIELDS = struct.Struct('<BH')
+FLOAT_SEED, INT_SEED, STR_SEED, BYTES_SEED = range(4)
+# Float seeds, and every seed before version 3
+DOUBLE = struct.Struct('<d')
+# points to win, state, current player, current roll, last roll, has rolled, knight played,
+# free roads, longest road slot, largest army slot, moves made, turn, robber tile index
+GAME_FIELDS = struct.Struct('<IBBBB??BbbIIH')
+# PRNG kind, followed by its state
+PRNG_KIND = struct.Struct('<B')
+MERSENNE, COUNTER = 0, 1
+# Mersenne Twister version, 624 words plus position, whether gauss_next is set and its value
+PRNG_FIELDS = struct.Struct('<B625I?d')
+# Counter based key and 128 bit position, then the length of the spawn path
+# and its indices (from version 4)
+COUNTER_FIELDS = struct.Struct('<QQQQ')
+STREAM_LENGTH = struct.Struct('<B')
+
+# Dicts keep their key order, it decides the order cards are listed in (and stolen from)
+def counts_dtype(n: int) -> list:
+    return [('keys', 'i1', n), ('counts', 'i2', n)]
+
+PLAYER_DTYPE = np.dtype([
+    ('resource_cards', counts_dtype(len(RESOURCES))),
+    ('resource_production', counts_dtype(len(TILE_TYPES))),
+    ('diversity', counts_dtype(len(TILE_TYPES))),
+    ('n_dev_cards', 'u1'),
+    ('dev_cards', 'i1', N_DEV_CARDS),
+    ('dev_turns', '<u4', N_DEV_CARDS),
+    ('roads', 'u1'),
+    ('settlements', 'u1'),
+    ('cities', 'u1'),
+    ('vps', 'u1'),
+    ('knights_played', 'u1'),
+    ('longest_road_chain', 'u1'),
+    ('largest_army', '?'),
+    ('longest_road', '?'),
+    ('last_road_built', '<u4'),
+    ('last_settlement_built', '<u4'),
+    ('last_city_built', '<u4'),
+])
+
+# Pending player lists, the trade offers and the dev card deck
+TABLES_DTYPE = np.dtype([
+    ('bank', '<i2', len(RESOURCES)),
+    ('n_dev_cards', 'u1'),
+    ('dev_cards', 'i1', N_DEV_CARDS),
+    ('player_lists', 'i1', (4, MAX_PLAYERS)),
+    ('player_list_lengths', 'u1', 4),
+    ('trades', 'i1', (2, len(RESOURCES), 2)),
+    ('trade_lengths', 'u1', 2),
+])
+
+PLAYER_LISTS = ('discarding_players', 'players_to_steal_from', 'players_accepting_trade', 'players_accepted_trade')
+TRADES = ('give_trade', 'want_trade')
+
+# Typed, 1 and 1.0 deal the same tiles but are different seeds
+@lru_cache(maxsize=64, typed=True)
+def board_layout(n_layers: int, seed: float) -> BoardLayout:
+    return Board(seed=seed, n_layers=n_layers).layout
+
+def buffer_size(n_layers: int, n_players: int, prng_kind: int = MERSENNE, seed: object = 0.0, stream_depth: int = 0) -> int:
+    # Bytes before the roster
+    topology = hexmesh.get_topology(n_layers)
+    counter_size = COUNTER_FIELDS.size + STREAM_LENGTH.size + 4 * stream_depth
+    prng_size = PRNG_KIND.size + (counter_size if prng_kind == COUNTER else PRNG_FIELDS.size)
+    return HEADER.size + len(_pack_seed(seed)) + GAME_FIELDS.size + prng_size + TABLES_DTYPE.itemsize \
+        + 2 * topology.n_nodes + topology.n_edges + n_players * PLAYER_DTYPE.itemsize
+
+def _pack_counts(record: np.void, counts: dict, members: tuple):
+    record['keys'][:] = EMPTY
+    for i, (key, count) in enumerate(counts.items()):
+        record['keys'][i] = members.index(key)
+        record['counts'][i] = count
+
+def _unpack_counts(record: np.void, members: tuple) -> defaultdict:
+    return defaultdict(int, {members[key]: int(count) for key, count in zip(record['keys'], record['counts']) if key != EMPTY})
+
+def _pack_seed(seed: object) -> bytes:
+    # The seed types random.seed reproduces, as their exact value
+    if isinstance(seed, float):
+        kind, value = FLOAT_SEED, DOUBLE.pack(seed)
+    elif isinstance(seed, int) and not isinstance(seed, bool):
+        kind, value = INT_SEED, seed.to_bytes(seed.bit_length() // 8 + 1, 'little', signed=True)
+    elif isinstance(seed, str):
+        kind, value = STR_SEED, seed.encode()
+    elif isinstance(seed, (bytes, bytearray)):
+        kind, value = BYTES_SEED, bytes(seed)
+    else:
+        raise TypeError(f'Cannot encode a board seed of type {type(seed).__name__}')
+    return SEED_FIELDS.pack(kind, len(value)) + value
+
+def _unpack_seed(data: bytes, offset: int, version: int) -> tuple[object, int]:
+    if version < 3:
+        (seed,) = DOUBLE.unpack_from(data, offset)
+        return seed, offset + DOUBLE.size
+    kind, size = SEED_FIELDS.unpack_from(data, offset)
+    offset += SEED_FIELDS.size
+    value = bytes(data[offset:offset + size])
+    offset += size
+    if kind == FLOAT_SEED:
+        return DOUBLE.unpack(value)[0], offset
+    if kind == INT_SEED:
+        return int.from_bytes(value, 'little', signed=True), offset
+    if kind == STR_SEED:
+        return value.decode(), offset
+    if kind == BYTES_SEED:
+        return value, offset
+    raise ValueError(f'Unknown board seed kind {kind}')
+
+def _pack_prng(prng: tuple) -> bytes:
+    if type(prng) == CounterState:
+        key0, key1, position, stream = prng
+        return PRNG_KIND.pack(COUNTER) + COUNTER_FIELDS.pack(key0, key1, position & ((1 << 64) - 1), position >> 64) \
+            + STREAM_LENGTH.pack(len(stream)) + struct.pack(f'<{len(stream)}I', *stream)
+    prng_version, internal, gauss_next = prng
+    return PRNG_KIND.pack(MERSENNE) + PRNG_FIELDS.pack(prng_version, *internal, gauss_next is not None, gauss_next or 0.0)
+
+def _unpack_prng(data: bytes, offset: int, version: int) -> tuple[tuple, int]:
+    # Version 1 had no kind byte, it always held a Mersenne Twister
+    kind = MERSENNE
+    if version > 1:
+        (kind,) = PRNG_KIND.unpack_from(data, offset)
+        offset += PRNG_KIND.size
+    if kind == COUNTER:
+        key0, key1, low, high = COUNTER_FIELDS.unpack_from(data, offset)
+        offset += COUNTER_FIELDS.size
+        stream = ()
+        if version > 3:
+            (length,) = STREAM_LENGTH.unpack_from(data, offset)
+            stream = struct.unpack_from(f'<{length}I', data, offset + STREAM_LENGTH.size)
+            offset += STREAM_LENGTH.size + 4 * length
+        return CounterState(key0, key1, low | high << 64, stream), offset
+    prng = PRNG_FIELDS.unpack_from(data, offset)
+    prng_version, internal, gauss_set, gauss_next = prng[0], prng[1:626], prng[626], prng[627]
+    return (prng_version, internal, gauss_next if gauss_set else None), offset + PRNG_FIELDS.size
+
+def encode_state(state: dict) -> bytes:
+    board = state['board']
+    layout = board['layout']
+    players = state['players']
+    topology = hexmesh.get_topology(layout.n_layers)
+    slots = {player['id']: i for i, player in enumerate(players)}
+    def slot(player_id: int) -> int:
+        return slots[player_id] if player_id in slots else EMPTY
+
+    robber = board['robber']
+    fields = [
+        HEADER.pack(MAGIC, CODEC_VERSION, layout.n_layers, len(players)),
+        _pack_seed(layout.seed),
+        GAME_FIELDS.pack(state['points_to_win'], GAME_STATES.index(state['state']), state['current_player_idx'],
+                         state['current_roll'], state['last_roll'], state['has_rolled'], state['knight_played_this_turn'],
+                         state['free_roads'], slot(state['longest_road']), slot(state['largest_army']), state['moves_made'],
+                         state['turn'], NO_ROBBER if robber is None else topology.tile_index[robber.coord]),
+        _pack_prng(state['prng'])
+    ]
+
+    tables = np.zeros((), dtype=TABLES_DTYPE)
+    tables['bank'] = [state['resource_card_counts'][card] for card in RESOURCES]
+    tables['n_dev_cards'] = len(state['dev_cards'])
+    tables['dev_cards'][:] = EMPTY
+    tables['dev_cards'][:len(state['dev_cards'])] = [DEV_CARDS.index(card) for card in state['dev_cards']]
+    tables['player_lists'][:] = EMPTY
+    for i, name in enumerate(PLAYER_LISTS):
+        tables['player_list_lengths'][i] = len(state[name])
+        tables['player_lists'][i, :len(state[name])] = [slot(player_id) for player_id in state[name]]
+    tables['trades'][:] = EMPTY
+    for i, name in enumerate(TRADES):
+        tables['trade_lengths'][i] = len(state[name])
+        for j, (card, n) in enumerate(state[name]):
+            tables['trades'][i, j] = RESOURCES.index(card), n
+    fields.append(tables.tobytes())
+
+    node_owner = np.full(topology.n_nodes, EMPTY, dtype=np.int8)
+    node_type = np.full(topology.n_nodes, EMPTY, dtype=np.int8)
+    for i, node in enumerate(board['nodes']):
+        if node is not None:
+            node_owner[i] = slots[node.owner_id]
+            node_type[i] = node.piece_type.value
+    edge_owner = np.full(topology.n_edges, EMPTY, dtype=np.int8)
+    for i, edge in enumerate(board['edges']):
+        if edge is not None:
+            edge_owner[i] = slots[edge.owner_id]
+    fields += [node_owner.tobytes(), node_type.tobytes(), edge_owner.tobytes()]
+
+    records = np.zeros(len(players), dtype=PLAYER_DTYPE)
+    for record, player in zip(records, players):
+        _pack_counts(record['resource_cards'], player['resource_cards'], RESOURCES)
+        _pack_counts(record['resource_production'], player['resource_production'], TILE_TYPES)
+        _pack_counts(record['diversity'], player['diversity'], TILE_TYPES)
+        record['n_dev_cards'] = len(player['dev_cards'])
+        record['dev_cards'][:] = EMPTY
+        for i, (card, turn) in enumerate(player['dev_cards']):
+            record['dev_cards'][i] = DEV_CARDS.index(card)
+            record['dev_turns'][i] = turn
+        for name in ['roads', 'settlements', 'cities', 'vps', 'knights_played', 'longest_road_chain',
+                     'largest_army', 'longest_road', 'last_road_built', 'last_settlement_built', 'last_city_built']:
+            record[name] = player[name]
+    fields.append(records.tobytes())
+
+    roster = '\x1e'.join(f'{player["id"]}\x1f{player["name"]}\x1f{player["color"]}' for player in players).encode()
+    fields += [struct.pack('<H', len(roster)), roster]
+    return b''.join(fields)
+
+def decode_state(data: bytes) -> dict:
+    # The inverse of encode_state, a Game.get_state() dict without the logger
+    magic, version, n_layers, n_players = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not an encoded game state')
+    if not 1 <= version <= CODEC_VERSION:
+        raise ValueError(f'Unsupported codec version {version}, expected at most {CODEC_VERSION}')
+    topology = hexmesh.get_topology(n_layers)
+    seed, offset = _unpack_seed(data, HEADER.size, version)
+    (points_to_win, state, current_player_idx, current_roll, last_roll, has_rolled, knight_played_this_turn,
+     free_roads, longest_road, largest_army, moves_made, turn, robber) = GAME_FIELDS.unpack_from(data, offset)
+    offset += GAME_FIELDS.size
+    prng, offset = _unpack_prng(data, offset, version)
+    tables = np.frombuffer(data, dtype=TABLES_DTYPE, count=1, offset=offset)[0]
+    offset += TABLES_DTYPE.itemsize
+    node_owner = np.frombuffer(data, dtype=np.int8, count=topology.n_nodes, offset=offset)
+    offset += topology.n_nodes
+    node_type = np.frombuffer(data, dtype=np.int8, count=topology.n_nodes, offset=offset)
+    offset += topology.n_nodes
+    edge_owner = np.frombuffer(data, dtype=np.int8, count=topology.n_edges, offset=offset)
+    offset += topology.n_edges
+    records = np.frombuffer(data, dtype=PLAYER_DTYPE, count=n_players, offset=offset)
+    offset += n_players * PLAYER_DTYPE.itemsize
+    (roster_size,) = struct.unpack_from('<H', data, offset)
+    offset += 2
+    roster = [entry.split('\x1f') for entry in data[offset:offset + roster_size].decode().split('\x1e')]
+    roster = [(int(player_id), name, color) for player_id, name, color in roster]
+
+    def player_id(slot: int) -> int:
+        return roster[slot][0] if slot != EMPTY else -1
+
+    def piece(coord: int, slot: int, piece_type: int) -> Piece:
+        player_id, name, color = roster[slot]
+        return place_piece(coord, player_id, name, color, PIECE_TYPES[piece_type])
+
+    nodes = tuple(piece(coord, slot, t) if slot != EMPTY else None for coord, slot, t in zip(topology.nodes, node_owner.tolist(), node_type.tolist()))
+    edges = tuple(piece(coord, slot, PieceTypes.ROAD.value) if slot != EMPTY else None for coord, slot in zip(topology.edges, edge_owner.tolist()))
+    robber_piece = None
+    if robber != NO_ROBBER:
+        robber_piece = place_piece(topology.tiles[robber], -1, '', 'black', PieceTypes.ROBBER)
+
+    players = []
+    for (p_id, name, color), record in zip(roster, records):
+        n_dev_cards = int(record['n_dev_cards'])
+        players.append({
+            'name': name,
+            'id': p_id,
+            'color': color,
+            'resource_cards': _unpack_counts(record['resource_cards'], RESOURCES),
+            'dev_cards': [(DEV_CARDS[card], int(turn)) for card, turn in zip(record['dev_cards'][:n_dev_cards], record['dev_turns'][:n_dev_cards])],
+            'roads': int(record['roads']),
+            'settlements': int(record['settlements']),
+            'cities': int(record['cities']),
+            'resource_production': _unpack_counts(record['resource_production'], TILE_TYPES),
+            'diversity': _unpack_counts(record['diversity'], TILE_TYPES),
+            'vps': int(record['vps']),
+            'knights_played': int(record['knights_played']),
+            'longest_road_chain': int(record['longest_road_chain']),
+            'largest_army': bool(record['largest_army']),
+            'longest_road': bool(record['longest_road']),
+            'last_road_built': int(record['last_road_built']),
+            'last_settlement_built': int(record['last_settlement_built']),
+            'last_city_built': int(record['last_city_built'])
+        })
+
+    lists = tables['player_lists'].tolist()
+    lengths = tables['player_list_lengths'].tolist()
+    trades = tables['trades'].tolist()
+    trade_lengths = tables['trade_lengths'].tolist()
+    state_dict = {
+        'board': {
+            'layout': board_layout(n_layers, seed),
+            'nodes': nodes,
+            'edges': edges,
+            'robber': robber_piece
+        },
+        'players': players,
+        'prng': prng,
+        'points_to_win': points_to_win,
+        'state': GAME_STATES[state],
+        'resource_card_counts': {card: n for card, n in zip(RESOURCES, tables['bank'].tolist())},
+        'dev_cards': [DEV_CARDS[card] for card in tables['dev_cards'][:tables['n_dev_cards']].tolist()],
+        'current_player_idx': current_player_idx,
+        'current_roll': current_roll,
+        'last_roll': last_roll,
+        'has_rolled': has_rolled,
+        'knight_played_this_turn': knight_played_this_turn,
+        'free_roads': free_roads,
+        'longest_road': player_id(longest_road),
+        'largest_army': player_id(largest_army),
+        'moves_made': moves_made,
+        'turn': turn
+    }
+    for i, name in enumerate(PLAYER_LISTS):
+        state_dict[name] = [player_id(slot) for slot in lists[i][:lengths[i]]]
+    for i, name in enumerate(TRADES):
+        state_dict[name] = [(RESOURCES[card], n) for card, n in trades[i][:trade_lengths[i]]]
+    return state_dict
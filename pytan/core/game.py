@@ -1,36 +1,65 @@
+from pytan.core import reducer
+from pytan.core.reducer import ACTIONS, Event
 from pytan.core.board import Board
-from pytan.core.tiles import TILE_TYPES_TO_RESOURCE
-from pytan.core.player import Player
+from pytan.core.player import Player, RESOURCES
 from pytan.core.cards import *
-from pytan.core.state import GameStates, CatanGameState
+from pytan.core.state import GameStates, CatanGameState, GameRecord, current_slot, reason_text
+from pytan.log.logging import Logger, NULL_LOGGER
+from pytan.core.journal import StateJournal
+from pytan.core.codec import encode_state, decode_state
+from pytan.core.zobrist import zobrist_keys, player_hash, bank_hash, turn_hash, robber_hash, piece_hash
+from pytan.core.piece import PieceTypes
 from pytan.core.ports import PortTypes
-from pytan.core.tiles import CatanTile
-from pytan.log.logging import Logger
-from collections import defaultdict
+from pytan.core.rng import rng_from_state
+from collections import namedtuple
+from itertools import count
 import numpy as np
 import random
 
+# Inverse of one apply. The record before it and the mirrors it changed
+UndoToken = namedtuple('UndoToken', ['record', 'players', 'prng', 'board', 'hashes', 'version'])
+
+# State versions come from one counter so no two game states ever share one
+VERSIONS = count(1)
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses'])
+
 class Game(object):
 
-    def __init__(self, players: list[Player] = [], logger: Logger = None, seed: float = random.random()):
+    def __init__(self, players: list[Player] = [], logger: Logger = None, seed: float = random.random(), board_type: type = Board, lean: bool = False, history_limit: int = None, rng: object = None):
         # Init
-        if not logger:
+        # Lean mode is for simulation and training, nothing is logged, observers
+        # are not notified and no undo history is kept
+        self._lean = lean
+        self._logging = not lean
+        self._history = not lean
+        # Undo steps kept, None keeps the whole game
+        self._history_limit = history_limit
+        if lean:
+            logger = NULL_LOGGER
+        elif not logger:
             logger = Logger(console_log=True)
         self._logger = logger
 
-        self._prng = random.Random()
+        # Any PRNG with the random.Random methods the game uses, e.g. a
+        # pytan.core.rng.CounterRNG spawned per worker
+        self._prng = random.Random() if rng is None else rng
 
-        self.set_seed(seed)
+        # Legality results cached against the state version
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._touch()
 
-        self.init_game_vars()
+        self.set_seed(seed)
 
         self._game_state = CatanGameState(self)
 
         self._observers = set()
-        self._notify_observers = True
+        self._notify_observers = not lean
 
-        self._board = Board(seed=seed)
+        self._board = board_type(seed=seed)
 
+        self._record = None
         self._players = []
         if players:
             for player in players:
@@ -43,7 +72,14 @@ class Game(object):
         player_ids = set([p.id for p in self._players])
         self._player_order = range(len(self._players))
         assert len(player_ids) == len(self._players)
+
+        self.init_game_vars()
+        self._init_hash()
     
+    @property
+    def lean(self) -> bool:
+        return self._lean
+
     @property
     def logger(self) -> Logger:
         return self._logger
@@ -72,35 +108,41 @@ class Game(object):
     def state(self) -> CatanGameState:
         return self._game_state
     
+    @property
+    def record(self) -> GameRecord:
+        return self._record
+
     @property
     def current_state(self) -> GameStates:
-        return self._game_state.state
+        return self._record.state
     
+    @property
+    def POINTS_TO_WIN(self) -> int:
+        return self._record.points_to_win
+
     @property
     def resource_card_counts(self) -> dict[ResourceCards, int]:
-        return self._resource_card_counts
+        return dict(zip(RESOURCES, self._record.bank))
 
     @property
     def dev_cards(self) -> list[DevCards]:
-        return self._dev_cards
+        return list(self._record.dev_cards)
 
     @property
     def n_dev_cards(self) -> int:
-        return len(self._dev_cards)
+        return len(self._record.dev_cards)
 
     @property
     def current_player_idx(self) -> int:
-        return self._current_player_idx
+        return self._record.current_player_idx
 
     @property
     def current_turn_player(self) -> Player:
-        return self._players[self._current_player_idx]
+        return self._players[self._record.current_player_idx]
 
     @property
     def current_player(self) -> Player:
-        return self.discarding_player if self._discarding_players \
-                else self.player_accepting_trade if self._players_accepting_trade \
-                else self._players[self._current_player_idx]
+        return self._players[current_slot(self._record)]
 
     @property
     def other_players(self) -> list[Player]:
@@ -108,88 +150,122 @@ class Game(object):
 
     @property
     def discarding_players(self) -> list[Player]:
-        return [self.get_player_by_id(i) for i in self._discarding_players]
+        return [self.get_player_by_id(i) for i in self._record.discarding_players]
 
     @property
     def discarding_player(self) -> Player:
-        return self.get_player_by_id(self._discarding_players[0])
+        return self.get_player_by_id(self._record.discarding_players[0])
 
     @property
     def players_to_steal_from(self) -> list[Player]:
-        return [self.get_player_by_id(i) for i in self._players_to_steal_from]
+        return [self.get_player_by_id(i) for i in self._record.players_to_steal_from]
 
     @property
     def player_accepting_trade(self) -> Player:
-        return self.get_player_by_id(self._players_accepting_trade[0])
+        return self.get_player_by_id(self._record.players_accepting_trade[0])
 
     @property
     def players_accepted_trade(self) -> list[Player]:
-        return [self.get_player_by_id(i) for i in self._players_accepted_trade]
+        return [self.get_player_by_id(i) for i in self._record.players_accepted_trade]
 
     @property
     def current_rol(self) -> int:
-        return self._current_roll
+        return self._record.current_roll
     
     @property
     def last_roll(self) -> int:
-        return self._last_roll
+        return self._record.last_roll
 
     @property
     def has_rolled(self) -> bool:
-        return self._has_rolled
+        return self._record.has_rolled
     
     @property
     def is_over(self) -> bool:
-        return self._game_state == GameStates.GAME_OVER
+        return self._record.state == GameStates.GAME_OVER
 
     @property
     def knight_played_this_turn(self) -> bool:
-        return self._knight_played_this_turn
+        return self._record.knight_played_this_turn
 
     @property
     def free_roads(self) -> int:
-        return self._free_roads
+        return self._record.free_roads
 
     @property
     def longest_road(self) -> Player:
-        return self.get_player_by_id(self._longest_road) if self._longest_road > -1 else None
+        return self.get_player_by_id(self._record.longest_road) if self._record.longest_road > -1 else None
 
     @property
     def largest_army(self) -> Player:
-        return self.get_player_by_id(self._largest_army) if self._largest_army > -1 else None
+        return self.get_player_by_id(self._record.largest_army) if self._record.largest_army > -1 else None
 
     @property
     def moves_made(self) -> int:
-        return self._moves_made
+        return self._record.moves_made
 
     @property
     def turn(self) -> int:
-        return self._turn
+        return self._record.turn
     
+    @property
+    def position_hash(self) -> int:
+        return self._hash
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def cache_stats(self) -> CacheStats:
+        return CacheStats(self._cache_hits, self._cache_misses)
+
     @property
     def scoreboard(self) -> dict:
-        player_temp = self._players[self._starting_player_idx:]+self._players[:self._starting_player_idx]
+        starting_player_idx = self._record.starting_player_idx
+        player_temp = self._players[starting_player_idx:]+self._players[:starting_player_idx]
         return {player.id: player.total_victory_points for player in player_temp}
 
     @property
     def state_idx(self) -> int:
-        return self._state_idx
+        return self._journal.index
     
     @property
-    def stored_states(self) -> list[dict]:
-        return self._stored_states
+    def stored_states(self) -> StateJournal:
+        return self._journal
+
+    @property
+    def history_limit(self) -> int:
+        return self._history_limit
+
+    @history_limit.setter
+    def history_limit(self, history_limit: int):
+        self._history_limit = history_limit
+        self._journal.max_entries = history_limit
+
+    @property
+    def history_nbytes(self) -> int:
+        # Approximate memory held by the undo history on top of the current state
+        return self._journal.nbytes
 
     @property
     def can_undo(self) -> bool:
-        return self._state_idx > 0 and len(self._stored_states) > 0
+        return self._journal.index > 0
 
     @property
     def can_redo(self) -> bool:
-        return self._state_idx > -1 and self._state_idx < len(self._stored_states) - 1
+        return -1 < self._journal.index < len(self._journal) - 1
 
     @state.setter
     def state(self, s: GameStates):
-        self._game_state.set_state(s)
+        self._record = self._record._replace(state=s)
+        self._rehash()
+        self._touch()
+
+    @POINTS_TO_WIN.setter
+    def POINTS_TO_WIN(self, points: int):
+        self._record = self._record._replace(points_to_win=points)
+        self._touch()
 
     @notify_observers.setter
     def notify_observers(self, notify: bool):
@@ -197,42 +273,12 @@ class Game(object):
 
     def init_game_vars(self):
         # Init game variables
-        self._resource_card_counts = RESOURCE_CARD_COUNTS.copy()
+        self._journal = StateJournal(max_entries=self._history_limit)
 
-        self._discarding_players = []
-        self._players_to_steal_from = []
-        self._players_accepting_trade = []
-        self._players_accepted_trade = []
-
-        self._give_trade = []
-        self._want_trade = []
-
-        self._stored_states = []
-        self._state_idx = -1
-
-        self.POINTS_TO_WIN = 10
-        
-        self._current_roll = 0
-        self._last_roll = 0
-        self._has_rolled = False
-
-        self._knight_played_this_turn = False
-
-        self._free_roads = 0
-
-        self._longest_road = -1
-        self._largest_army = -1
-
-        self._moves_made = 0
-        self._turn = 0
-
-        self._current_player_idx = 0
-        self._starting_player_idx = 0
+        self._record = reducer.new_game(self._board.layout, self._board.robber, [player.record() for player in self._players])
         
     def reset(self, randomize: bool = False):
         # Reset the game state
-        self.init_game_vars()
-
         self._logger.reset()
 
         self._observers = self._observers.copy()
@@ -242,25 +288,48 @@ class Game(object):
         else:
             self.set_seed(self._seed)
 
+        # The record is built again for the new players below
+        self._record = None
         players_temp = [p.clone_player() for p in self._players]
         self.clear_players()
         for player in players_temp:
             self.add_player(player)
-        self.set_starting_player(self._prng.randint(0,len(self._players)-1))
 
         self._board.set_seed(self._seed)
         self._board.reset()
 
-        self.shuffle_dev_cards()
+        self.init_game_vars()
+        self._record = reducer.setup(self._record, self._prng)
+        self.set_starting_player(self._record.starting_player_idx)
 
-        self._game_state.set_state(GameStates.UNDEFINED)
+        self._init_hash()
+        self._touch()
 
     def set_seed(self, seed: float, log: bool = True):
-        if log:
+        if log and self._logging:
             self._logger.log_action('set_seed', seed)
         self._seed = seed
         self._prng.seed(self._seed)
 
+    def _touch(self):
+        # Every change to the game gets a new version, which drops the cache
+        self._version = next(VERSIONS)
+        self._legality_cache = {}
+
+    def cached(self, key: str, compute: callable):
+        # compute() for the current version, legality checks and placements
+        # are asked for several times per decision
+        if key in self._legality_cache:
+            self._cache_hits += 1
+            return self._legality_cache[key]
+        self._cache_misses += 1
+        value = self._legality_cache[key] = compute()
+        return value
+
+    def reset_cache_stats(self):
+        self._cache_hits = 0
+        self._cache_misses = 0
+
     def clear_observers(self):
         self._observers = set()
 
@@ -268,17 +337,10 @@ class Game(object):
         self._observers.add(observable)
 
     def notify(self, new:bool = True, update:bool = True):
-        if new:
-            if self._state_idx < len(self._stored_states)-1:
-                self._stored_states[self._state_idx+1] = self.get_state()
-            else:
-                self._stored_states.append(self.get_state())
-            self._state_idx += 1
-        for player in self._players:
-            if player.total_victory_points >= self.POINTS_TO_WIN:
-                self._logger.log(f'GAME OVER {self.current_turn_player} wins!')
-                self._game_state.set_state(GameStates.GAME_OVER)
-        if update:
+        if new and self._history:
+            self._journal.record(self.get_state())
+        self._touch()
+        if update and self._notify_observers:
             for obs in self._observers:
                 try:
                     obs.notify(self)
@@ -286,585 +348,373 @@ class Game(object):
                     pass
 
     def shuffle_dev_cards(self):
-        self._dev_cards = []
-        for card in DEV_CARD_COUNTS:
-            for _ in range(DEV_CARD_COUNTS[card]):
-                self._dev_cards.append(card)
-        self._prng.shuffle(self._dev_cards)
+        self._record = self._record._replace(dev_cards=reducer.shuffled_dev_cards(self._prng))
 
     def set_starting_player(self, player_idx: int):
-        self._logger.log_action('set_starting_player', player_idx)
-        self._starting_player_idx = player_idx
-        self._current_player_idx = self._starting_player_idx
+        if self._logging:
+            self._logger.log_action('set_starting_player', player_idx)
+        self._record = self._record._replace(starting_player_idx=player_idx, current_player_idx=player_idx)
 
     def clear_players(self):
-        self._logger.log_action('clear_players')
+        if self._logging:
+            self._logger.log_action('clear_players')
         self._players = []
+        if self._record is not None:
+            self._record = reducer.with_players(self._record, ())
 
     def add_player(self, player: Player):
         if len(self._players) < 4:
-            self._logger.log_action('add_player', player)
+            if self._logging:
+                self._logger.log_action('add_player', player)
             self._players.append(player)
-        else:
+            if self._record is not None:
+                self._record = reducer.with_players(self._record, self._record.players + (player.record(),))
+        elif self._logging:
             self._logger.log('Max 4 players')
 
     def get_player_by_id(self, player_id: int) -> Player:
         for player in self._players:
             if player.id == player_id:
                 return player
+
+    def is_player_on_port(self, player_id: int, port_type: PortTypes) -> bool:
+        return reducer.has_port(self._record, player_id, port_type)
+
+    def best_trade_ratio(self, player_id: int, resource: ResourceCards) -> int:
+        return reducer.trade_ratio(self._record, player_id, resource)
     
     def start_game(self, randomize: bool = False):
         self.reset(randomize)
+        self._record = reducer.start(self._record)
 
-        if len(self._players) == 2:
-            self.POINTS_TO_WIN = 15
-        else:
-            self.POINTS_TO_WIN = 10
-
-        self._logger.log('=== CATAN ===\n')
-        self._logger.log(f'Game Started: {self._logger.start}')
-        player_string = '\n'.join([f'{p.id} {str(p)}' for p in self._players])
-        self._logger.log(player_string)
-        self._logger.log(f'{self.current_turn_player} starts')
-        self._logger.log_action('start_game')
+        if self._logging:
+            self._logger.log('=== CATAN ===\n')
+            self._logger.log(f'Game Started: {self._logger.start}')
+            player_string = '\n'.join([f'{p.id} {str(p)}' for p in self._players])
+            self._logger.log(player_string)
+            self._logger.log(f'{self.current_turn_player} starts')
+            self._logger.log_action('start_game')
 
-        self._game_state.set_state(GameStates.STARTING_SETTLEMENT)
+        self._rehash()
         self.notify()
 
     def end_game(self, log: bool = False):
-        self._logger.log('Ending Game')
-        self._logger.log_action('end_game')
+        if self._logging:
+            self._logger.log('Ending Game')
+            self._logger.log_action('end_game')
         if log:
             self.save_to_log_file()
         self.notify()
 
-    def _remove_resources(self, resource_list: list[tuple[ResourceCards, int]]):
-        for card, n in resource_list:
-            self._resource_card_counts[card] -= n
-
-    def _add_resources(self, resource_list: list[tuple[ResourceCards, int]]):
-        for card, n in resource_list:
-            self._resource_card_counts[card] += n
-
-    def _collect_resources(self, tiles: dict[int, CatanTile], node_coord: int = 0x00):
-        pickups = defaultdict(lambda: defaultdict(int))
-        quantity = defaultdict(int)
-        for tile_coord, tile in tiles.items():
-            if tile_coord != self._board.robber.coord:
-                card = TILE_TYPES_TO_RESOURCE[tile.tile_type]
-                if card is not None:
-                    for s_coord, settlement in self._board.settlements_on_tile(tile_coord).items():
-                        if node_coord == 0 or node_coord == s_coord:
-                            p_id = settlement.owner_id
-                            pickups[p_id][card] += 1
-                            quantity[card] += 1
-                    
-                    for c_coord, city in self._board.cities_on_tile(tile_coord).items():
-                        if node_coord == 0 or node_coord == s_coord:
-                            p_id = city.owner_id
-                            pickups[p_id][card] += 2
-                            quantity[card] += 2
-
-        for p_id, cards in pickups.items():
-            pickup_list = []
-            player = self.get_player_by_id(p_id)
-            p_l = []
-            for card, count in cards.items():
-                if quantity[card] < self._resource_card_counts[card]:
-                    p_l.append(f'{count} {card.value}')
-                    pickup_list.append((card,count))
-            if pickup_list:
-                s = ', '.join(p_l)
-                self._logger.log(f'{player} picked up {s}')
-                player.add_resource_cards(pickup_list)
-                self._remove_resources(pickup_list)
+    def _init_hash(self):
+        # Zobrist hash from scratch, the action methods then keep it up to date.
+        # Pieces and the robber are XORed in as they move, the hands, bank and
+        # turn keys of what an action touched are swapped by _rehash
+        record = self._record
+        keys = self._zobrist = zobrist_keys(self._board.layout.n_layers)
+        slots = {player.id: slot for slot, player in enumerate(self._players)}
+        self._player_hashes = [player_hash(keys, slot, player.resource_cards, player.dev_cards, record.turn) for slot, player in enumerate(self._players)]
+        self._bank_hash = bank_hash(keys, self.resource_card_counts)
+        self._turn_hash = turn_hash(keys, record.current_player_idx, record.state, record.has_rolled, record.knight_played_this_turn, record.free_roads)
+        self._hash = self._bank_hash ^ self._turn_hash ^ robber_hash(keys, record.robber)
+        for h in self._player_hashes:
+            self._hash ^= h
+        for piece in record.nodes + record.edges:
+            if piece is not None:
+                self._hash ^= piece_hash(keys, piece, slots[piece.owner_id])
+
+    def _rehash(self, players: list[Player] = ()):
+        record = self._record
+        keys = self._zobrist
+        h = bank_hash(keys, self.resource_card_counts)
+        self._hash ^= self._bank_hash ^ h
+        self._bank_hash = h
+        h = turn_hash(keys, record.current_player_idx, record.state, record.has_rolled, record.knight_played_this_turn, record.free_roads)
+        self._hash ^= self._turn_hash ^ h
+        self._turn_hash = h
+        for player in players:
+            slot = self._players.index(player)
+            h = player_hash(keys, slot, player.resource_cards, player.dev_cards, record.turn)
+            self._hash ^= self._player_hashes[slot] ^ h
+            self._player_hashes[slot] = h
+
+    def _step(self, function: str, *args):
+        # The rules run on the record, the game then follows what happened
+        record, events = reducer.step(self._record, (function, args), self._prng)
+        if self._logging:
+            self._log_events(function, args, events)
+        if record is not self._record:
+            self._follow(record, events)
+            self.notify()
 
-    def discard(self, resource_list: list[tuple[ResourceCards, int]]):
-        if self._game_state.can_discard(log=True):
-            player = self.discarding_player
-            d = player.n_resource_cards // 2
-            d_sum = sum([n for card, n in resource_list])
-            if d_sum > d:
-                self._logger.log(f'Too many resource cards to discard, discard {d} cards')
-            else:
-                self._discarding_players.pop(0)
-                player.remove_resource_cards(resource_list)
-                self._add_resources(resource_list)
-                d_l = []
-                for card, n in resource_list:
-                    d_l.append(f'{n} {card.value}')
-                s = ', '.join(d_l)
-                self._logger.log(f'{player} discarded {s}')
-                self._logger.log_action('discard', resource_list)
-                if len(self._discarding_players) == 0:
-                    self._logger.log(f'{self.current_player} is moving the robber')
-                    self._game_state.set_state(GameStates.MOVING_ROBBER)
+    def _follow(self, record: GameRecord, events: tuple[Event]):
+        # Brings the board, the players and the hash in line with record
+        old = self._record
+        keys = self._zobrist
+        for event in events:
+            if event.kind == 'build':
+                piece_type, coord = event.value
+                slot = old.current_player_idx
+                player = self._players[slot]
+                if piece_type == PieceTypes.ROAD:
+                    self._board.build_road(coord, player)
+                    self._hash ^= keys.edges[coord][slot]
+                elif piece_type == PieceTypes.SETTLEMENT:
+                    self._board.build_settlement(coord, player)
+                    self._hash ^= keys.nodes[coord][slot][PieceTypes.SETTLEMENT.value]
+                    for tile in self._board.node_neighboring_tiles(coord).values():
+                        player.add_tile(tile)
                 else:
-                    p = self.discarding_player
-                    d = p.n_resource_cards // 2
-                    self._logger.log(f'{p} must discard {d} cards')
-                self.notify()
-        else:
-            self._logger.log('No players need to discard')
-
-    def roll(self, dice_roll: int = 0):
-        if self._game_state.can_roll(log=True):
-            self._has_rolled = True
-            # Roll a random dice roll
-            dice_1 = self._prng.choice([1,2,3,4,5,6])
-            dice_2 = self._prng.choice([1,2,3,4,5,6])
-            d_roll = dice_1 + dice_2
-            if dice_roll == 0:
-                dice_roll = d_roll
-            # Roll a determined dice roll
-            self._last_roll = self._current_roll
-            self._current_roll = dice_roll
-            self._logger.log(f'{self.current_turn_player} rolled a {dice_roll}')
-            self._logger.log_action('roll', dice_roll)
-            if dice_roll == 7:
-                for player in self._players:
-                    if player.n_resource_cards > 7:
-                        self._discarding_players.append(player.id)
-                if self._discarding_players:
-                    p = self.discarding_player
-                    d = p.n_resource_cards // 2
-                    self._logger.log(f'{p} must discard {d} cards')
-                    self._game_state.set_state(GameStates.DISCARDING)
+                    self._board.build_city(coord, player)
+                    self._hash ^= keys.nodes[coord][slot][PieceTypes.SETTLEMENT.value] ^ keys.nodes[coord][slot][PieceTypes.CITY.value]
+            elif event.kind == 'robber':
+                self._hash ^= keys.robber[old.robber.coord] ^ keys.robber[event.value]
+                self._board.move_robber(event.value)
+        changed = []
+        for player, before, after in zip(self._players, old.players, record.players):
+            if before is not after:
+                player.sync(after)
+                changed.append(player)
+        # Dev cards bought this turn become playable
+        if record.turn != old.turn and self._players[old.current_player_idx] not in changed:
+            changed.append(self._players[old.current_player_idx])
+        self._record = record
+        self._rehash(changed)
+
+    def _log_events(self, function: str, args: tuple, events: tuple[Event]):
+        log = self._logger.log
+        log_action = self._logger.log_action
+        paid = 0
+        for kind, player_id, value in events:
+            player = self.get_player_by_id(player_id)
+            if kind == 'refused':
+                if value:
+                    log(reason_text(value))
+            elif kind == 'roll':
+                log(f'{player} rolled a {value}')
+                log_action('roll', value)
+            elif kind == 'discarding':
+                log(f'{player} must discard {value} cards')
+            elif kind == 'robbing':
+                log(f'{player} is moving the robber')
+            elif kind == 'produce':
+                s = ', '.join([f'{count} {card.value}' for card, count in value])
+                log(f'{player} picked up {s}')
+            elif kind == 'discard':
+                s = ', '.join([f'{n} {card.value}' for card, n in value])
+                log(f'{player} discarded {s}')
+                log_action('discard', *args)
+            elif kind == 'pass_turn':
+                if function == 'pass_turn':
+                    log_action('pass_turn')
+                log(f'{player} passed their turn')
+            elif kind == 'turn':
+                log(f'It is now {player}\'s turn')
+            elif kind == 'build':
+                piece_type, coord = value
+                if piece_type == PieceTypes.CITY:
+                    log(f'{player} upgraded to city at {hex(coord)}')
                 else:
-                    self._logger.log(f'{self.current_turn_player} is moving the robber')
-                    self._game_state.set_state(GameStates.MOVING_ROBBER)
-            else:
-                tiles = self._board.tiles_with_prob(dice_roll)
-                self._collect_resources(tiles)   
-            self.notify()
+                    log(f'{player} built {piece_type.name.lower()} at {hex(coord)}')
+                log_action(function, hex(coord))
+            elif kind == 'longest_road':
+                log(f'{player} has the Longest Road')
+            elif kind == 'largest_army':
+                log(f'{player} has the Largest Army')
+            elif kind == 'buy':
+                log(f'{player} bought a {value.value} Dev Card')
+                log_action('buy_dev_card', value)
+            elif kind == 'robber':
+                log(f'{player} moved the robber to {hex(value)}')
+                log_action('move_robber', hex(value))
+            elif kind == 'stealing':
+                log(f'{player} is stealing')
+            elif kind == 'steal':
+                victim_id, card = value
+                log(f'{player} stole a {card.value} from {self.get_player_by_id(victim_id)}')
+                log_action('steal', victim_id)
+            elif kind == 'bank_trade':
+                giving, wanting, ratio = value
+                log(f'{player} traded {ratio} {giving[0][0].value} for a {wanting[0][0].value}')
+                log_action('offer_trade', *args)
+            elif kind == 'offer':
+                giving, wanting, _ = value
+                s = f'{player} wants to trade '
+                for c, n in giving:
+                    s += f'{n} {c.value} '
+                s += 'for '
+                for c, n in wanting:
+                    s += f'{n} {c.value} '
+                log(s)
+                log_action('offer_trade', *args)
+            elif kind == 'no_cards':
+                log(f'{player} does not have the cards to trade')
+            elif kind == 'accepting':
+                log(f'{player} accept or decline trade?')
+            elif kind == 'accept':
+                log(f'{player} accepted trade')
+                log_action('accept_trade')
+            elif kind == 'decline':
+                log(f'{player} declined trade')
+                log_action('decline_trade')
+            elif kind == 'trade':
+                partner_id, giving, wanting = value
+                s = f'{player} traded '
+                for c, n in wanting:
+                    s += f'{n} {c.value} '
+                s += f'to {self.get_player_by_id(partner_id)} for '
+                for c, n in giving:
+                    s += f'{n} {c.value} '
+                log(s)
+                log_action('confirm_trade', partner_id)
+            elif kind == 'knight':
+                log(f'{player} played a Knight')
+                log_action('play_knight')
+            elif kind == 'monopoly':
+                log(f'{player} played Monopoly on {value.value}')
+                log_action('play_monopoly', value)
+            elif kind == 'paid':
+                card, n = value
+                paid += n
+                if not paid:
+                    log(f'{player} payed {self.current_turn_player} {paid} {card.value} due to Monopoly')
+            elif kind == 'road_builder':
+                log(f'{player} played Road Builder, build 2 roads for free')
+                log_action('play_road_builder')
+            elif kind == 'year_plenty':
+                card1, card2 = value
+                if card1 == card2:
+                    log(f'{player} played Year of Plenty, picked up 2 {card1.value}')
+                else:
+                    log(f'{player} played Year of Plenty, picked up a {card1.value} and a {card2.value}')
+                log_action('play_year_plenty', card1, card2)
+            elif kind == 'game_over':
+                log(f'GAME OVER {player} wins!')
+
+    def discard(self, resource_list: list[tuple[ResourceCards, int]]):
+        self._step('discard', resource_list)
 
-    def _pass_turn(self):
-        self._logger.log(f'{self.current_turn_player} passed their turn')
-        self._has_rolled = False
-        self._knight_played_this_turn = False
-        self._turn += 1
-        d = 1
-        if self._turn == self.n_players or self._turn == (2*self.n_players):
-            d = 0
-        elif self._turn >= self.n_players+1 and self._turn < (2*self.n_players):
-            d = -1
-        if self._turn >= (2*self.n_players):
-            self._game_state.set_state(GameStates.INGAME)
-        self._current_player_idx += d
-        if self._current_player_idx >= len(self._players):
-            self._current_player_idx = 0
-        elif self._current_player_idx < 0:
-            self._current_player_idx = len(self._players)-1
-        self._logger.log(f'It is now {self.current_turn_player}\'s turn')
+    def roll(self, dice_roll: int = 0):
+        self._step('roll', dice_roll)
 
     def pass_turn(self):
-        if self._game_state.can_pass_turn(log=True):
-            self._logger.log_action('pass_turn')
-            self._pass_turn()
-            self.notify()
+        self._step('pass_turn')
 
     def can_build_road(self, edge_coord: int) -> bool:
         return edge_coord in self.legal_road_placements()
 
     def legal_road_placements(self) -> list[int]:
+        return self.cached('legal_road_placements', self._legal_road_placements)
+
+    def _legal_road_placements(self) -> list[int]:
         if self._game_state == GameStates.STARTING_ROAD:
             return self._board.node_neighboring_edges(self.current_turn_player.last_settlement_built)
         else:
             return self._board.legal_road_placements(self.current_turn_player.id)
-    
-    def _build_road(self, coord: int) -> bool:
-        if coord in self.legal_road_placements():
-            if self._board.build_road(coord, self.current_turn_player):
-                self._logger.log(f'{self.current_turn_player} built road at {hex(coord)}')
-                self._logger.log_action('build_road', hex(coord))
-                self._moves_made += 1
-                self.current_turn_player.add_road(coord)
-                chain = self._board.find_longest_road_chain(self.current_turn_player.id)
-                self.current_turn_player.longest_road_chain = chain
-                if chain >= 5:
-                    if not self.longest_road or (self.longest_road and chain > self.longest_road.longest_road_chain):
-                        if self.longest_road:
-                            self.longest_road.longest_road = False
-                        self._longest_road = self.current_turn_player.id
-                        self.current_turn_player.longest_road = True
-                return True
-            else:
-                self._logger.log(f'{self.current_turn_player} failed to build road at {hex(coord)}')
-        else:
-            self._logger.log(f'{self.current_turn_player} cannot build road at {hex(coord)}')
-        return False
 
     def build_road(self, coord: int):
-        if self._game_state == GameStates.STARTING_ROAD:
-            if self._build_road(coord):
-                self._game_state.set_state(GameStates.STARTING_SETTLEMENT)
-                self._pass_turn()
-                self.notify()
-        elif self._game_state.can_build_road(log=True):
-            if self._build_road(coord):
-                if self._free_roads == 0:
-                    self.current_turn_player.remove_resource_cards(ROAD_COST)
-                    self._add_resources(ROAD_COST)
-                else:
-                    self._free_roads -= 1
-                    if self._free_roads == 0:
-                        self._game_state.set_state(GameStates.INGAME)       
-                self.notify()
+        self._step('build_road', coord)
 
     def can_build_settlement(self, node_coord: int) -> bool:
         return node_coord in self.legal_settlement_placements()
 
     def legal_settlement_placements(self) -> list[int]:
+        return self.cached('legal_settlement_placements', self._legal_settlement_placements)
+
+    def _legal_settlement_placements(self) -> list[int]:
         if self._game_state == GameStates.STARTING_SETTLEMENT:
             return self._board.legal_starting_settlement_placements(self.current_turn_player.id)
         else:
             return self._board.legal_settlement_placements(self.current_turn_player.id)
 
-    def _build_settlement(self, coord: int) -> bool:
-        if coord in self.legal_settlement_placements():
-            if self._board.build_settlement(coord, self.current_turn_player):
-                self._logger.log(f'{self.current_turn_player} built settlement at {hex(coord)}')
-                self._logger.log_action('build_settlement', hex(coord))
-                self._moves_made += 1
-                self.current_turn_player.add_settlement(coord)
-                return True
-            else:
-                self._logger.log(f'{self.current_turn_player} failed to build settlement at {hex(coord)}')
-        else:
-            self._logger.log(f'{self.current_turn_player} cannot build settlement at {hex(coord)}')
-        return False
-
     def build_settlement(self, coord: int):
-        if self._game_state == GameStates.STARTING_SETTLEMENT:
-            if self._build_settlement(coord):
-                tiles = self._board.node_neighboring_tiles(self.current_turn_player.last_settlement_built)
-                for t in tiles:
-                    self.current_turn_player.add_tile(self._board.tiles[t])
-                if self.current_turn_player.settlements == 2:
-                    self._collect_resources(tiles, coord)
-                self._game_state.set_state(GameStates.STARTING_ROAD)
-                self.notify()
-        elif self._game_state.can_build_settlement(log=True):
-            if self._build_settlement(coord):
-                self.current_turn_player.remove_resource_cards(SETTLEMENT_COST)
-                self._add_resources(SETTLEMENT_COST)
-                tiles = self._board.node_neighboring_tiles(self.current_turn_player.last_settlement_built)
-                for t in tiles:
-                    self.current_turn_player.add_tile(self._board.tiles[t])
-                self._game_state.set_state(GameStates.INGAME)
-                self.notify()
+        self._step('build_settlement', coord)
 
     def can_build_city(self, node_coord: int) -> bool:
         return node_coord in self.legal_city_placements()
 
     def legal_city_placements(self) -> list[int]:
-        return self._board.legal_city_placements(self.current_turn_player.id)
+        return self.cached('legal_city_placements', self._legal_city_placements)
 
-    def _build_city(self, coord: int) -> bool:
-        if coord in self.legal_city_placements():
-            if self._board.build_city(coord, self.current_turn_player):
-                self._logger.log(f'{self.current_turn_player} upgraded to city at {hex(coord)}')
-                self._logger.log_action('build_city', hex(coord))
-                self._moves_made += 1
-                self.current_turn_player.add_city(coord)
-                return True
-            else:
-                self._logger.log(f'{self.current_turn_player} failed to upgrade city at {hex(coord)}')
-        else:
-            self._logger.log(f'{self.current_turn_player} cannot upgrade city at {hex(coord)}')
-        return False
+    def _legal_city_placements(self) -> list[int]:
+        return self._board.legal_city_placements(self.current_turn_player.id)
 
     def build_city(self, coord: int):
-        if self._game_state.can_build_city(log=True):
-            if self._build_city(coord):
-                self.current_turn_player.remove_resource_cards(CITY_COST)
-                self._add_resources(CITY_COST)
-                self._game_state.set_state(GameStates.INGAME)               
-                self.notify()
+        self._step('build_city', coord)
 
     def buy_dev_card(self, dev_card:DevCards = None):
-        if self._game_state.can_buy_dev_card(log=True):
-            if not dev_card:
-                dev_card = self._dev_cards.pop(0)
-            self.current_turn_player.add_dev_card(dev_card, self._turn)
-            self.current_turn_player.remove_resource_cards(DEV_CARD_COST)
-            self._add_resources(DEV_CARD_COST)
-            self._logger.log(f'{self.current_turn_player} bought a {dev_card.value} Dev Card')
-            self._logger.log_action('buy_dev_card', dev_card)         
-            self.notify()
+        self._step('buy_dev_card', dev_card)
 
     def move_robber(self, tile_coord: int):
-        if self._game_state.is_moving_robber(log=True):
-            if tile_coord != self.board.robber.coord:
-                self._board.move_robber(tile_coord)
-                self._logger.log(f'{self.current_player} moved the robber to {hex(tile_coord)}')
-                self._logger.log_action('move_robber', hex(tile_coord))
-                player_ids = [p_id for p_id in self._board.players_on_tile(tile_coord) if self.get_player_by_id(p_id).n_resource_cards > 0 and p_id != self.current_player.id]
-                if len(player_ids) == 1:
-                    self._game_state.set_state(GameStates.STEALING)
-                    self._players_to_steal_from = player_ids
-                elif player_ids:
-                    self._game_state.set_state(GameStates.STEALING)
-                    self._logger.log(f'{self.current_turn_player} is stealing')
-                    self._players_to_steal_from = player_ids
-                else:
-                    self._game_state.set_state(GameStates.INGAME)
-                self.notify()
-            else:
-                self._logger.log('Robber is already at that location')
-    
-    def _steal(self, player_id: int):
-        player_to_steal = self.get_player_by_id(player_id)
-        if player_id in self._players_to_steal_from:
-            if player_to_steal.n_resource_cards > 0:
-                card = self._prng.choice(player_to_steal.resource_cards_list)
-                player_to_steal.remove_resource_card(card)
-                self.current_turn_player.add_resource_card(card)
-                self._logger.log(f'{self.current_turn_player} stole a {card.value} from {player_to_steal}')
-                self._players_to_steal_from = []
-                self._game_state.set_state(GameStates.INGAME)
-                return True
-            else:
-                self._logger.log(f'{player_to_steal} has no cards to steal')
-        else:
-            self._logger.log(f'Cant steal from {player_to_steal}')
-        return False
+        self._step('move_robber', tile_coord)
 
     def steal(self, player_id: int):
-        if self._game_state.can_steal(log=True):
-            if self._steal(player_id):
-                self._logger.log_action('steal', player_id)
-                self.notify()
+        self._step('steal', player_id)
 
     def offer_trade(self, giving: list[tuple[ResourceCards, int]], wanting: list[tuple[ResourceCards, int]], players: list[int]):
-        if self._game_state.can_trade(log=True):
-            if self.current_turn_player.are_multiple_cards_in_hand(giving):
-                if wanting:
-                    if len(giving) == 1 and len(wanting) == 1 and not players:
-                        give_card, give_n = giving[0]
-                        want_card, want_n = wanting[0]
-                        if self._resource_card_counts[want_card] >= 1:
-                            if give_n == 4 and want_n == 1:
-                                self.current_turn_player.remove_resource_cards(giving)
-                                self.current_turn_player.add_resource_card(want_card)
-                                self._add_resources(giving)
-                                self._remove_resources(wanting)
-                                self._logger.log(f'{self.current_turn_player} traded 4 {give_card.value} for a {want_card.value}')
-                                self._logger.log_action('offer_trade', giving, wanting, players)
-                                self.notify()
-                                return
-                            if self.board.is_player_on_port(self.current_turn_player.id, PortTypes(give_card.value)) and give_n == 2 and want_n == 1:
-                                self.current_turn_player.remove_resource_cards(giving)
-                                self.current_turn_player.add_resource_card(want_card)
-                                self._add_resources(giving)
-                                self._remove_resources(wanting)
-                                self._logger.log(f'{self.current_turn_player} traded 2 {give_card.value} for a {want_card.value}')
-                                self._logger.log_action('offer_trade', giving, wanting, players)
-                                self.notify()
-                                return
-                            elif self.board.is_player_on_port(self.current_turn_player.id, PortTypes.ANY) and give_n == 3 and want_n == 1:
-                                self.current_turn_player.remove_resource_cards(giving)
-                                self.current_turn_player.add_resource_card(want_card)
-                                self._add_resources(giving)
-                                self._remove_resources(wanting)
-                                self._logger.log(f'{self.current_turn_player} traded 3 {give_card.value} for a {want_card.value}')
-                                self._logger.log_action('offer_trade', giving, wanting, players)
-                                self.notify()
-                                return
-                        else:
-                            self._logger.log(f'The bank does not have any {want_card.value} left')
-                    if players:
-                        s = f'{self.current_turn_player} wants to trade '
-                        for c, n in giving:
-                            s += f'{n} {c.value} '
-                        s += 'for '
-                        for c, n in wanting:
-                            s += f'{n} {c.value} '
-                        self._logger.log(s)
-                        self._logger.log_action('offer_trade', giving, wanting, players)
-                        
-                        for p_id in players:
-                            player = self.get_player_by_id(p_id)
-                            if player.are_multiple_cards_in_hand(wanting):
-                                self._players_accepting_trade.append(player.id)
-                            else:
-                                self._logger.log(f'{player} does not have the cards to trade')
-                        if self._players_accepting_trade:
-                            self._logger.log(f'{self.player_accepting_trade} accept or decline trade?')
-                            self._give_trade = giving
-                            self._want_trade = wanting
-                            self._game_state.set_state(GameStates.ACCEPTING_TRADE)
-                            self.notify()
-                        else:
-                            self._logger.log('No players have the requested card')
-                    else:
-                        self._logger.log('Specify players to trade with')
-                else:
-                    self._logger.log('Specify cards to trade for')
-            else:
-                self._logger.log(f'{self.current_turn_player} does not have specified cards to trade')
+        self._step('offer_trade', giving, wanting, players)
 
     def accept_trade(self):
-        if self._game_state.can_accept_decline_trade(log=True):
-            self._logger.log(f'{self.current_player} accepted trade')
-            self._logger.log_action('accept_trade')
-            p = self._players_accepting_trade.pop(0)
-            self._players_accepted_trade.append(p)
-            if not self._players_accepting_trade:
-                if self._players_accepted_trade:
-                    self._game_state.set_state(GameStates.CONFIRMING_TRADE)
-                else:
-                    self._game_state.set_state(GameStates.INGAME)
-            else:
-                self._logger.log(f'{self.player_accepting_trade} accept or decline trade?')   
-            self.notify()
+        self._step('accept_trade')
 
     def decline_trade(self):
-        if self._game_state.can_accept_decline_trade(log=True):
-            self._logger.log(f'{self.current_player} declined trade')
-            self._logger.log_action('decline_trade')
-            p = self._players_accepting_trade.pop(0)
-            if not self._players_accepting_trade:
-                if self._players_accepted_trade:
-                    self._game_state.set_state(GameStates.CONFIRMING_TRADE)
-                else:
-                    self._game_state.set_state(GameStates.INGAME)
-            else:
-                self._logger.log(f'{self.player_accepting_trade} accept or decline trade?')
-            self.notify()
+        self._step('decline_trade')
 
     def confirm_trade(self, player_id: int):
-        if self._game_state.can_confirm_trade(log=True):
-            player = self.get_player_by_id(player_id)
-            if player_id in self._players_accepted_trade:
-                self.current_turn_player.remove_resource_cards(self._give_trade)
-                self.current_turn_player.add_resource_cards(self._want_trade)
-                player.remove_resource_cards(self._want_trade)
-                player.add_resource_cards(self._give_trade)
-
-                s = f'{self.current_turn_player} traded '
-                for c, n in self._want_trade:
-                    s += f'{n} {c.value} '
-                s += f'to {player} for '
-                for c, n in self._give_trade:
-                    s += f'{n} {c.value} '
-                self._logger.log(s)
-                self._logger.log_action('confirm_trade', player_id)
-
-                self._game_state.set_state(GameStates.INGAME)
-                self._want_trade = []
-                self._give_trade = []
-                self._players_accepted_trade = []
-                self.notify()
-            else:
-                self._logger.log(f'Cannot trade with {player}')
+        self._step('confirm_trade', player_id)
 
     def play_knight(self):
-        if self._game_state.can_play_knight(log=True):
-            self._logger.log(f'{self.current_turn_player} played a Knight')
-            self._logger.log_action('play_knight')
-            self._game_state.set_state(GameStates.MOVING_ROBBER)
-            self.current_turn_player.remove_dev_card(DevCards.KNIGHT)
-            self._knight_played_this_turn = True
-            army = self.current_turn_player.knights_played
-            if army >= 3:
-                if not self.largest_army or (self.largest_army and army > self.largest_army.knights_played):
-                    self._largest_army = self.current_turn_player.id
-                    self.current_turn_player.largest_army = True
-                    self._logger.log(f'{self.current_turn_player} has the Largest Army')
-            self.notify()
+        self._step('play_knight')
 
     def play_monopoly(self, resource_card: ResourceCards):
-        if self._game_state.can_play_monopoly(log=True):
-            self._logger.log(f'{self.current_turn_player} played Monopoly on {resource_card.value}')
-            self._logger.log_action('play_monopoly', resource_card)
-            self.current_turn_player.remove_dev_card(DevCards.MONOPOLY)
-            removed = 0
-            for player in self.other_players:
-                removed += player.remove_all_resource_card(resource_card)
-                if not removed:
-                    self._logger.log(f'{player} payed {self.current_turn_player} {removed} {resource_card.value} due to Monopoly')
-            self.current_turn_player.add_resource_cards([(resource_card, removed)])
-            self.notify()
+        self._step('play_monopoly', resource_card)
 
     def play_road_builder(self):
-        if self._game_state.can_play_road_builder(log=True):
-            self._game_state.set_state(GameStates.ROADBUILDER)
-            self._free_roads = 2
-            self._logger.log(f'{self.current_turn_player} played Road Builder, build 2 roads for free')
-            self._logger.log_action('play_road_builder')
-            self.current_turn_player.remove_dev_card(DevCards.ROADBUILDER)
-            self.notify()
+        self._step('play_road_builder')
 
     def play_year_plenty(self, card1: ResourceCards, card2: ResourceCards):
-        if self._game_state.can_play_year_plenty(log=True):
-            if card1 and card2:
-                pickup_list = []
-                if card1 == card2:
-                    pickup_list = [(card1, 2)]
-                    self._logger.log(f'{self.current_turn_player} played Year of Plenty, picked up 2 {card1.value}')
-                else:
-                    pickup_list = [(card1, 1), (card2, 1)]
-                    self._logger.log(f'{self.current_turn_player} played Year of Plenty, picked up a {card1.value} and a {card2.value}')
-                self.current_turn_player.add_resource_cards(pickup_list)
-                self._remove_resources(pickup_list)
-                self.current_turn_player.remove_dev_card(DevCards.YEAR_PLENTY)
-                self._logger.log_action('play_year_plenty', card1, card2)
-                self.notify()
+        self._step('play_year_plenty', card1, card2)
 
     def get_state(self) -> dict:
+        record = self._record
         return {
-            'board': self._board.get_state(),
+            'board': {'layout': record.layout, 'nodes': record.nodes, 'edges': record.edges, 'robber': record.robber},
             'players': [player.get_state() for player in self._players],
             'logger': self._logger.get_state(),
             'prng': self._prng.getstate(),
-            'points_to_win': self.POINTS_TO_WIN,
-            'state': self._game_state.state,
-            'resource_card_counts': self._resource_card_counts.copy(),
-            'dev_cards': self._dev_cards.copy(),
-            'current_player_idx': self._current_player_idx,
-            'discarding_players': self._discarding_players.copy(),
-            'players_to_steal_from': self._players_to_steal_from.copy(),
-            'players_accepting_trade': self._players_accepting_trade.copy(),
-            'players_accepted_trade': self._players_accepted_trade.copy(),
-            'give_trade': self._give_trade.copy(),
-            'want_trade': self._want_trade.copy(),
-            'current_roll': self._current_roll,
-            'last_roll': self._last_roll,
-            'has_rolled': self._has_rolled,
-            'knight_played_this_turn': self._knight_played_this_turn,
-            'free_roads': self._free_roads,
-            'longest_road': self._longest_road,
-            'largest_army': self._largest_army,
-            'moves_made': self._moves_made,
-            'turn': self._turn
+            'points_to_win': record.points_to_win,
+            'state': record.state,
+            'resource_card_counts': self.resource_card_counts,
+            'dev_cards': list(record.dev_cards),
+            'current_player_idx': record.current_player_idx,
+            'discarding_players': list(record.discarding_players),
+            'players_to_steal_from': list(record.players_to_steal_from),
+            'players_accepting_trade': list(record.players_accepting_trade),
+            'players_accepted_trade': list(record.players_accepted_trade),
+            'give_trade': list(record.give_trade),
+            'want_trade': list(record.want_trade),
+            'current_roll': record.current_roll,
+            'last_roll': record.last_roll,
+            'has_rolled': record.has_rolled,
+            'knight_played_this_turn': record.knight_played_this_turn,
+            'free_roads': record.free_roads,
+            'longest_road': record.longest_road,
+            'largest_army': record.largest_army,
+            'moves_made': record.moves_made,
+            'turn': record.turn
         }
 
     def restore(self, state: dict):
-        self._board = Board.create_from_state(state['board'])
+        self._board = type(self._board).create_from_state(state['board'])
         self._players = [Player.create_from_state(s) for s in state['players']]
-        self._logger = Logger.create_from_state(state['logger'])
-        self._prng.setstate(state['prng'])
-        self.POINTS_TO_WIN = state['points_to_win']
-        self._game_state.set_state(state['state'])
-        self._resource_card_counts = state['resource_card_counts'].copy()
-        self._dev_cards = state['dev_cards'].copy()
-        self._current_player_idx = state['current_player_idx']
-        self._discarding_players = state['discarding_players'].copy()
-        self._players_to_steal_from = state['players_to_steal_from'].copy()
-        self._players_accepting_trade = state['players_accepting_trade'].copy()
-        self._players_accepted_trade = state['players_accepted_trade'].copy()
-        self._give_trade = state['give_trade'].copy()
-        self._want_trade = state['want_trade'].copy()
-        self._current_roll = state['current_roll']
-        self._last_roll = state['last_roll']
-        self._has_rolled = state['has_rolled']
-        self._knight_played_this_turn = state['knight_played_this_turn']
-        self._free_roads = state['free_roads']
-        self._longest_road = state['longest_road']
-        self._largest_army = state['largest_army']
-        self._moves_made = state['moves_made']
-        self._turn = state['turn']
+        # Binary snapshots carry no logs, the current logger is kept
+        if 'logger' in state:
+            self._logger = Logger.create_from_state(state['logger'])
+        # The state decides the kind of PRNG
+        self._prng = rng_from_state(state['prng'], self._prng)
+        self._record = reducer.record_from_state(state, [player.record() for player in self._players], self._record.starting_player_idx)
+        self._init_hash()
+        self._touch()
 
     @staticmethod
     def create_from_state(state: dict) -> 'Game':
@@ -872,11 +722,84 @@ class Game(object):
         game.restore(state)
         game.notify(new=True, update=False)
         return game
+
+    def to_bytes(self) -> bytes:
+        return encode_state(self.get_state())
+
+    @staticmethod
+    def from_bytes(data: bytes, logger: Logger = None, board_type: type = Board, lean: bool = False) -> 'Game':
+        game = Game(logger=logger, board_type=board_type, lean=lean)
+        game.restore(decode_state(data))
+        game.notify(new=True, update=False)
+        return game
     
+    def fork(self) -> 'Game':
+        # Independent copy for lookahead. Shares the static board layout and the
+        # record, has no observers and its history starts at the current state.
+        game = Game.__new__(Game)
+        game.__dict__.update(self.__dict__)
+        game._board = self._board.fork()
+        game._players = [player.fork() for player in self._players]
+        game._logger = self._logger.fork()
+        game._prng = rng_from_state(self._prng.getstate())
+        game._game_state = CatanGameState(game)
+        game._observers = set()
+        game._journal = StateJournal(max_entries=self._history_limit)
+        game._player_hashes = self._player_hashes.copy()
+        game.notify(new=True, update=False)
+        return game
+
+    def apply(self, action: tuple) -> UndoToken:
+        # Make/unmake for tree search. Runs the action in place without logging,
+        # observers or history and returns what unapply needs to revert it.
+        function, args = action
+        if function not in ACTIONS:
+            raise ValueError(f'Unknown action {function}')
+        record = self._record
+        # Production and diversity are not in the record, a settlement adds tiles to them
+        players = ()
+        if function == 'build_settlement':
+            player = self.current_turn_player
+            players = ((player, player.checkpoint()),)
+        prng = self._prng.getstate() if function in ('roll', 'steal') else None
+        hashes = self._hash, self._bank_hash, self._turn_hash, tuple(self._player_hashes)
+        version = self._version, self._legality_cache
+
+        modes = self._logging, self._history, self._notify_observers
+        self._logging = self._history = self._notify_observers = False
+        try:
+            getattr(self, function)(*args)
+        finally:
+            self._logging, self._history, self._notify_observers = modes
+
+        board = None
+        if function in ('build_road', 'build_settlement', 'build_city') and self._record.moves_made > record.moves_made:
+            board = ('un' + function, args[0])
+        elif function == 'move_robber' and self._record.robber != record.robber:
+            board = ('move_robber', record.robber.coord)
+        return UndoToken(record, players, prng, board, hashes, version)
+
+    def unapply(self, token: UndoToken):
+        # Reverts the last apply, tokens must be unapplied in reverse order
+        if token.board is not None:
+            function, coord = token.board
+            getattr(self._board, function)(coord)
+        for player, before, after in zip(self._players, token.record.players, self._record.players):
+            if before is not after:
+                player.sync(before)
+        for player, checkpoint in token.players:
+            player.rollback(checkpoint)
+        self._record = token.record
+        if token.prng is not None:
+            self._prng.setstate(token.prng)
+        self._hash, self._bank_hash, self._turn_hash, player_hashes = token.hashes
+        self._player_hashes = list(player_hashes)
+        # Back to the exact state of that version, its cache is valid again
+        self._version, self._legality_cache = token.version
+
     def undo(self, update:bool = True):
         if self.can_undo:
-            self._state_idx -= 1
-            self.restore(self._stored_states[self._state_idx])
+            self.restore(self._journal.undo())
             self.notify(new=False, update=update)
             return True
         else:
@@ -885,8 +808,7 @@ class Game(object):
     
     def redo(self, update: bool = True):
         if self.can_redo:
-            self._state_idx += 1
-            self.restore(self._stored_states[self._state_idx])
+            self.restore(self._journal.redo())
             self.notify(new=False, update=update)
             return True
         else:
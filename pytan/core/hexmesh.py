@@ -1,4 +1,9 @@
 from enum import Enum
+from functools import lru_cache
+
+# Coords pack a row and a column digit as row * base + col. The direction tables
+# below are written for base 16, which fits meshes of up to 3 layers.
+COORD_BASE = 16
 
 class Directions(Enum):
     N = 'N'
@@ -91,103 +96,224 @@ EN_DIRS = {
     'NW': +0x00
 }
 
-def direction_to_tile(tile_1_coord: int, tile_2_coord: int) -> Directions:
+def coord_base(n_layers: int) -> int:
+    base = COORD_BASE
+    while 4 * n_layers + 3 >= base:
+        base *= COORD_BASE
+    return base
+
+def rescale_offset(offset: int, base: int) -> int:
+    # Table offsets step at most 2 rows and 2 columns, so the row step rounds out
+    row = round(offset / COORD_BASE)
+    return row * base + offset - row * COORD_BASE
+
+def scale_dirs(dirs: dict[str, int], base: int) -> dict[str, int]:
+    if base == COORD_BASE:
+        return dirs
+    return {key: rescale_offset(value, base) for key, value in dirs.items()}
+
+def direction_to_tile(tile_1_coord: int, tile_2_coord: int, base: int = COORD_BASE) -> Directions:
     offset = tile_2_coord - tile_1_coord
-    for key, value in TT_DIRS.items():
+    for key, value in scale_dirs(TT_DIRS, base).items():
         if value == offset:
             return Directions(key)
     return None
 
-def tile_to_node_direction(tile_coord: int, node_coord: int) -> Directions:
+def tile_to_node_direction(tile_coord: int, node_coord: int, base: int = COORD_BASE) -> Directions:
     offset = node_coord - tile_coord
-    for key, value in TN_DIRS.items():
+    for key, value in scale_dirs(TN_DIRS, base).items():
         if value == offset:
             return Directions(key)
     return None
 
-def tile_to_edge_direction(tile_coord: int, edge_coord: int) -> Directions:
+def tile_to_edge_direction(tile_coord: int, edge_coord: int, base: int = COORD_BASE) -> Directions:
     offset = edge_coord - tile_coord
-    for key, value in TE_DIRS.items():
+    for key, value in scale_dirs(TE_DIRS, base).items():
         if value == offset:
             return Directions(key)
     return None
 
-def node_in_direction(tile_coord: int, direction: Directions) -> int:
-    return tile_coord + TN_DIRS[direction.value]
+def node_in_direction(tile_coord: int, direction: Directions, base: int = COORD_BASE) -> int:
+    return tile_coord + scale_dirs(TN_DIRS, base)[direction.value]
 
-def edge_in_direction(tile_coord: int, direction: Directions) -> int:
-    return tile_coord + TE_DIRS[direction.value]
+def edge_in_direction(tile_coord: int, direction: Directions, base: int = COORD_BASE) -> int:
+    return tile_coord + scale_dirs(TE_DIRS, base)[direction.value]
 
-def hex_digits(coord: int) -> tuple[int, int]:
-    h = hex(coord).replace('0x', '')
-    d1 = int(h[0], 16)
-    d2 = 0
-    try:
-        d2 = int(h[1], 16)
-    except IndexError:
-        d2 = d1
-        d1 = 0
-    return d1, d2
+def hex_digits(coord: int, base: int = COORD_BASE) -> tuple[int, int]:
+    return divmod(coord, base)
 
-def tile_neighboring_tiles(tile_coord: int) -> list[int]:
+def tile_neighboring_tiles(tile_coord: int, base: int = COORD_BASE) -> list[int]:
     tiles = []
-    for d in TT_DIRS.values():
+    for d in scale_dirs(TT_DIRS, base).values():
         tiles.append(tile_coord + d)
     return tiles
 
-def tile_neighboring_nodes(tile_coord: int) -> list[int]:
+def tile_neighboring_nodes(tile_coord: int, base: int = COORD_BASE) -> list[int]:
     nodes = []
-    for d in TN_DIRS.values():
+    for d in scale_dirs(TN_DIRS, base).values():
         nodes.append(tile_coord + d)
     return nodes
 
-def tile_neighboring_edges(tile_coord: int) -> list[int]:
+def tile_neighboring_edges(tile_coord: int, base: int = COORD_BASE) -> list[int]:
     edges = []
-    for d in TE_DIRS.values():
+    for d in scale_dirs(TE_DIRS, base).values():
         edges.append(tile_coord + d)
     return edges
     
+def generate_tiles(n_layers: int) -> list[int]:
+    base = coord_base(n_layers)
+    tt_dirs = scale_dirs(TT_DIRS, base)
+    tiles = {}
+    next_tile = base + 1
+    for n in range(n_layers, 0, -1):
+        tiles[next_tile] = None
+        for d in tt_dirs.values():
+            r = n
+            if d == tt_dirs['NW']:
+                r -= 1
+            for i in range(r):
+                next_tile += d
+                tiles[next_tile] = None
+        next_tile += tt_dirs['NE']
+    tiles[next_tile] = None
+    return list(reversed(list(tiles.keys())))
+
+def _node_neighboring_tiles(node_coord: int, base: int = COORD_BASE) -> list[int]:
+    d1, d2 = hex_digits(node_coord, base)
+    dirs = scale_dirs(NT_DIRS, base)
+    if d2 % 2 == 0:
+        return [node_coord + dirs['NE'], node_coord + dirs['S'], node_coord + dirs['NW']]
+    return [node_coord + dirs['N'], node_coord + dirs['SE'], node_coord + dirs['SW']]
+
+def _node_neighboring_nodes(node_coord: int, base: int = COORD_BASE) -> list[int]:
+    d1, d2 = hex_digits(node_coord, base)
+    dirs = scale_dirs(NN_DIRS, base)
+    if d2 % 2 == 0:
+        return [node_coord + dirs['N'], node_coord + dirs['SE'], node_coord + dirs['SW']]
+    return [node_coord + dirs['NE'], node_coord + dirs['S'], node_coord + dirs['NW']]
+
+def _node_neighboring_edges(node_coord: int, base: int = COORD_BASE) -> list[int]:
+    d1, d2 = hex_digits(node_coord, base)
+    dirs = scale_dirs(NE_DIRS, base)
+    if d2 % 2 == 0:
+        return [node_coord + dirs['N'], node_coord + dirs['SE'], node_coord + dirs['SW']]
+    return [node_coord + dirs['NE'], node_coord + dirs['S'], node_coord + dirs['NW']]
+
+def _edge_neighboring_tiles(edge_coord: int, base: int = COORD_BASE) -> list[int]:
+    d1, d2 = hex_digits(edge_coord, base)
+    dirs = scale_dirs(ET_DIRS, base)
+    if d1 % 2 == 0 and d2 % 2 == 0:
+        return [edge_coord + dirs['E'], edge_coord + dirs['W']]
+    elif d1 % 2 == 0:
+        return [edge_coord + dirs['SE'], edge_coord + dirs['NW']]
+    return [edge_coord + dirs['NE'], edge_coord + dirs['SW']]
+
+def _edge_neighboring_nodes(edge_coord: int, base: int = COORD_BASE) -> list[int]:
+    d1, d2 = hex_digits(edge_coord, base)
+    dirs = scale_dirs(EN_DIRS, base)
+    if d1 % 2 == 0 and d2 % 2 == 0:
+        return [edge_coord + dirs['N'], edge_coord + dirs['S']]
+    elif d1 % 2 == 0:
+        return [edge_coord + dirs['NE'], edge_coord + dirs['SW']]
+    return [edge_coord + dirs['SE'], edge_coord + dirs['NW']]
+
+def _edge_neighboring_edges(edge_coord: int, base: int = COORD_BASE) -> list[int]:
+    d1, d2 = hex_digits(edge_coord, base)
+    dirs = scale_dirs(EE_DIRS, base)
+    if d1 % 2 == 0 and d2 % 2 == 0:
+        keys = ['NE', 'SE', 'SW', 'NW']
+    elif d1 % 2 == 0:
+        keys = ['NE', 'E', 'SW', 'W']
+    else:
+        keys = ['E', 'SE', 'W', 'NW']
+    return [edge_coord + dirs[d] for d in keys]
+
+class Topology(object):
+    # Static adjacency for a mesh of n_layers, shared by every HexMesh of that size.
+    # coord tables: coord -> neighbor coords, index tables: dense index -> neighbor indices
+    def __init__(self, n_layers: int):
+        self.n_layers = n_layers
+        self.base = coord_base(n_layers)
+        self.tiles = tuple(generate_tiles(n_layers))
+        base = self.base
+
+        nodes = {}
+        edges = {}
+        for tile in self.tiles:
+            for node in tile_neighboring_nodes(tile, base):
+                nodes[node] = None
+            for edge in tile_neighboring_edges(tile, base):
+                edges[edge] = None
+        self.nodes = tuple(nodes)
+        self.edges = tuple(edges)
+
+        self.tile_index = {coord: i for i, coord in enumerate(self.tiles)}
+        self.node_index = {coord: i for i, coord in enumerate(self.nodes)}
+        self.edge_index = {coord: i for i, coord in enumerate(self.edges)}
+
+        def existing(coords: list[int], index: dict[int, int]) -> tuple[int]:
+            return tuple(c for c in coords if c in index)
+
+        self.tile_nodes = {t: tuple(tile_neighboring_nodes(t, base)) for t in self.tiles}
+        self.tile_edges = {t: tuple(tile_neighboring_edges(t, base)) for t in self.tiles}
+        self.node_tiles = {n: existing(_node_neighboring_tiles(n, base), self.tile_index) for n in self.nodes}
+        self.node_nodes = {n: existing(_node_neighboring_nodes(n, base), self.node_index) for n in self.nodes}
+        self.node_edges = {n: existing(_node_neighboring_edges(n, base), self.edge_index) for n in self.nodes}
+        self.edge_tiles = {e: existing(_edge_neighboring_tiles(e, base), self.tile_index) for e in self.edges}
+        self.edge_nodes = {e: existing(_edge_neighboring_nodes(e, base), self.node_index) for e in self.edges}
+        self.edge_edges = {e: existing(_edge_neighboring_edges(e, base), self.edge_index) for e in self.edges}
+
+        def indexed(table: dict[int, tuple], index: dict[int, int]) -> tuple[tuple[int]]:
+            return tuple(tuple(index[c] for c in coords) for coords in table.values())
+
+        self.tile_node_indices = indexed(self.tile_nodes, self.node_index)
+        self.node_node_indices = indexed(self.node_nodes, self.node_index)
+        self.node_edge_indices = indexed(self.node_edges, self.edge_index)
+        self.edge_node_indices = indexed(self.edge_nodes, self.node_index)
+        self.edge_edge_indices = indexed(self.edge_edges, self.edge_index)
+
+    @property
+    def n_tiles(self) -> int:
+        return len(self.tiles)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edges)
+
+    def __repr__(self):
+        return f'Topology - N_Layers: {self.n_layers} - Tiles: {self.n_tiles} - Nodes: {self.n_nodes} - Edges: {self.n_edges}'
+
+@lru_cache(maxsize=None)
+def get_topology(n_layers: int) -> Topology:
+    return Topology(n_layers)
+
 class HexMesh(object):
     def __init__(self, n_layers: int = 0):
         #Init
         self._n_layers = n_layers
+        self._topology = get_topology(n_layers)
         self._init_tiles()
         self.init_nodes()
         self.init_edges()
 
     def _init_tiles(self):
-        self._tiles = {}
-
-        next_tile = 0x11
-        for n in range(self._n_layers, 0, -1):
-            self._tiles[next_tile] = None
-            for d in TT_DIRS.values():
-                r = n
-                if d == TT_DIRS['NW']:
-                    r -= 1
-                for i in range(r):
-                    next_tile += d
-                    self._tiles[next_tile] = None
-            next_tile += TT_DIRS['NE']
-        self._tiles[next_tile] = None
-
-        self._tiles = dict(reversed(list(self._tiles.items())))
-
+        self._tiles = dict.fromkeys(self._topology.tiles)
         self._n_tiles = len(self._tiles)
 
     def init_nodes(self):
-        self._nodes = {}
-        for tile in self._tiles:
-            nodes = tile_neighboring_nodes(tile)
-            for node in nodes:
-                self._nodes[node] = None
+        self._nodes = dict.fromkeys(self._topology.nodes)
 
     def init_edges(self):
-        self._edges = {}
-        for tile in self._tiles:
-            edges = tile_neighboring_edges(tile)
-            for edge in edges:
-                self._edges[edge] = None
+        self._edges = dict.fromkeys(self._topology.edges)
+
+    @property
+    def topology(self) -> Topology:
+        return self._topology
+
     @property
     def tile_matrix_coords(self):
         return self._tile_matrix_coords
@@ -230,105 +356,55 @@ class HexMesh(object):
         return {k: self._tiles[k] for k in list(reversed(list(self._tiles.keys())[-n:]))}
 
     def tile_neighboring_tiles(self, tile_coord: int) -> list[int]:
-        return tile_neighboring_tiles(tile_coord)
+        return tile_neighboring_tiles(tile_coord, self._topology.base)
 
-    def tile_neighboring_nodes(self, tile_coord: int) -> list[int]:
-        return tile_neighboring_nodes(tile_coord)
+    def tile_neighboring_nodes(self, tile_coord: int) -> tuple[int]:
+        try:
+            return self._topology.tile_nodes[tile_coord]
+        except KeyError:
+            return tuple(tile_neighboring_nodes(tile_coord, self._topology.base))
 
-    def tile_neighboring_edges(self, tile_coord: int) -> list[int]:
-        return tile_neighboring_edges(tile_coord)
+    def tile_neighboring_edges(self, tile_coord: int) -> tuple[int]:
+        try:
+            return self._topology.tile_edges[tile_coord]
+        except KeyError:
+            return tuple(tile_neighboring_edges(tile_coord, self._topology.base))
 
     def node_neighboring_tiles(self, node_coord: int) -> dict[int, None]:
-        tiles = []
-        d1, d2 = hex_digits(node_coord)
-        if d2 % 2 == 0:
-            tiles.append(node_coord + NT_DIRS['NE'])
-            tiles.append(node_coord + NT_DIRS['S'])
-            tiles.append(node_coord + NT_DIRS['NW'])
-        else:
-            tiles.append(node_coord + NT_DIRS['N'])
-            tiles.append(node_coord + NT_DIRS['SE'])
-            tiles.append(node_coord + NT_DIRS['SW'])
-
-        return self.confirm_tiles_exist(tiles)
+        try:
+            return {tile: self._tiles[tile] for tile in self._topology.node_tiles[node_coord]}
+        except KeyError:
+            return self.confirm_tiles_exist(_node_neighboring_tiles(node_coord, self._topology.base))
 
     def node_neighboring_nodes(self, node_coord: int) -> dict[int, None]:
-        nodes = []
-        d1, d2 = hex_digits(node_coord)
-        if d2 % 2 == 0:
-            nodes.append(node_coord + NN_DIRS['N'])
-            nodes.append(node_coord + NN_DIRS['SE'])
-            nodes.append(node_coord + NN_DIRS['SW'])
-        else:
-            nodes.append(node_coord + NN_DIRS['NE'])
-            nodes.append(node_coord + NN_DIRS['S'])
-            nodes.append(node_coord + NN_DIRS['NW'])
-
-        return self.confirm_nodes_exist(nodes)
+        try:
+            return {node: self._nodes[node] for node in self._topology.node_nodes[node_coord]}
+        except KeyError:
+            return self.confirm_nodes_exist(_node_neighboring_nodes(node_coord, self._topology.base))
 
     def node_neighboring_edges(self, node_coord: int) -> dict[int, None]:
-        edges = []
-        d1, d2 = hex_digits(node_coord)
-        if d2 % 2 == 0:
-            edges.append(node_coord + NE_DIRS['N'])
-            edges.append(node_coord + NE_DIRS['SE'])
-            edges.append(node_coord + NE_DIRS['SW'])
-        else:
-            edges.append(node_coord + NE_DIRS['NE'])
-            edges.append(node_coord + NE_DIRS['S'])
-            edges.append(node_coord + NE_DIRS['NW'])
-
-        return self.confirm_edges_exist(edges)
+        try:
+            return {edge: self._edges[edge] for edge in self._topology.node_edges[node_coord]}
+        except KeyError:
+            return self.confirm_edges_exist(_node_neighboring_edges(node_coord, self._topology.base))
 
     def edge_neighboring_tiles(self, edge_coord: int) -> dict[int, None]:
-        tiles = []
-        d1, d2 = hex_digits(edge_coord)
-        if d1 % 2 == 0 and d2 % 2 == 0:
-            tiles.append(edge_coord + ET_DIRS['E'])
-            tiles.append(edge_coord + ET_DIRS['W'])
-        elif d1 % 2 == 0:
-            tiles.append(edge_coord + ET_DIRS['SE'])
-            tiles.append(edge_coord + ET_DIRS['NW'])
-        else:
-            tiles.append(edge_coord + ET_DIRS['NE'])
-            tiles.append(edge_coord + ET_DIRS['SW'])
-
-        return self.confirm_tiles_exist(tiles)
+        try:
+            return {tile: self._tiles[tile] for tile in self._topology.edge_tiles[edge_coord]}
+        except KeyError:
+            return self.confirm_tiles_exist(_edge_neighboring_tiles(edge_coord, self._topology.base))
 
     def edge_neighboring_nodes(self, edge_coord: int) -> dict[int, None]:
-        nodes = []
-        d1, d2 = hex_digits(edge_coord)
-        if d1 % 2 == 0 and d2 % 2 == 0:
-            nodes.append(edge_coord + EN_DIRS['N'])
-            nodes.append(edge_coord + EN_DIRS['S'])
-        elif d1 % 2 == 0:
-            nodes.append(edge_coord + EN_DIRS['NE'])
-            nodes.append(edge_coord + EN_DIRS['SW'])
-        else:
-            nodes.append(edge_coord + EN_DIRS['SE'])
-            nodes.append(edge_coord + EN_DIRS['NW'])
-
-        return self.confirm_nodes_exist(nodes)
+        try:
+            return {node: self._nodes[node] for node in self._topology.edge_nodes[edge_coord]}
+        except KeyError:
+            return self.confirm_nodes_exist(_edge_neighboring_nodes(edge_coord, self._topology.base))
     
     def edge_neighboring_edges(self, edge_coord: int) -> dict[int, None]:
-        edges = []
-        d1, d2 = hex_digits(edge_coord)
-        if d1 % 2 == 0 and d2 % 2 == 0:
-            edges.append(edge_coord + EE_DIRS['NE'])
-            edges.append(edge_coord + EE_DIRS['SE'])
-            edges.append(edge_coord + EE_DIRS['SW'])
-            edges.append(edge_coord + EE_DIRS['NW'])
-        elif d1 % 2 == 0:
-            edges.append(edge_coord + EE_DIRS['NE'])
-            edges.append(edge_coord + EE_DIRS['E'])
-            edges.append(edge_coord + EE_DIRS['SW'])
-            edges.append(edge_coord + EE_DIRS['W'])
-        else:
-            edges.append(edge_coord + EE_DIRS['E'])
-            edges.append(edge_coord + EE_DIRS['SE'])
-            edges.append(edge_coord + EE_DIRS['W'])
-            edges.append(edge_coord + EE_DIRS['NW'])
-        return self.confirm_edges_exist(edges)
+        try:
+            return {edge: self._edges[edge] for edge in self._topology.edge_edges[edge_coord]}
+        except KeyError:
+            return self.confirm_edges_exist(_edge_neighboring_edges(edge_coord, self._topology.base))
 
     def nearest_tile_to_node(self, node_coord: int) -> int:
         tiles = self.node_neighboring_tiles(node_coord)
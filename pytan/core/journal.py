@@ -0,0 +1,188 @@
+from collections import namedtuple
+import sys
+
+# A field whose value was swapped out
+Replace = namedtuple('Replace', ['old', 'new'])
+# A list that only grew, like the logs, keeps just the new entries
+Append = namedtuple('Append', ['length', 'tail'])
+# A state dict, list or tuple where only some of the fields changed
+Patch = namedtuple('Patch', ['changes'])
+
+def diff(old, new):
+    # Smallest reversible delta turning old into new, None when nothing changed.
+    # Dicts keyed by field name, lists of them and plain tuples like the board
+    # occupancy or the PRNG state are patched field by field.
+    if old is new:
+        return None
+    if type(old) == dict and type(new) == dict and old.keys() == new.keys() and all(type(key) == str for key in new):
+        changes = {}
+        for key, value in new.items():
+            change = diff(old[key], value)
+            if change is not None:
+                changes[key] = change
+        return Patch(changes) if changes else None
+    if type(old) == list and type(new) == list:
+        if len(old) == len(new) and old and type(old[0]) == dict:
+            changes = {}
+            for i, value in enumerate(new):
+                change = diff(old[i], value)
+                if change is not None:
+                    changes[i] = change
+            return Patch(changes) if changes else None
+        if len(old) < len(new) and new[:len(old)] == old:
+            return Append(len(old), new[len(old):])
+    if type(old) == tuple and type(new) == tuple and len(old) == len(new):
+        changes = {}
+        for i, (o, n) in enumerate(zip(old, new)):
+            if o is not n and not (type(o) == type(n) and o == n):
+                changes[i] = diff(o, n)
+        return Patch(changes) if changes else None
+    if type(old) == type(new) and old == new:
+        return None
+    return Replace(old, new)
+
+def patched(value, changes: dict, step):
+    items = list(value) if type(value) == tuple else value.copy()
+    for key, change in changes.items():
+        items[key] = step(items[key], change)
+    return tuple(items) if type(value) == tuple else items
+
+def apply(value, delta):
+    if type(delta) == Patch:
+        return patched(value, delta.changes, apply)
+    if type(delta) == Append:
+        return value + delta.tail
+    return delta.new
+
+def revert(value, delta):
+    if type(delta) == Patch:
+        return patched(value, delta.changes, revert)
+    if type(delta) == Append:
+        return value[:delta.length]
+    return delta.old
+
+def nbytes(value) -> int:
+    # Approximate bytes held by a delta, shared values are counted every time
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(nbytes(v) for v in value)
+    elif isinstance(value, dict):
+        size += sum(nbytes(v) for v in value.values())
+    return size
+
+class StateJournal(object):
+    # Undo/redo history of game states. Entries after the first hold only the
+    # delta from the previous state, every keyframe_interval entries a full state
+    # is kept as well so any entry can be rebuilt without replaying the journal.
+    # With max_entries set only the last max_entries states are kept, the oldest
+    # is evicted and the next one becomes the new full first state.
+    def __init__(self, keyframe_interval: int = 64, max_entries: int = None):
+        assert max_entries is None or max_entries > 0
+        self._keyframe_interval = keyframe_interval
+        self._max_entries = max_entries
+        self._deltas = []
+        self._sizes = []
+        self._nbytes = 0
+        # Keyframes are keyed by position since the start, evicted entries included
+        self._keyframes = {}
+        self._evicted = 0
+        self._index = -1
+        self._current = None
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def current(self) -> dict:
+        return self._current
+
+    @property
+    def keyframes(self) -> dict[int, dict]:
+        return self._keyframes
+
+    @property
+    def max_entries(self) -> int:
+        return self._max_entries
+
+    @max_entries.setter
+    def max_entries(self, max_entries: int):
+        assert max_entries is None or max_entries > 0
+        self._max_entries = max_entries
+        self._trim()
+
+    @property
+    def evicted(self) -> int:
+        return self._evicted
+
+    @property
+    def nbytes(self) -> int:
+        # Deltas only, keyframes share almost everything with their neighbors
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._deltas)
+
+    def record(self, state: dict):
+        # Anything past the current index belonged to an undone branch
+        self._nbytes -= sum(self._sizes[self._index + 1:])
+        del self._deltas[self._index + 1:]
+        del self._sizes[self._index + 1:]
+        for i in [i for i in self._keyframes if i > self._evicted + self._index]:
+            del self._keyframes[i]
+        if self._current is None:
+            delta = None
+        else:
+            delta = diff(self._current, state)
+            state = self._current if delta is None else apply(self._current, delta)
+        self._deltas.append(delta)
+        self._sizes.append(0 if delta is None else nbytes(delta))
+        self._nbytes += self._sizes[-1]
+        self._index += 1
+        self._current = state
+        if (self._evicted + self._index) % self._keyframe_interval == 0:
+            self._keyframes[self._evicted + self._index] = state
+        self._trim()
+
+    def _trim(self):
+        # The current state is never evicted
+        while self._max_entries is not None and len(self._deltas) > self._max_entries and self._index > 0:
+            first = self._keyframes.pop(self._evicted)
+            self._evicted += 1
+            self._nbytes -= self._sizes[1]
+            delta = self._deltas[1]
+            if self._evicted not in self._keyframes:
+                self._keyframes[self._evicted] = first if delta is None else apply(first, delta)
+            del self._deltas[0], self._sizes[0]
+            self._deltas[0] = None
+            self._sizes[0] = 0
+            self._index -= 1
+
+    def undo(self) -> dict:
+        delta = self._deltas[self._index]
+        if delta is not None:
+            self._current = revert(self._current, delta)
+        self._index -= 1
+        return self._current
+
+    def redo(self) -> dict:
+        self._index += 1
+        delta = self._deltas[self._index]
+        if delta is not None:
+            self._current = apply(self._current, delta)
+        return self._current
+
+    def __getitem__(self, index: int) -> dict:
+        if index < 0:
+            index += len(self._deltas)
+        if not 0 <= index < len(self._deltas):
+            raise IndexError(index)
+        if index == self._index:
+            return self._current
+        position = self._evicted + index
+        start = max(position - position % self._keyframe_interval, self._evicted)
+        state = self._keyframes[start]
+        for delta in self._deltas[start - self._evicted + 1:index + 1]:
+            if delta is not None:
+                state = apply(state, delta)
+        return state
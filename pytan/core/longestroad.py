@@ -0,0 +1,88 @@
+from pytan.core.hexmesh import Topology
+
+def longest_trail(roads: frozenset[int], topology: Topology, is_blocked) -> int:
+    # Longest edge-disjoint trail through a set of roads. A trail may end on a
+    # blocked node (enemy piece) but never pass through it. Memoized on
+    # (node, used roads) with the used roads packed into a bitmask.
+    bits = {road: 1 << i for i, road in enumerate(roads)}
+    incident = {}
+    for road in roads:
+        for node in topology.edge_nodes[road]:
+            incident.setdefault(node, []).append(road)
+    blocked = {node for node in incident if is_blocked(node)}
+    memo = {}
+
+    def extend(node: int, used: int) -> int:
+        if used and node in blocked:
+            return 0
+        key = (node, used)
+        if key in memo:
+            return memo[key]
+        best = 0
+        for road in incident[node]:
+            bit = bits[road]
+            if not used & bit:
+                n1, n2 = topology.edge_nodes[road]
+                best = max(best, 1 + extend(n2 if n1 == node else n1, used | bit))
+        memo[key] = best
+        return best
+
+    return max((extend(node, 0) for node in incident), default=0)
+
+def connected_roads(roads: set[int], topology: Topology, is_blocked) -> list[frozenset[int]]:
+    # Split roads into groups connected through nodes that are not blocked
+    components = []
+    unexplored = set(roads)
+    while unexplored:
+        start = unexplored.pop()
+        component = {start}
+        frontier = [start]
+        while frontier:
+            road = frontier.pop()
+            for node in topology.edge_nodes[road]:
+                if is_blocked(node):
+                    continue
+                for neighbor in topology.node_edges[node]:
+                    if neighbor in unexplored:
+                        unexplored.discard(neighbor)
+                        component.add(neighbor)
+                        frontier.append(neighbor)
+        components.append(frozenset(component))
+    return components
+
+# A player's roads as connected components, each with its longest trail, in
+# tuples so game records can share them. Builds only recompute the components
+# they touch.
+def road_components(roads: set[int], topology: Topology, is_blocked) -> tuple[tuple[frozenset[int], int]]:
+    return tuple((component, longest_trail(component, topology, is_blocked)) for component in connected_roads(roads, topology, is_blocked))
+
+def longest_road_chain(components: tuple[tuple[frozenset[int], int]]) -> int:
+    return max((length for component, length in components), default=0)
+
+def add_road(components: tuple[tuple[frozenset[int], int]], edge_coord: int, topology: Topology, is_blocked) -> tuple[tuple[frozenset[int], int]]:
+    # The new road merges the components it touches through open nodes
+    neighbors = set()
+    for node in topology.edge_nodes[edge_coord]:
+        if not is_blocked(node):
+            neighbors.update(topology.node_edges[node])
+    merged = {edge_coord}
+    kept = []
+    for component, length in components:
+        if neighbors.isdisjoint(component):
+            kept.append((component, length))
+        else:
+            merged.update(component)
+    merged = frozenset(merged)
+    return tuple(kept) + ((merged, longest_trail(merged, topology, is_blocked)),)
+
+def split_at(components: tuple[tuple[frozenset[int], int]], node_coord: int, topology: Topology, is_blocked) -> tuple[tuple[frozenset[int], int]]:
+    # An enemy piece on node_coord may have cut the components through it in two
+    edges = topology.node_edges[node_coord]
+    kept = []
+    split = []
+    for component, length in components:
+        if any(edge in component for edge in edges):
+            split.extend(road_components(component, topology, is_blocked))
+        else:
+            kept.append((component, length))
+    return tuple(kept) + tuple(split)
@@ -1,16 +1,77 @@
 from pytan.core.cards import ResourceCards, DevCards, ROAD_COST, SETTLEMENT_COST, CITY_COST, DEV_CARD_COST
 from pytan.core.tiles import CatanTile, TileTypes
-from collections import defaultdict
-import copy
+from collections import defaultdict, namedtuple
+from operator import ge
+
+RESOURCES = tuple(ResourceCards)
+RESOURCE_IDX = {card: i for i, card in enumerate(RESOURCES)}
+DEV_CARDS = tuple(DevCards)
+DEV_CARD_IDX = {card: i for i, card in enumerate(DEV_CARDS)}
+
+def hand_vector(cards: list[tuple[ResourceCards, int]]) -> tuple[int]:
+    vector = [0] * len(RESOURCES)
+    for card, n in cards:
+        vector[RESOURCE_IDX[card]] += n
+    return tuple(vector)
+
+ROAD_VECTOR = hand_vector(ROAD_COST)
+SETTLEMENT_VECTOR = hand_vector(SETTLEMENT_COST)
+CITY_VECTOR = hand_vector(CITY_COST)
+DEV_CARD_VECTOR = hand_vector(DEV_CARD_COST)
+
+KNIGHT = DEV_CARD_IDX[DevCards.KNIGHT]
+MONOPOLY = DEV_CARD_IDX[DevCards.MONOPOLY]
+ROADBUILDER = DEV_CARD_IDX[DevCards.ROADBUILDER]
+YEAR_PLENTY = DEV_CARD_IDX[DevCards.YEAR_PLENTY]
+
+MAX_ROADS = 15
+MAX_SETTLEMENTS = 5
+MAX_CITIES = 4
+
+# What the rules need of a player, frozen. Hands and dev cards are tuples like
+# the lists of Player, see pytan.core.reducer. Production and diversity are
+# scores of the Player only.
+PlayerRecord = namedtuple('PlayerRecord', ['id', 'name', 'color', 'hand', 'hand_order', 'dev_cards', 'new_dev_cards', 'dev_turn',
+                                           'roads', 'settlements', 'cities', 'vps', 'knights_played', 'longest_road_chain',
+                                           'largest_army', 'longest_road', 'last_road_built', 'last_settlement_built', 'last_city_built'])
+
+def has_hand(hand: tuple[int], vector: tuple[int]) -> bool:
+    return all(map(ge, hand, vector))
+
+def playable(dev_cards: tuple[int], new_dev_cards: tuple[int], dev_turn: int, i: int, turn: int) -> int:
+    # Cards bought on dev_turn can be played from the next turn on
+    if dev_turn < turn:
+        return dev_cards[i]
+    return dev_cards[i] - new_dev_cards[i]
+
+def total_victory_points(player: PlayerRecord) -> int:
+    return player.settlements + (player.cities * 2) + (player.largest_army * 2) + (player.longest_road * 2) + player.vps
+
+def player_label(player: PlayerRecord) -> str:
+    # As Player prints itself
+    return f'{player.name} ({player.color})'
 
 class Player(object):
+    # The hand is a fixed slot per resource, a plain list is faster than NumPy
+    # at this size. Dev cards are counts per card, with the ones bought on
+    # _dev_turn also counted in _new_dev_cards as they cannot be played that turn.
+    __slots__ = ('_name', '_id', '_color', '_hand', '_hand_order', '_dev_cards', '_new_dev_cards', '_dev_turn',
+                 '_roads', '_settlements', '_cities', '_resource_production', '_diversity', '_vps',
+                 '_knights_played', '_longest_road_chain', '_largest_army', '_longest_road',
+                 '_last_road_built', '_last_settlement_built', '_last_city_built')
+
     def __init__(self, name: str, id: int, color: str):
         # Init
         self._name = name
         self._id = id
         self._color = color
-        self._resource_cards = defaultdict(int)
-        self._dev_cards = []
+        self._hand = [0] * len(RESOURCES)
+        # Resources in the order they first entered the hand, it decides the
+        # order cards are listed in and so which card a steal takes
+        self._hand_order = []
+        self._dev_cards = [0] * len(DEV_CARDS)
+        self._new_dev_cards = [0] * len(DEV_CARDS)
+        self._dev_turn = 0
         self._roads = 0
         self._settlements = 0
         self._cities = 0
@@ -43,28 +104,40 @@ class Player(object):
     def color(self) -> str:
         return self._color
 
+    @property
+    def hand(self) -> tuple[int]:
+        # Resource counts in ResourceCards order
+        return tuple(self._hand)
+
     @property
     def resource_cards(self) -> dict[ResourceCards, int]:
-        return self._resource_cards
+        return defaultdict(int, {RESOURCES[i]: self._hand[i] for i in self._hand_order})
 
     @property
     def resource_cards_list(self) -> list[ResourceCards]:
         l = []
-        for card, count in self._resource_cards.items():
-            l.extend([card for _ in range(count)])
+        for i in self._hand_order:
+            l.extend([RESOURCES[i]] * self._hand[i])
         return l
 
     @property
     def n_resource_cards(self) -> int:
-        return sum(self._resource_cards.values())
+        return sum(self._hand)
 
     @property
-    def dev_cards(self) -> dict[DevCards, int]:
-        return self._dev_cards
+    def dev_cards(self) -> list[tuple[DevCards, int]]:
+        # (card, turn bought) pairs, the turn is only kept for the cards that
+        # may not be playable yet, older cards are listed as bought on turn 0
+        l = []
+        for card, n, new in zip(DEV_CARDS, self._dev_cards, self._new_dev_cards):
+            l.extend([(card, 0)] * (n - new))
+        for card, new in zip(DEV_CARDS, self._new_dev_cards):
+            l.extend([(card, self._dev_turn)] * new)
+        return l
 
     @property
     def n_dev_cards(self) -> int:
-        return len(self._dev_cards)
+        return sum(self._dev_cards)
 
     @property
     def roads(self) -> int:
@@ -72,7 +145,7 @@ class Player(object):
 
     @property
     def roads_left(self) -> int:
-        return 15 - self._roads
+        return MAX_ROADS - self._roads
 
     @property
     def settlements(self) -> int:
@@ -80,7 +153,7 @@ class Player(object):
 
     @property
     def settlements_left(self) -> int:
-        return 5 - self._settlements
+        return MAX_SETTLEMENTS - self._settlements
 
     @property
     def cities(self) -> int:
@@ -88,7 +161,7 @@ class Player(object):
 
     @property
     def cities_left(self) -> int:
-        return 4 - self._cities
+        return MAX_CITIES - self._cities
 
     @property
     def resource_production(self) -> dict:
@@ -170,120 +243,104 @@ class Player(object):
             self._diversity[tile_type] -= 1
 
     def count_resource_cards(self, card: ResourceCards) -> int:
-        if card in self._resource_cards.keys():
-            return self._resource_cards[card]
-        return 0
-
-    def add_resource_card(self, card: ResourceCards):
-        self._resource_cards[card] += 1
-
-    def add_resource_cards(self, cards: list[tuple[ResourceCards, int]]):
-        for card, n in cards:
-            self._resource_cards[card] += n
-
-    def remove_resource_card(self, card: ResourceCards):
-        self._resource_cards[card] -= 1
+        return self._hand[RESOURCE_IDX[card]]
 
-    def remove_all_resource_card(self, card: ResourceCards) -> int:
-        n_resource = self._resource_cards[card]
-        self._resource_cards[card] = 0
-        return n_resource
+    def resource_card_at(self, k: int) -> ResourceCards:
+        # resource_cards_list[k] without building the list
+        for i in self._hand_order:
+            k -= self._hand[i]
+            if k < 0:
+                return RESOURCES[i]
+        raise IndexError(k)
 
-    def remove_resource_cards(self, cards: list[tuple[ResourceCards, int]]):
-        for card, n in cards:
-            self._resource_cards[card] -= n
+    def has_hand(self, vector: tuple[int]) -> bool:
+        return has_hand(self._hand, vector)
 
     def are_cards_in_hand(self, cards_needed: tuple[ResourceCards, int]) -> bool:
         card, n = cards_needed
-        return self.count_resource_cards(card) >= n
+        return self._hand[RESOURCE_IDX[card]] >= n
 
     def are_multiple_cards_in_hand(self, cards_needed: list[tuple[ResourceCards, int]]) -> bool:
-        for c in cards_needed:
-            if not self.are_cards_in_hand(c):
-                return False
-        return True
+        return self.has_hand(hand_vector(cards_needed))
 
     def count_dev_cards(self, card: DevCards) -> int:
-        count = 0
-        for c, _ in self._dev_cards:
-            if c == card:
-                count += 1
-        return count
+        return self._dev_cards[DEV_CARD_IDX[card]]
+
+    def _playable(self, i: int, turn: int) -> int:
+        return playable(self._dev_cards, self._new_dev_cards, self._dev_turn, i, turn)
 
     def can_buy_dev_card(self) -> bool:
-        return self.are_multiple_cards_in_hand(DEV_CARD_COST)
-
-    def add_dev_card(self, dev_card: DevCards, turn_bought: int):
-        if self.can_buy_dev_card():
-            self._dev_cards.append((dev_card, turn_bought))
-            if dev_card == DevCards.VICTORY_POINT:
-                self._vps += 1
-
-    def remove_dev_card(self, dev_card: DevCards):
-        for card, turn in self._dev_cards:
-            if card == dev_card:
-                self._dev_cards.remove((card,turn))
-                break
-        if dev_card == DevCards.KNIGHT:
-            self._knights_played += 1
+        return self.has_hand(DEV_CARD_VECTOR)
 
     def can_buy_road(self) -> bool:
-        return self.are_multiple_cards_in_hand(ROAD_COST)
-
-    def add_road(self, coord: int):
-        self._last_road_built = coord
-        self._roads += 1
+        return self.has_hand(ROAD_VECTOR)
 
     def can_buy_settlement(self) -> bool:
-        return self.are_multiple_cards_in_hand(SETTLEMENT_COST)
-
-    def add_settlement(self, coord: int):
-        self._last_settlement_built = coord
-        self._settlements += 1
+        return self.has_hand(SETTLEMENT_VECTOR)
 
     def can_buy_city(self) -> bool:
-        return self.are_multiple_cards_in_hand(CITY_COST)
-
-    def add_city(self, coord: int):
-        self._last_city_built = coord
-        self._settlements -= 1
-        self._cities += 1
+        return self.has_hand(CITY_VECTOR)
 
     def can_play_knight(self, turn: int) -> bool:
-        for card, t in self._dev_cards:
-            if card == DevCards.KNIGHT and t < turn:
-                return True
-        return False
+        return self._playable(KNIGHT, turn) > 0
 
     def can_play_monopoly(self, turn: int) -> bool:
-        for card, t in self._dev_cards:
-            if card == DevCards.MONOPOLY and t < turn:
-                return True
-        return False
+        return self._playable(MONOPOLY, turn) > 0
 
     def can_play_road_builder(self, turn: int) -> bool:
-        for card, t in self._dev_cards:
-            if card == DevCards.ROADBUILDER and t < turn:
-                if self.roads_left >= 2:
-                    return True
-        return False
+        return self._playable(ROADBUILDER, turn) > 0 and self.roads_left >= 2
 
     def can_play_plenty(self, turn: int) -> bool:
-        for card, t in self._dev_cards:
-            if card == DevCards.YEAR_PLENTY and t < turn:
-                return True
-        return False
+        return self._playable(YEAR_PLENTY, turn) > 0
 
     def clone_player(self) -> 'Player':
         return Player(self._name, self._id, self._color)
 
+    def fork(self) -> 'Player':
+        # Same player mid game, unlike clone_player which starts over
+        player = Player.__new__(Player)
+        player._name = self._name
+        player._id = self._id
+        player._color = self._color
+        player.rollback(self.checkpoint())
+        return player
+
+    def checkpoint(self) -> tuple:
+        # Everything an action can change, restored in place by rollback
+        return (self._hand.copy(), self._hand_order.copy(), self._dev_cards.copy(), self._new_dev_cards.copy(), self._dev_turn,
+                self._resource_production.copy(), self._diversity.copy(),
+                self._roads, self._settlements, self._cities, self._vps, self._knights_played, self._longest_road_chain,
+                self._largest_army, self._longest_road, self._last_road_built, self._last_settlement_built, self._last_city_built)
+
+    def rollback(self, checkpoint: tuple):
+        (self._hand, self._hand_order, self._dev_cards, self._new_dev_cards, self._dev_turn,
+         self._resource_production, self._diversity,
+         self._roads, self._settlements, self._cities, self._vps, self._knights_played, self._longest_road_chain,
+         self._largest_army, self._longest_road, self._last_road_built, self._last_settlement_built, self._last_city_built) = checkpoint
+
+    def record(self) -> PlayerRecord:
+        return PlayerRecord(self._id, self._name, self._color, tuple(self._hand), tuple(self._hand_order),
+                            tuple(self._dev_cards), tuple(self._new_dev_cards), self._dev_turn,
+                            self._roads, self._settlements, self._cities, self._vps, self._knights_played, self._longest_road_chain,
+                            self._largest_army, self._longest_road, self._last_road_built, self._last_settlement_built, self._last_city_built)
+
+    def sync(self, record: PlayerRecord):
+        # Takes over the rule state of record, Game keeps its players in sync this way
+        (self._id, self._name, self._color, hand, hand_order, dev_cards, new_dev_cards, self._dev_turn,
+         self._roads, self._settlements, self._cities, self._vps, self._knights_played, self._longest_road_chain,
+         self._largest_army, self._longest_road, self._last_road_built, self._last_settlement_built, self._last_city_built) = record
+        self._hand = list(hand)
+        self._hand_order = list(hand_order)
+        self._dev_cards = list(dev_cards)
+        self._new_dev_cards = list(new_dev_cards)
+
     def get_state(self) -> dict:
         return {
             'name': self._name,
             'id': self._id,
             'color': self._color,
-            'resource_cards': self._resource_cards.copy(),
-            'dev_cards': self._dev_cards.copy(),
+            'resource_cards': self.resource_cards,
+            'dev_cards': self.dev_cards,
             'roads': self._roads,
             'settlements': self._settlements,
             'cities': self._cities,
@@ -303,8 +360,21 @@ class Player(object):
         self._name = state['name']
         self._id = state['id']
         self._color = state['color']
-        self._resource_cards = state['resource_cards'].copy()
-        self._dev_cards = state['dev_cards'].copy()
+        self._hand = [0] * len(RESOURCES)
+        self._hand_order = []
+        for card, n in state['resource_cards'].items():
+            i = RESOURCE_IDX[card]
+            self._hand_order.append(i)
+            self._hand[i] = n
+        # Cards from the latest purchase turn may not be playable yet
+        self._dev_turn = max((turn for _, turn in state['dev_cards']), default=0)
+        self._dev_cards = [0] * len(DEV_CARDS)
+        self._new_dev_cards = [0] * len(DEV_CARDS)
+        for card, turn in state['dev_cards']:
+            i = DEV_CARD_IDX[card]
+            self._dev_cards[i] += 1
+            if turn == self._dev_turn:
+                self._new_dev_cards[i] += 1
         self._roads = state['roads']
         self._settlements = state['settlements']
         self._cities = state['cities']
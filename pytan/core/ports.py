@@ -1,5 +1,5 @@
 from pytan.core.hexmesh import Directions
-from pytan.core.tiles import TileTypes
+from pytan.core.tiles import TileTypes, scale_counts
 from pytan.core.cards import ResourceCards
 from enum import Enum
 from collections import namedtuple
@@ -30,6 +30,9 @@ PORT_TYPE_COUNTS = {
     PortTypes.ANY: 4
 }
 
+def port_type_counts(n_ports: int) -> dict[PortTypes, int]:
+    return scale_counts(PORT_TYPE_COUNTS, n_ports)
+
 Port = namedtuple('Port', ['coord_1', 'coord_2', 'tile', 'direction', 'port_type'])
 
 def create_port(coord_1: int, coord_2: int, tile: int, direction: Directions, port_type: PortTypes):
@@ -0,0 +1,749 @@
+from pytan.core import hexmesh
+from pytan.core.board import Board, BoardLayout
+from pytan.core.cards import ResourceCards, DevCards, RESOURCE_CARD_COUNTS, DEV_CARD_COUNTS, ROAD_COST, SETTLEMENT_COST, CITY_COST, DEV_CARD_COST
+from pytan.core.piece import PieceTypes, Piece, place_piece
+from pytan.core.player import Player, PlayerRecord, RESOURCES, RESOURCE_IDX, DEV_CARDS, DEV_CARD_IDX, hand_vector, has_hand, \
+    total_victory_points, player_label
+from pytan.core.ports import PortTypes
+from pytan.core.state import GameStates, GameRecord, player_slot, current_slot, check_roll, check_pass_turn, check_build_road, \
+    check_build_settlement, check_build_city, check_discard, check_move_robber, check_steal, check_trade, check_accept_decline_trade, \
+    check_confirm_trade, check_buy_dev_card, check_play_knight, check_play_monopoly, check_play_road_builder, check_play_year_plenty, Reason
+from pytan.core.tiles import TILE_TYPES_TO_RESOURCE
+from pytan.core.longestroad import road_components, longest_road_chain, add_road, split_at
+from collections import namedtuple
+import random
+
+# The rules as pure functions over immutable GameRecords. step returns the next
+# record and what happened, the record it was given is left as it was. Dice and
+# steals draw from the rng passed in, which is the only thing a step changes.
+# Game wraps a record, logs and hashes the events and keeps its Board and
+# Players in sync for queries.
+#
+# Events by kind, with the value they carry:
+#   refused       why the action was not taken as a Reason, '' when the game does not say
+#   roll          the dice total
+#   discarding    cards player_id has to discard
+#   robbing       None, player_id moves the robber next
+#   produce       ((card, n), ...) player_id picked up from the bank
+#   discard       ((card, n), ...) player_id discarded
+#   pass_turn     None, player_id ended their turn
+#   turn          the new turn, player_id is up
+#   build         (PieceTypes, coord)
+#   longest_road  None, player_id took the Longest Road
+#   largest_army  None, player_id took the Largest Army
+#   buy           the DevCards bought
+#   robber        the tile coord the robber moved to
+#   stealing      ids player_id chooses from
+#   steal         (victim id, card)
+#   bank_trade    (giving, wanting, ratio)
+#   offer         (giving, wanting, player ids)
+#   no_cards      None, player_id cannot take the offer
+#   accepting     None, player_id answers the offer next
+#   accept        None
+#   decline       None
+#   trade         (partner id, giving, wanting)
+#   knight        None
+#   monopoly      the card
+#   paid          (card, n) player_id gave to the monopoly
+#   road_builder  None
+#   year_plenty   (card1, card2)
+#   game_over     None, player_id has won
+Event = namedtuple('Event', ['kind', 'player_id', 'value'])
+
+# A piece producing a card for its owner on the roll of the tile
+Production = namedtuple('Production', ['tile', 'node', 'owner_id', 'resource', 'amount'])
+
+DICE = [1, 2, 3, 4, 5, 6]
+
+def new_game(layout: BoardLayout, robber: Piece, players: list[PlayerRecord]) -> GameRecord:
+    # An empty board before the starting player and the dev card deck are drawn
+    topology = hexmesh.get_topology(layout.n_layers)
+    return indexed(GameRecord(layout, GameStates.UNDEFINED, 10, 0, 0, 0, 0, False, False, 0, -1, -1, 0, 0,
+                              tuple(RESOURCE_CARD_COUNTS.values()), (), (), (), (), (), (), (),
+                              (None,) * topology.n_nodes, (None,) * topology.n_edges, robber, tuple(players), (), (), ()))
+
+def with_players(record: GameRecord, players: list[PlayerRecord]) -> GameRecord:
+    return indexed(record._replace(players=tuple(players)))
+
+def shuffled_dev_cards(rng: object) -> tuple[DevCards]:
+    deck = []
+    for card, n in DEV_CARD_COUNTS.items():
+        deck.extend([card] * n)
+    rng.shuffle(deck)
+    return tuple(deck)
+
+def start(record: GameRecord) -> GameRecord:
+    return record._replace(state=GameStates.STARTING_SETTLEMENT, points_to_win=15 if len(record.players) == 2 else 10)
+
+def record_from_state(state: dict, players: list[PlayerRecord], starting_player_idx: int = 0) -> GameRecord:
+    # The record of a Game.get_state dict, players come from its 'players'
+    board = state['board']
+    record = GameRecord(board['layout'], state['state'], state['points_to_win'], starting_player_idx, state['current_player_idx'],
+                      state['current_roll'], state['last_roll'], state['has_rolled'], state['knight_played_this_turn'],
+                      state['free_roads'], state['longest_road'], state['largest_army'], state['moves_made'], state['turn'],
+                      tuple(state['resource_card_counts'][card] for card in RESOURCES), tuple(state['dev_cards']),
+                      tuple(state['discarding_players']), tuple(state['players_to_steal_from']),
+                      tuple(state['players_accepting_trade']), tuple(state['players_accepted_trade']),
+                      tuple(state['give_trade']), tuple(state['want_trade']),
+                      tuple(board['nodes']), tuple(board['edges']), board['robber'], tuple(players), (), (), ())
+    return indexed(record)
+
+def setup(record: GameRecord, rng: object) -> GameRecord:
+    # Draws the starting player, then the order of the dev card deck
+    starting_player_idx = rng.randint(0, len(record.players) - 1)
+    return record._replace(starting_player_idx=starting_player_idx, current_player_idx=starting_player_idx, dev_cards=shuffled_dev_cards(rng))
+
+def initial_state(players: list[PlayerRecord] = None, seed: float = None, rng: object = None) -> GameRecord:
+    # The game Game.start_game deals for the same seed, players default to its four
+    seed = random.random() if seed is None else seed
+    rng = random.Random() if rng is None else rng
+    rng.seed(seed)
+    if players is None:
+        players = [Player('P1', 0, 'red'), Player('P2', 1, 'blue'), Player('P3', 2, 'white'), Player('P4', 3, 'orange')]
+    board = Board(seed=seed)
+    record = new_game(board.layout, board.robber, [Player(player.name, player.id, player.color).record() for player in players])
+    return start(setup(record, rng))
+
+# Cards
+
+def _add_cards(player: PlayerRecord, cards: list[tuple[ResourceCards, int]], sign: int = 1) -> PlayerRecord:
+    # Cards join the hand order the first time they are handled, taking them counts
+    hand = list(player.hand)
+    hand_order = player.hand_order
+    for card, n in cards:
+        i = RESOURCE_IDX[card]
+        if i not in hand_order:
+            hand_order += (i,)
+        hand[i] += sign * n
+    return player._replace(hand=tuple(hand), hand_order=hand_order)
+
+def _remove_cards(player: PlayerRecord, cards: list[tuple[ResourceCards, int]]) -> PlayerRecord:
+    return _add_cards(player, cards, -1)
+
+def _bank_add(bank: tuple[int], cards: list[tuple[ResourceCards, int]], sign: int = 1) -> tuple[int]:
+    bank = list(bank)
+    for card, n in cards:
+        bank[RESOURCE_IDX[card]] += sign * n
+    return tuple(bank)
+
+def _card_at(player: PlayerRecord, k: int) -> ResourceCards:
+    # The k-th card of the hand listed in hand order
+    for i in player.hand_order:
+        k -= player.hand[i]
+        if k < 0:
+            return RESOURCES[i]
+    raise IndexError(k)
+
+def _add_dev_card(player: PlayerRecord, card: DevCards, turn: int) -> PlayerRecord:
+    i = DEV_CARD_IDX[card]
+    dev_cards = list(player.dev_cards)
+    new_dev_cards = list(player.new_dev_cards) if turn == player.dev_turn else [0] * len(DEV_CARDS)
+    dev_cards[i] += 1
+    new_dev_cards[i] += 1
+    return player._replace(dev_cards=tuple(dev_cards), new_dev_cards=tuple(new_dev_cards), dev_turn=turn,
+                           vps=player.vps + (card == DevCards.VICTORY_POINT))
+
+def _remove_dev_card(player: PlayerRecord, card: DevCards) -> PlayerRecord:
+    # Older cards go first
+    i = DEV_CARD_IDX[card]
+    dev_cards = list(player.dev_cards)
+    new_dev_cards = list(player.new_dev_cards)
+    if dev_cards[i] > 0:
+        dev_cards[i] -= 1
+        if new_dev_cards[i] > dev_cards[i]:
+            new_dev_cards[i] -= 1
+    return player._replace(dev_cards=tuple(dev_cards), new_dev_cards=tuple(new_dev_cards),
+                           knights_played=player.knights_played + (card == DevCards.KNIGHT))
+
+# Board
+
+def _topology(record: GameRecord) -> hexmesh.Topology:
+    return hexmesh.get_topology(record.layout.n_layers)
+
+def _node(record: GameRecord, topology: hexmesh.Topology, coord: int) -> Piece:
+    return record.nodes[topology.node_index[coord]]
+
+def _edge(record: GameRecord, topology: hexmesh.Topology, coord: int) -> Piece:
+    return record.edges[topology.edge_index[coord]]
+
+def _enemy_on_node(record: GameRecord, topology: hexmesh.Topology, coord: int, player_id: int) -> bool:
+    node = _node(record, topology, coord)
+    return node is not None and node.owner_id != player_id
+
+def is_legal_road(record: GameRecord, coord: int, player_id: int) -> bool:
+    # An empty edge next to a piece of the player, or to one of their roads
+    # that does not end on an enemy settlement
+    topology = _topology(record)
+    if coord not in topology.edge_index or _edge(record, topology, coord) is not None:
+        return False
+    for node in topology.edge_nodes[coord]:
+        piece = _node(record, topology, node)
+        if piece is not None and piece.owner_id == player_id:
+            return True
+    for edge in topology.edge_edges[coord]:
+        piece = _edge(record, topology, edge)
+        if piece is not None and piece.owner_id == player_id and \
+                not any(_enemy_on_node(record, topology, node, player_id) for node in topology.edge_nodes[edge]):
+            return True
+    return False
+
+def is_legal_starting_settlement(record: GameRecord, coord: int) -> bool:
+    topology = _topology(record)
+    if coord not in topology.node_index or _node(record, topology, coord) is not None:
+        return False
+    return all(_node(record, topology, node) is None for node in topology.node_nodes[coord])
+
+def is_legal_settlement(record: GameRecord, coord: int, player_id: int) -> bool:
+    if not is_legal_starting_settlement(record, coord):
+        return False
+    topology = _topology(record)
+    for edge in topology.node_edges[coord]:
+        piece = _edge(record, topology, edge)
+        if piece is not None and piece.owner_id == player_id:
+            return True
+    return False
+
+def is_legal_city(record: GameRecord, coord: int, player_id: int) -> bool:
+    topology = _topology(record)
+    if coord not in topology.node_index:
+        return False
+    piece = _node(record, topology, coord)
+    return piece is not None and piece.piece_type == PieceTypes.SETTLEMENT and piece.owner_id == player_id
+
+def legal_road_placements(record: GameRecord, player_id: int) -> list[int]:
+    return [coord for coord in _topology(record).edges if is_legal_road(record, coord, player_id)]
+
+def _player_roads(record: GameRecord, topology: hexmesh.Topology, player_id: int) -> set[int]:
+    return {coord for coord, piece in zip(topology.edges, record.edges) if piece is not None and piece.owner_id == player_id}
+
+def _is_blocked(record: GameRecord, topology: hexmesh.Topology, player_id: int):
+    def is_blocked(node: int) -> bool:
+        return _enemy_on_node(record, topology, node, player_id)
+    return is_blocked
+
+def _production_key(topology: hexmesh.Topology):
+    # Order of the tile scan, independent of the order pieces were built in
+    def key(production: Production) -> tuple[int, int, int]:
+        return topology.tile_index[production.tile], production.amount, topology.tile_nodes[production.tile].index(production.node)
+    return key
+
+def _add_production(production: tuple, record: GameRecord, topology: hexmesh.Topology, piece: Piece) -> tuple:
+    # The Productions of a new settlement or city on the rolls of its tiles
+    production = list(production)
+    amount = 2 if piece.piece_type == PieceTypes.CITY else 1
+    for tile_coord in topology.node_tiles[piece.coord]:
+        tile = record.layout.tiles[tile_coord]
+        resource = TILE_TYPES_TO_RESOURCE[tile.tile_type]
+        if resource is not None:
+            entries = [entry for entry in production[tile.prob] if (entry.tile, entry.node) != (tile_coord, piece.coord)]
+            entries.append(Production(tile_coord, piece.coord, piece.owner_id, resource, amount))
+            production[tile.prob] = tuple(sorted(entries, key=_production_key(topology)))
+    return tuple(production)
+
+def _port_type(record: GameRecord, coord: int) -> PortTypes:
+    for port in record.layout.ports.values():
+        if coord in (port.coord_1, port.coord_2):
+            return port.port_type
+    return None
+
+def indexed(record: GameRecord) -> GameRecord:
+    # The record with its production, road and port indexes built from its pieces
+    topology = _topology(record)
+    production = ((),) * 13
+    ports = [frozenset()] * len(record.players)
+    for piece in record.nodes:
+        if piece is not None:
+            production = _add_production(production, record, topology, piece)
+            slot = player_slot(record, piece.owner_id)
+            port_type = _port_type(record, piece.coord)
+            if port_type is not None and slot is not None:
+                ports[slot] = ports[slot] | {port_type}
+    components = tuple(road_components(_player_roads(record, topology, player.id), topology, _is_blocked(record, topology, player.id))
+                       for player in record.players)
+    return record._replace(production=production, road_components=components, ports=tuple(ports))
+
+def production(record: GameRecord, roll: int) -> list[Production]:
+    # What a roll produces, the tile under the robber gives nothing
+    robber = record.robber.coord if record.robber else None
+    entries = record.production[roll] if 2 <= roll <= 12 else ()
+    return [entry for entry in entries if entry.tile != robber]
+
+def has_port(record: GameRecord, player_id: int, port_type: PortTypes) -> bool:
+    slot = player_slot(record, player_id)
+    return slot is not None and port_type in record.ports[slot]
+
+def trade_ratio(record: GameRecord, player_id: int, resource: ResourceCards) -> int:
+    # Cards the bank takes for one, at the best port of the player
+    if has_port(record, player_id, PortTypes(resource.value)):
+        return 2
+    elif has_port(record, player_id, PortTypes.ANY):
+        return 3
+    return 4
+
+def _update_longest_road(record: GameRecord, players: list[PlayerRecord], events: list[Event]) -> int:
+    # The holder keeps the Longest Road while nobody has a longer chain, else
+    # it goes to the single longest chain of at least 5
+    best = max(player.longest_road_chain for player in players)
+    holder = player_slot(record, record.longest_road) if record.longest_road > -1 else None
+    if holder is not None and players[holder].longest_road_chain == best and best >= 5:
+        return record.longest_road
+    leaders = [slot for slot, player in enumerate(players) if player.longest_road_chain == best]
+    longest_road = record.longest_road
+    if holder is not None:
+        players[holder] = players[holder]._replace(longest_road=False)
+        longest_road = -1
+    if best >= 5 and len(leaders) == 1:
+        leader = players[leaders[0]] = players[leaders[0]]._replace(longest_road=True)
+        longest_road = leader.id
+        events.append(Event('longest_road', leader.id, None))
+    return longest_road
+
+def _pickups(record: GameRecord, roll: int) -> tuple[dict, list[int]]:
+    # Cards per player for a roll, in the order of the production table
+    pickups = {}
+    quantity = [0] * len(RESOURCES)
+    for entry in production(record, roll):
+        cards = pickups.setdefault(entry.owner_id, {})
+        cards[entry.resource] = cards.get(entry.resource, 0) + entry.amount
+        quantity[RESOURCE_IDX[entry.resource]] += entry.amount
+    return pickups, quantity
+
+def _hand_out(record: GameRecord, players: list[PlayerRecord], bank: tuple[int], pickups: dict, quantity: list[int], events: list[Event]) -> tuple[int]:
+    # A card runs out for everybody when the bank cannot pay all of it
+    for player_id, cards in pickups.items():
+        pickup_list = tuple((card, n) for card, n in cards.items() if quantity[RESOURCE_IDX[card]] < bank[RESOURCE_IDX[card]])
+        if pickup_list:
+            slot = player_slot(record, player_id)
+            players[slot] = _add_cards(players[slot], pickup_list)
+            bank = _bank_add(bank, pickup_list, -1)
+            events.append(Event('produce', player_id, pickup_list))
+    return bank
+
+# Actions, each takes the record, the rng and the args of the Game method
+
+def _refused(record: GameRecord, *reasons: Reason) -> tuple[GameRecord, tuple[Event]]:
+    # Reasons stay lazy in the events, Game formats them only when it logs
+    player = record.players[current_slot(record)] if record.players else None
+    return record, tuple(Event('refused', player.id if player else None, reason) for reason in reasons if reason is not None)
+
+def _done(record: GameRecord, events: list[Event]) -> tuple[GameRecord, tuple[Event]]:
+    # Every player on the points to win ends the game
+    for player in record.players:
+        if total_victory_points(player) >= record.points_to_win:
+            record = record._replace(state=GameStates.GAME_OVER)
+            events.append(Event('game_over', record.players[record.current_player_idx].id, None))
+    return record, tuple(events)
+
+def roll(record: GameRecord, rng: object, dice_roll: int = 0) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_roll(record)
+    if reason is not None:
+        return _refused(record, reason)
+    # The dice are drawn even when the roll is given, so the rng moves the same
+    d_roll = rng.choice(DICE) + rng.choice(DICE)
+    if dice_roll == 0:
+        dice_roll = d_roll
+    player = record.players[record.current_player_idx]
+    events = [Event('roll', player.id, dice_roll)]
+    players = list(record.players)
+    bank = record.bank
+    state = record.state
+    discarding = record.discarding_players
+    if dice_roll == 7:
+        discarding += tuple(p.id for p in players if sum(p.hand) > 7)
+        if discarding:
+            first = players[player_slot(record, discarding[0])]
+            events.append(Event('discarding', first.id, sum(first.hand) // 2))
+            state = GameStates.DISCARDING
+        else:
+            events.append(Event('robbing', player.id, None))
+            state = GameStates.MOVING_ROBBER
+    else:
+        pickups, quantity = _pickups(record, dice_roll)
+        bank = _hand_out(record, players, bank, pickups, quantity, events)
+    return _done(record._replace(state=state, has_rolled=True, last_roll=record.current_roll, current_roll=dice_roll,
+                                 discarding_players=discarding, bank=bank, players=tuple(players)), events)
+
+def discard(record: GameRecord, rng: object, resource_list: list[tuple[ResourceCards, int]]) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_discard(record)
+    if reason is not None:
+        return _refused(record, reason, 'No players need to discard')
+    slot = player_slot(record, record.discarding_players[0])
+    player = record.players[slot]
+    d = sum(player.hand) // 2
+    if sum(n for card, n in resource_list) > d:
+        return _refused(record, lambda: f'Too many resource cards to discard, discard {d} cards')
+    players = list(record.players)
+    players[slot] = _remove_cards(player, resource_list)
+    events = [Event('discard', player.id, tuple(resource_list))]
+    record = record._replace(discarding_players=record.discarding_players[1:], bank=_bank_add(record.bank, resource_list),
+                             players=tuple(players))
+    p = record.players[current_slot(record)]
+    if not record.discarding_players:
+        events.append(Event('robbing', p.id, None))
+        record = record._replace(state=GameStates.MOVING_ROBBER)
+    else:
+        events.append(Event('discarding', p.id, sum(p.hand) // 2))
+    return _done(record, events)
+
+def _next_turn(record: GameRecord, events: list[Event]) -> dict:
+    # Starting placements go around once and back again, the last player of
+    # the first round and the first of the second go twice
+    n_players = len(record.players)
+    events.append(Event('pass_turn', record.players[record.current_player_idx].id, None))
+    turn = record.turn + 1
+    d = 1
+    if turn == n_players or turn == 2 * n_players:
+        d = 0
+    elif turn >= n_players + 1 and turn < 2 * n_players:
+        d = -1
+    state = GameStates.INGAME if turn >= 2 * n_players else record.state
+    current_player_idx = record.current_player_idx + d
+    if current_player_idx >= n_players:
+        current_player_idx = 0
+    elif current_player_idx < 0:
+        current_player_idx = n_players - 1
+    events.append(Event('turn', record.players[current_player_idx].id, turn))
+    return dict(has_rolled=False, knight_played_this_turn=False, turn=turn, state=state, current_player_idx=current_player_idx)
+
+def pass_turn(record: GameRecord, rng: object) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_pass_turn(record)
+    if reason is not None:
+        return _refused(record, reason)
+    events = []
+    return _done(record._replace(**_next_turn(record, events)), events)
+
+def _build(record: GameRecord, piece_type: PieceTypes, coord: int, events: list[Event]) -> GameRecord:
+    # Places the piece of the turn player and counts it, the longest road is
+    # updated for their new road or for the enemy roads their settlement cuts
+    topology = _topology(record)
+    slot = record.current_player_idx
+    player = record.players[slot]
+    piece = place_piece(coord, player.id, player.name, player.color, piece_type)
+    events.append(Event('build', player.id, (piece_type, coord)))
+    if piece_type == PieceTypes.ROAD:
+        edges = list(record.edges)
+        edges[topology.edge_index[coord]] = piece
+        record = record._replace(edges=tuple(edges), moves_made=record.moves_made + 1)
+        components = list(record.road_components)
+        components[slot] = add_road(components[slot], coord, topology, _is_blocked(record, topology, player.id))
+        players = list(record.players)
+        players[slot] = player._replace(roads=player.roads + 1, last_road_built=coord, longest_road_chain=longest_road_chain(components[slot]))
+        record = record._replace(road_components=tuple(components))
+        return record._replace(longest_road=_update_longest_road(record, players, events), players=tuple(players))
+    split_ids = {edge.owner_id for edge in (_edge(record, topology, e) for e in topology.node_edges[coord])
+                 if edge is not None and edge.owner_id != player.id}
+    nodes = list(record.nodes)
+    nodes[topology.node_index[coord]] = piece
+    record = record._replace(nodes=tuple(nodes), moves_made=record.moves_made + 1,
+                             production=_add_production(record.production, record, topology, piece))
+    players = list(record.players)
+    if piece_type == PieceTypes.SETTLEMENT:
+        players[slot] = player._replace(settlements=player.settlements + 1, last_settlement_built=coord)
+        port_type = _port_type(record, coord)
+        if port_type is not None:
+            ports = list(record.ports)
+            ports[slot] = ports[slot] | {port_type}
+            record = record._replace(ports=tuple(ports))
+    else:
+        players[slot] = player._replace(settlements=player.settlements - 1, cities=player.cities + 1, last_city_built=coord)
+    if split_ids:
+        components = list(record.road_components)
+        for owner_id in split_ids:
+            owner = player_slot(record, owner_id)
+            components[owner] = split_at(components[owner], coord, topology, _is_blocked(record, topology, owner_id))
+            players[owner] = players[owner]._replace(longest_road_chain=longest_road_chain(components[owner]))
+        record = record._replace(road_components=tuple(components))
+        record = record._replace(longest_road=_update_longest_road(record, players, events))
+    return record._replace(players=tuple(players))
+
+def build_road(record: GameRecord, rng: object, coord: int) -> tuple[GameRecord, tuple[Event]]:
+    player = record.players[record.current_player_idx] if record.players else None
+    events = []
+    if record.state == GameStates.STARTING_ROAD:
+        # Any edge of the settlement just built, an occupied one fails
+        topology = _topology(record)
+        if coord not in topology.node_edges.get(player.last_settlement_built, ()):
+            return _refused(record, lambda: f'{player_label(player)} cannot build road at {hex(coord)}')
+        if _edge(record, topology, coord) is not None:
+            return _refused(record, lambda: f'{player_label(player)} failed to build road at {hex(coord)}')
+        record = _build(record, PieceTypes.ROAD, coord, events)
+        record = record._replace(state=GameStates.STARTING_SETTLEMENT)
+        return _done(record._replace(**_next_turn(record, events)), events)
+    reason = check_build_road(record)
+    if reason is None and not is_legal_road(record, coord, player.id):
+        reason = lambda: f'{player_label(player)} cannot build road at {hex(coord)}'
+        if not legal_road_placements(record, player.id):
+            return _refused(record, 'No legal road placements')
+        return _refused(record, reason)
+    if reason is not None:
+        return _refused(record, reason)
+    record = _build(record, PieceTypes.ROAD, coord, events)
+    if record.free_roads == 0:
+        players = list(record.players)
+        players[record.current_player_idx] = _remove_cards(players[record.current_player_idx], ROAD_COST)
+        record = record._replace(players=tuple(players), bank=_bank_add(record.bank, ROAD_COST))
+    else:
+        free_roads = record.free_roads - 1
+        record = record._replace(free_roads=free_roads, state=GameStates.INGAME if free_roads == 0 else record.state)
+    return _done(record, events)
+
+def build_settlement(record: GameRecord, rng: object, coord: int) -> tuple[GameRecord, tuple[Event]]:
+    player = record.players[record.current_player_idx] if record.players else None
+    events = []
+    if record.state == GameStates.STARTING_SETTLEMENT:
+        if not is_legal_starting_settlement(record, coord):
+            return _refused(record, lambda: f'{player_label(player)} cannot build settlement at {hex(coord)}')
+        record = _build(record, PieceTypes.SETTLEMENT, coord, events)
+        player = record.players[record.current_player_idx]
+        bank = record.bank
+        players = list(record.players)
+        if player.settlements == 2:
+            # The second settlement collects a card of each tile around it
+            topology = _topology(record)
+            robber = record.robber.coord if record.robber else None
+            cards = {}
+            for tile_coord in topology.node_tiles[coord]:
+                card = TILE_TYPES_TO_RESOURCE[record.layout.tiles[tile_coord].tile_type]
+                if tile_coord != robber and card is not None:
+                    cards[card] = cards.get(card, 0) + 1
+            quantity = [0] * len(RESOURCES)
+            for card, n in cards.items():
+                quantity[RESOURCE_IDX[card]] += n
+            bank = _hand_out(record, players, bank, {player.id: cards} if cards else {}, quantity, events)
+        return _done(record._replace(state=GameStates.STARTING_ROAD, bank=bank, players=tuple(players)), events)
+    reason = check_build_settlement(record)
+    if reason is None and not is_legal_settlement(record, coord, player.id):
+        if not any(is_legal_settlement(record, node, player.id) for node in _topology(record).nodes):
+            return _refused(record, 'No legal settlement placements')
+        return _refused(record, lambda: f'{player_label(player)} cannot build settlement at {hex(coord)}')
+    if reason is not None:
+        return _refused(record, reason)
+    record = _build(record, PieceTypes.SETTLEMENT, coord, events)
+    players = list(record.players)
+    players[record.current_player_idx] = _remove_cards(players[record.current_player_idx], SETTLEMENT_COST)
+    return _done(record._replace(state=GameStates.INGAME, players=tuple(players), bank=_bank_add(record.bank, SETTLEMENT_COST)), events)
+
+def build_city(record: GameRecord, rng: object, coord: int) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_build_city(record)
+    player = record.players[record.current_player_idx] if record.players else None
+    if reason is None and not is_legal_city(record, coord, player.id):
+        if not any(is_legal_city(record, node, player.id) for node in _topology(record).nodes):
+            return _refused(record, 'No legal city placements')
+        return _refused(record, lambda: f'{player_label(player)} cannot upgrade city at {hex(coord)}')
+    if reason is not None:
+        return _refused(record, reason)
+    events = []
+    record = _build(record, PieceTypes.CITY, coord, events)
+    players = list(record.players)
+    players[record.current_player_idx] = _remove_cards(players[record.current_player_idx], CITY_COST)
+    return _done(record._replace(state=GameStates.INGAME, players=tuple(players), bank=_bank_add(record.bank, CITY_COST)), events)
+
+def buy_dev_card(record: GameRecord, rng: object, dev_card: DevCards = None) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_buy_dev_card(record)
+    if reason is not None:
+        return _refused(record, reason)
+    deck = record.dev_cards
+    if not dev_card:
+        dev_card, deck = deck[0], deck[1:]
+    slot = record.current_player_idx
+    players = list(record.players)
+    players[slot] = _remove_cards(_add_dev_card(players[slot], dev_card, record.turn), DEV_CARD_COST)
+    events = [Event('buy', players[slot].id, dev_card)]
+    return _done(record._replace(dev_cards=deck, players=tuple(players), bank=_bank_add(record.bank, DEV_CARD_COST)), events)
+
+def move_robber(record: GameRecord, rng: object, tile_coord: int) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_move_robber(record)
+    if reason is not None:
+        return _refused(record, reason)
+    if tile_coord == record.robber.coord:
+        return _refused(record, 'Robber is already at that location')
+    topology = _topology(record)
+    thief = record.players[current_slot(record)]
+    events = [Event('robber', thief.id, tile_coord)]
+    # Same order as Board.players_on_tile
+    on_tile = list({piece.owner_id for piece in (_node(record, topology, node) for node in topology.tile_nodes[tile_coord]) if piece is not None})
+    victims = tuple(p_id for p_id in on_tile if sum(record.players[player_slot(record, p_id)].hand) > 0 and p_id != thief.id)
+    state = GameStates.STEALING if victims else GameStates.INGAME
+    if len(victims) > 1:
+        events.append(Event('stealing', record.players[record.current_player_idx].id, victims))
+    robber = place_piece(tile_coord, -1, '', 'black', PieceTypes.ROBBER)
+    return _done(record._replace(robber=robber, state=state, players_to_steal_from=victims if victims else record.players_to_steal_from), events)
+
+def steal(record: GameRecord, rng: object, player_id: int) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_steal(record)
+    if reason is not None:
+        return _refused(record, reason)
+    slot = player_slot(record, player_id)
+    victim = record.players[slot] if slot is not None else None
+    if player_id not in record.players_to_steal_from:
+        return _refused(record, lambda: f'Cant steal from {player_label(victim) if victim else None}')
+    if sum(victim.hand) <= 0:
+        return _refused(record, lambda: f'{player_label(victim)} has no cards to steal')
+    card = _card_at(victim, rng.randrange(sum(victim.hand)))
+    players = list(record.players)
+    players[slot] = _remove_cards(victim, [(card, 1)])
+    thief = record.current_player_idx
+    players[thief] = _add_cards(players[thief], [(card, 1)])
+    events = [Event('steal', players[thief].id, (player_id, card))]
+    return _done(record._replace(players=tuple(players), players_to_steal_from=(), state=GameStates.INGAME), events)
+
+def offer_trade(record: GameRecord, rng: object, giving: list[tuple[ResourceCards, int]], wanting: list[tuple[ResourceCards, int]],
+                players: list[int]) -> tuple[GameRecord, tuple[Event]]:
+    # One card for 4, or for 2 or 3 at a port, comes from the bank. Other
+    # offers go to the players, who accept or decline in turn.
+    reason = check_trade(record)
+    if reason is not None:
+        return _refused(record, reason)
+    player = record.players[record.current_player_idx]
+    if not has_hand(player.hand, hand_vector(giving)):
+        return _refused(record, lambda: f'{player_label(player)} does not have specified cards to trade')
+    if not wanting:
+        return _refused(record, 'Specify cards to trade for')
+    reasons = []
+    if len(giving) == 1 and len(wanting) == 1 and not players:
+        give_card, give_n = giving[0]
+        want_card, want_n = wanting[0]
+        if record.bank[RESOURCE_IDX[want_card]] >= 1:
+            if want_n == 1 and (give_n == 4 or
+                                (give_n == 2 and has_port(record, player.id, PortTypes(give_card.value))) or
+                                (give_n == 3 and has_port(record, player.id, PortTypes.ANY))):
+                p = list(record.players)
+                p[record.current_player_idx] = _add_cards(_remove_cards(player, giving), [(want_card, 1)])
+                events = [Event('bank_trade', player.id, (tuple(giving), tuple(wanting), give_n))]
+                bank = _bank_add(_bank_add(record.bank, giving), wanting, -1)
+                return _done(record._replace(players=tuple(p), bank=bank), events)
+        else:
+            reasons.append(lambda: f'The bank does not have any {want_card.value} left')
+    if not players:
+        return _refused(record, *reasons, 'Specify players to trade with')
+    events = [Event('offer', player.id, (tuple(giving), tuple(wanting), tuple(players)))]
+    accepting = record.players_accepting_trade
+    want_vector = hand_vector(wanting)
+    for p_id in players:
+        other = record.players[player_slot(record, p_id)]
+        if has_hand(other.hand, want_vector):
+            accepting += (other.id,)
+        else:
+            events.append(Event('no_cards', other.id, None))
+    if not accepting:
+        events.append(Event('refused', player.id, 'No players have the requested card'))
+        return record, tuple(events)
+    events.append(Event('accepting', accepting[0], None))
+    return _done(record._replace(players_accepting_trade=accepting, give_trade=tuple(giving), want_trade=tuple(wanting),
+                                 state=GameStates.ACCEPTING_TRADE), events)
+
+def _answer_trade(record: GameRecord, accepted: bool) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_accept_decline_trade(record)
+    if reason is not None:
+        return _refused(record, reason)
+    p = record.players_accepting_trade[0]
+    events = [Event('accept' if accepted else 'decline', p, None)]
+    accepting = record.players_accepting_trade[1:]
+    accepted_trade = record.players_accepted_trade + (p,) if accepted else record.players_accepted_trade
+    state = record.state
+    if not accepting:
+        state = GameStates.CONFIRMING_TRADE if accepted_trade else GameStates.INGAME
+    else:
+        events.append(Event('accepting', accepting[0], None))
+    return _done(record._replace(players_accepting_trade=accepting, players_accepted_trade=accepted_trade, state=state), events)
+
+def accept_trade(record: GameRecord, rng: object) -> tuple[GameRecord, tuple[Event]]:
+    return _answer_trade(record, True)
+
+def decline_trade(record: GameRecord, rng: object) -> tuple[GameRecord, tuple[Event]]:
+    return _answer_trade(record, False)
+
+def confirm_trade(record: GameRecord, rng: object, player_id: int) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_confirm_trade(record)
+    if reason is not None:
+        return _refused(record, reason)
+    slot = player_slot(record, player_id)
+    if player_id not in record.players_accepted_trade:
+        return _refused(record, lambda: f'Cannot trade with {player_label(record.players[slot]) if slot is not None else None}')
+    players = list(record.players)
+    turn_slot = record.current_player_idx
+    players[turn_slot] = _add_cards(_remove_cards(players[turn_slot], record.give_trade), record.want_trade)
+    players[slot] = _add_cards(_remove_cards(players[slot], record.want_trade), record.give_trade)
+    events = [Event('trade', players[turn_slot].id, (player_id, record.give_trade, record.want_trade))]
+    return _done(record._replace(players=tuple(players), state=GameStates.INGAME, want_trade=(), give_trade=(),
+                                 players_accepted_trade=()), events)
+
+def play_knight(record: GameRecord, rng: object) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_play_knight(record)
+    if reason is not None:
+        return _refused(record, reason)
+    slot = record.current_player_idx
+    players = list(record.players)
+    player = players[slot] = _remove_dev_card(players[slot], DevCards.KNIGHT)
+    events = [Event('knight', player.id, None)]
+    largest_army = record.largest_army
+    army = player.knights_played
+    if army >= 3:
+        holder = player_slot(record, largest_army) if largest_army > -1 else None
+        # The previous holder keeps their flag, as the game always did
+        if holder is None or army > players[holder].knights_played:
+            largest_army = player.id
+            players[slot] = player._replace(largest_army=True)
+            events.append(Event('largest_army', player.id, None))
+    return _done(record._replace(state=GameStates.MOVING_ROBBER, knight_played_this_turn=True, largest_army=largest_army,
+                                 players=tuple(players)), events)
+
+def play_monopoly(record: GameRecord, rng: object, resource_card: ResourceCards) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_play_monopoly(record)
+    if reason is not None:
+        return _refused(record, reason)
+    slot = record.current_player_idx
+    players = list(record.players)
+    players[slot] = _remove_dev_card(players[slot], DevCards.MONOPOLY)
+    events = [Event('monopoly', players[slot].id, resource_card)]
+    i = RESOURCE_IDX[resource_card]
+    removed = 0
+    for other, player in enumerate(players):
+        if other != slot:
+            n = player.hand[i]
+            removed += n
+            players[other] = _remove_cards(player, [(resource_card, n)])
+            events.append(Event('paid', player.id, (resource_card, n)))
+    players[slot] = _add_cards(players[slot], [(resource_card, removed)])
+    return _done(record._replace(players=tuple(players)), events)
+
+def play_road_builder(record: GameRecord, rng: object) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_play_road_builder(record)
+    slot = record.current_player_idx
+    if reason is None and len(legal_road_placements(record, record.players[slot].id)) < 2:
+        reason = ''
+    if reason is not None:
+        return _refused(record, reason)
+    players = list(record.players)
+    players[slot] = _remove_dev_card(players[slot], DevCards.ROADBUILDER)
+    events = [Event('road_builder', players[slot].id, None)]
+    return _done(record._replace(state=GameStates.ROADBUILDER, free_roads=2, players=tuple(players)), events)
+
+def play_year_plenty(record: GameRecord, rng: object, card1: ResourceCards, card2: ResourceCards) -> tuple[GameRecord, tuple[Event]]:
+    reason = check_play_year_plenty(record)
+    if reason is not None:
+        return _refused(record, reason)
+    if not (card1 and card2):
+        return _refused(record, '')
+    pickup_list = [(card1, 2)] if card1 == card2 else [(card1, 1), (card2, 1)]
+    slot = record.current_player_idx
+    players = list(record.players)
+    players[slot] = _remove_dev_card(_add_cards(players[slot], pickup_list), DevCards.YEAR_PLENTY)
+    events = [Event('year_plenty', players[slot].id, (card1, card2))]
+    return _done(record._replace(players=tuple(players), bank=_bank_add(record.bank, pickup_list, -1)), events)
+
+# The actions agents pick from, by Game method name
+ACTIONS = {'roll': roll, 'pass_turn': pass_turn, 'discard': discard, 'move_robber': move_robber, 'steal': steal,
+           'build_road': build_road, 'build_settlement': build_settlement, 'build_city': build_city,
+           'buy_dev_card': buy_dev_card, 'offer_trade': offer_trade, 'accept_trade': accept_trade,
+           'decline_trade': decline_trade, 'confirm_trade': confirm_trade, 'play_knight': play_knight,
+           'play_monopoly': play_monopoly, 'play_road_builder': play_road_builder, 'play_year_plenty': play_year_plenty}
+
+def step(record: GameRecord, action: tuple, rng: object) -> tuple[GameRecord, tuple[Event]]:
+    # The record after action and what happened. A refused action returns the
+    # record it was given. rng is any PRNG with the random.Random methods, each
+    # thread or branch of a search passes its own.
+    function, args = action
+    if function not in ACTIONS:
+        raise ValueError(f'Unknown action {function}')
+    return ACTIONS[function](record, rng, *args)
@@ -0,0 +1,124 @@
+from collections import namedtuple
+import numpy as np
+import random
+import struct
+
+# Counter based RNG for the game engine. Draw n of a stream is a pure function
+# of its key and n (NumPy's Philox), so the whole state is the key and a
+# position: snapshots, forks and undo copy three ints instead of the 625 words
+# of random.Random. Independent streams for parallel workers are derived from
+# one root seed with SeedSequence.spawn. The state carries the spawn path, so
+# forks and restored copies of a spawned stream reseed into that stream.
+CounterState = namedtuple('CounterState', ['key0', 'key1', 'position', 'stream'], defaults=[()])
+
+# Raw draws are generated a block at a time, 4 per Philox counter step
+BLOCK = 64
+# jumped() moves this many draws ahead, far beyond any game
+JUMP = 1 << 64
+MASK64 = (1 << 64) - 1
+
+def entropy(seed: object) -> int:
+    # Game seeds are floats, their bits are used as is
+    if isinstance(seed, float):
+        return int.from_bytes(struct.pack('<d', seed), 'little')
+    if isinstance(seed, int):
+        return seed & ((1 << 128) - 1)
+    raise TypeError(f'Cannot seed from {type(seed).__name__}')
+
+class CounterRNG(object):
+    # The subset of random.Random the game uses, draws are unbiased
+    def __init__(self, seed: object = None, stream: tuple[int] = ()):
+        # stream is the spawn path from the root, seeding a spawned stream with
+        # the same seed as another stream still gives independent draws
+        self._stream = stream
+        self._block = None
+        self._block_idx = -1
+        self.seed(seed)
+
+    @property
+    def stream(self) -> tuple[int]:
+        return self._stream
+
+    def seed(self, seed: object = None):
+        seed_seq = np.random.SeedSequence(None if seed is None else entropy(seed), spawn_key=self._stream)
+        self._key0, self._key1 = seed_seq.generate_state(2, np.uint64).tolist()
+        self._position = 0
+
+    def getstate(self) -> CounterState:
+        return CounterState(self._key0, self._key1, self._position, self._stream)
+
+    def setstate(self, state: CounterState):
+        if (state.key0, state.key1) != (self._key0, self._key1):
+            self._block_idx = -1
+        self._key0, self._key1, self._position, self._stream = state.key0, state.key1, state.position, tuple(state.stream)
+
+    def spawn(self, n: int) -> list['CounterRNG']:
+        # Independent child streams, keyed from this stream's current key
+        children = []
+        for i in range(n):
+            child = CounterRNG.__new__(CounterRNG)
+            child._stream = self._stream + (i,)
+            child._block = None
+            child._block_idx = -1
+            seed_seq = np.random.SeedSequence([self._key0, self._key1], spawn_key=child._stream)
+            child._key0, child._key1 = seed_seq.generate_state(2, np.uint64).tolist()
+            child._position = 0
+            children.append(child)
+        return children
+
+    def jumped(self, jumps: int = 1) -> 'CounterRNG':
+        # Same key, non overlapping stretch of the stream
+        rng = self.fork()
+        rng._position += jumps * JUMP
+        return rng
+
+    def fork(self) -> 'CounterRNG':
+        rng = CounterRNG.__new__(CounterRNG)
+        rng._stream = self._stream
+        rng._key0, rng._key1, rng._position = self._key0, self._key1, self._position
+        rng._block = self._block
+        rng._block_idx = self._block_idx
+        return rng
+
+    def _raw(self) -> int:
+        block_idx, offset = divmod(self._position, BLOCK)
+        if block_idx != self._block_idx:
+            counter = block_idx * (BLOCK // 4)
+            bit_generator = np.random.Philox(key=[self._key0, self._key1],
+                                             counter=[(counter >> (64 * i)) & MASK64 for i in range(4)])
+            self._block = bit_generator.random_raw(BLOCK).tolist()
+            self._block_idx = block_idx
+        self._position += 1
+        return self._block[offset]
+
+    def randrange(self, n: int) -> int:
+        # Rejection sampling keeps every value equally likely
+        limit = (1 << 64) - (1 << 64) % n
+        x = self._raw()
+        while x >= limit:
+            x = self._raw()
+        return x % n
+
+    def randint(self, a: int, b: int) -> int:
+        return a + self.randrange(b - a + 1)
+
+    def choice(self, seq: list):
+        return seq[self.randrange(len(seq))]
+
+    def shuffle(self, x: list):
+        for i in reversed(range(1, len(x))):
+            j = self.randrange(i + 1)
+            x[i], x[j] = x[j], x[i]
+
+    def random(self) -> float:
+        return (self._raw() >> 11) * (1.0 / (1 << 53))
+
+def rng_from_state(state: object, rng: object = None) -> object:
+    # rng set to state, replaced by a generator of the right kind if needed
+    if type(state) == CounterState:
+        if type(rng) != CounterRNG:
+            rng = CounterRNG(0)
+    elif type(rng) != random.Random:
+        rng = random.Random(0)
+    rng.setstate(state)
+    return rng
@@ -1,4 +1,9 @@
+from pytan.core.player import PlayerRecord, has_hand, playable, player_label, ROAD_VECTOR, SETTLEMENT_VECTOR, CITY_VECTOR, \
+    DEV_CARD_VECTOR, KNIGHT, MONOPOLY, ROADBUILDER, YEAR_PLENTY, MAX_ROADS, MAX_SETTLEMENTS, MAX_CITIES
 from enum import Enum
+from collections import namedtuple
+from collections.abc import Callable
+from functools import partial, wraps
 
 class GameStates(Enum):
     UNDEFINED = 'UNDEFINED'
@@ -13,269 +18,319 @@ class GameStates(Enum):
     ROADBUILDER = 'ROADBUILDER'
     GAME_OVER = 'GAME_OVER'
 
+# The rule state of a game as immutable values, stepped by pytan.core.reducer.
+# Lists are tuples, the bank counts are in RESOURCES order and nodes and edges
+# hold the pieces in topology order as in Board.get_state. Records are never
+# modified, games, undo tokens and threads share them without copies.
+# The last three fields are indexes of the pieces the reducer keeps up to date
+# on every build: production holds the Productions of each dice roll in the
+# order of a tile scan, robber or not, road_components the road components and
+# their longest trails and ports the port types of each player slot.
+GameRecord = namedtuple('GameRecord', ['layout', 'state', 'points_to_win', 'starting_player_idx', 'current_player_idx',
+                                       'current_roll', 'last_roll', 'has_rolled', 'knight_played_this_turn', 'free_roads',
+                                       'longest_road', 'largest_army', 'moves_made', 'turn', 'bank', 'dev_cards',
+                                       'discarding_players', 'players_to_steal_from', 'players_accepting_trade', 'players_accepted_trade',
+                                       'give_trade', 'want_trade', 'nodes', 'edges', 'robber', 'players',
+                                       'production', 'road_components', 'ports'])
+
+def player_slot(record: GameRecord, player_id: int) -> int:
+    for slot, player in enumerate(record.players):
+        if player.id == player_id:
+            return slot
+    return None
+
+def current_slot(record: GameRecord) -> int:
+    # Players discarding or answering a trade act before the turn player
+    if record.discarding_players:
+        return player_slot(record, record.discarding_players[0])
+    if record.players_accepting_trade:
+        return player_slot(record, record.players_accepting_trade[0])
+    return record.current_player_idx
+
+def current_player(record: GameRecord) -> PlayerRecord:
+    return record.players[current_slot(record)]
+
+# Phase checks of the actions. Each returns None when the action may go ahead
+# as far as the phase, the hand and the pieces left go, else the reason it may
+# not. An empty reason refuses without saying why. Reasons that depend on the
+# record are lambdas, formatted by reason_text only when they are logged.
+# Placements are checked by the caller, on the board it has at hand.
+Reason = str | Callable[[], str] | None
+
+def reason_text(reason: Reason) -> str:
+    return reason() if callable(reason) else reason
+
+def check_roll(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.INGAME:
+        return lambda: f'Cant pass turn, current state {record.state}'
+    if record.has_rolled:
+        return 'Dice have already been rolled this turn'
+    return None
+
+def check_pass_turn(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.INGAME:
+        return lambda: f'Cant pass turn, current state {record.state}'
+    if not record.has_rolled:
+        return 'Roll first'
+    return None
+
+def check_build_road(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state not in (GameStates.INGAME, GameStates.ROADBUILDER):
+        return lambda: f'Cant build road, current state {record.state}'
+    if record.state != GameStates.ROADBUILDER and not record.has_rolled:
+        return 'Roll first'
+    player = current_player(record)
+    if not (has_hand(player.hand, ROAD_VECTOR) or record.free_roads > 0):
+        return lambda: f'{player_label(player)} cant afford road'
+    if player.roads >= MAX_ROADS:
+        return lambda: f'{player_label(player)} has no roads left'
+    return None
+
+def check_build_settlement(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.INGAME:
+        return lambda: f'Cant build settlement, current state {record.state}'
+    if not record.has_rolled:
+        return 'Roll first'
+    player = current_player(record)
+    if not has_hand(player.hand, SETTLEMENT_VECTOR):
+        return lambda: f'{player_label(player)} cannot afford settlement'
+    if player.settlements >= MAX_SETTLEMENTS:
+        return lambda: f'{player_label(player)} has no settlements left'
+    return None
+
+def check_build_city(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.INGAME:
+        return lambda: f'Cant build city, current state {record.state}'
+    if not record.has_rolled:
+        return 'Roll first'
+    player = current_player(record)
+    if not has_hand(player.hand, CITY_VECTOR):
+        return lambda: f'{player_label(player)} cannot afford city'
+    if player.cities >= MAX_CITIES:
+        return lambda: f'{player_label(player)} has no cities left'
+    if player.settlements <= 0:
+        return lambda: f'{player_label(player)} has no settlements to upgrade'
+    return None
+
+def check_discard(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.DISCARDING:
+        return ''
+    if not record.discarding_players:
+        return 'No players need to discard'
+    return None
+
+def check_move_robber(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.MOVING_ROBBER:
+        return 'Cant move robber'
+    return None
+
+def check_steal(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.STEALING:
+        return 'Cant steal'
+    if not record.players_to_steal_from:
+        return 'No players to steal from'
+    return None
+
+def _check_trade(record: GameRecord, state: GameStates) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != state:
+        return lambda: f'Cant trade, current state {record.state}'
+    if state == GameStates.INGAME and not record.has_rolled:
+        return 'Roll first'
+    return None
+
+def check_trade(record: GameRecord) -> Reason:
+    return _check_trade(record, GameStates.INGAME)
+
+def check_accept_decline_trade(record: GameRecord) -> Reason:
+    return _check_trade(record, GameStates.ACCEPTING_TRADE)
+
+def check_confirm_trade(record: GameRecord) -> Reason:
+    return _check_trade(record, GameStates.CONFIRMING_TRADE)
+
+def check_buy_dev_card(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.INGAME:
+        return lambda: f'Cant buy dev card, current state {record.state}'
+    player = current_player(record)
+    if not has_hand(player.hand, DEV_CARD_VECTOR):
+        return lambda: f'{player_label(player)} could not afford a Dev Card'
+    if not record.has_rolled:
+        return 'Roll first'
+    if not record.dev_cards:
+        return 'No Dev Cards left'
+    return None
+
+def _playable(record: GameRecord, player: PlayerRecord, i: int) -> int:
+    return playable(player.dev_cards, player.new_dev_cards, player.dev_turn, i, record.turn)
+
+def check_play_knight(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.INGAME:
+        return lambda: f'Cant play knight, current state {record.state}'
+    if record.knight_played_this_turn:
+        return 'Knight was already played this turn'
+    player = current_player(record)
+    if _playable(record, player, KNIGHT) <= 0:
+        return lambda: f'{player_label(player)} has no valid knight card'
+    return None
+
+def check_play_monopoly(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.INGAME:
+        return lambda: f'Cant play monopoly, current state {record.state}'
+    player = current_player(record)
+    if _playable(record, player, MONOPOLY) <= 0:
+        return lambda: f'{player_label(player)} has no valid monopoly card'
+    return None
+
+def check_play_road_builder(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.INGAME:
+        return lambda: f'Cant play road builder, current state {record.state}'
+    player = current_player(record)
+    if _playable(record, player, ROADBUILDER) <= 0 or MAX_ROADS - player.roads < 2:
+        return lambda: f'{player_label(player)} has no valid road builder card'
+    return None
+
+def check_play_year_plenty(record: GameRecord) -> Reason:
+    if record.state == GameStates.UNDEFINED:
+        return 'Game has not started'
+    if record.state != GameStates.INGAME:
+        return lambda: f'Cant play plenty, current state {record.state}'
+    player = current_player(record)
+    if _playable(record, player, YEAR_PLENTY) <= 0:
+        return lambda: f'{player_label(player)} has no valid plenty card'
+    return None
+
+def memoized(check: callable) -> callable:
+    # Caches the result against the game version, calls that log run the check
+    # again so the reason still gets logged
+    @wraps(check)
+    def cached_check(self, log=False):
+        if log:
+            return check(self, log)
+        return self._game.cached(check.__name__, partial(check, self))
+    return cached_check
+
 class CatanGameState(object):
+    # The phase checks on the record of a game, with the reasons logged on request
     def __init__(self, game: 'Game'):
-        self._state = GameStates.UNDEFINED
         self._game = game
 
     @property
     def state(self) -> GameStates:
-        return self._state
+        return self._game.record.state
 
     def __eq__(self, other):
-        return self._state == other
-
-    def set_state(self, s: GameStates):
-        self._state = s
+        return self._game.record.state == other
 
     def log(self, text: str, end='\n'):
         self._game.logger.log(text, end=end)
+
+    def _allowed(self, reason: Reason, log: bool) -> bool:
+        if reason and log:
+            self.log(reason_text(reason))
+        return reason is None
     
     def game_has_started(self) -> bool:
-        return self._state != GameStates.UNDEFINED
+        return self._game.record.state != GameStates.UNDEFINED
 
+    @memoized
     def can_build_road(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state in [GameStates.INGAME, GameStates.ROADBUILDER]:
-                if self._state == GameStates.ROADBUILDER or not self.can_roll():
-                    if self._game.current_player.can_buy_road() or self._game.free_roads > 0:
-                        if self._game.current_player.roads_left > 0:
-                            if self._game.legal_road_placements():
-                                return True
-                            elif log:
-                                self.log('No legal road placements')
-                        elif log:
-                            self.log(f'{self._game.current_player} has no roads left')
-                    elif log:
-                        self.log(f'{self._game.current_player} cant afford road')
-                elif log:
-                    self.log('Roll first')
-            elif log:
-                self.log(f'Cant build road, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        reason = check_build_road(self._game.record)
+        if reason is None and not self._game.legal_road_placements():
+            reason = 'No legal road placements'
+        return self._allowed(reason, log)
 
+    @memoized
     def can_build_settlement(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if not self.can_roll():
-                    if self._game.current_player.can_buy_settlement():
-                        if self._game.current_player.settlements_left > 0:
-                            if self._game.legal_settlement_placements():
-                                return True
-                            elif log:
-                                self.log('No legal settlement placements')
-                        elif log:
-                            self.log(f'{self._game.current_player} has no settlements left')
-                    elif log:
-                        self.log(f'{self._game.current_player} cannot afford settlement')
-                elif log:
-                    self.log('Roll first')
-            elif log:
-                self.log(f'Cant build settlement, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        reason = check_build_settlement(self._game.record)
+        if reason is None and not self._game.legal_settlement_placements():
+            reason = 'No legal settlement placements'
+        return self._allowed(reason, log)
 
+    @memoized
     def can_build_city(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if not self.can_roll():
-                    if self._game.current_player.can_buy_city():
-                        if self._game.current_player.cities_left > 0:
-                            if self._game.current_player.settlements > 0:
-                                if self._game.legal_city_placements():
-                                    return True
-                                elif log:
-                                    self.log('No legal city placements')
-                            elif log:
-                                self.log(f'{self._game.current_player} has no settlements to upgrade')
-                        elif log:
-                            self.log(f'{self._game.current_player} has no cities left')
-                    elif log:
-                        self.log(f'{self._game.current_player} cannot afford city')
-                elif log:
-                    self.log('Roll first')
-            elif log:
-                self.log(f'Cant build city, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        reason = check_build_city(self._game.record)
+        if reason is None and not self._game.legal_city_placements():
+            reason = 'No legal city placements'
+        return self._allowed(reason, log)
 
+    @memoized
     def can_roll(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if not self._game.has_rolled:
-                    return True
-                elif log:
-                    self.log('Dice have already been rolled this turn')
-            elif log:
-                self.log(f'Cant pass turn, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
+        return self._allowed(check_roll(self._game.record), log)
 
+    @memoized
     def can_pass_turn(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if self._game.has_rolled:
-                    return True
-                elif log:
-                    self.log('Roll first')
-            elif log:
-                self.log(f'Cant pass turn, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_pass_turn(self._game.record), log)
 
+    @memoized
     def can_discard(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.DISCARDING:
-                if self._game.discarding_players:
-                    return True
-                elif log:
-                    self.log('No players need to discard')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_discard(self._game.record), log)
 
+    @memoized
     def can_steal(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.STEALING:
-                if self._game.players_to_steal_from:
-                    return True
-                elif log:
-                    self.log('No players to steal from')
-            elif log:
-                self.log('Cant steal')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_steal(self._game.record), log)
 
+    @memoized
     def can_trade(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if not self.can_roll():
-                    return True
-                elif log:
-                    self.log('Roll first')
-            elif log:
-                self.log(f'Cant trade, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_trade(self._game.record), log)
 
+    @memoized
     def can_accept_decline_trade(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.ACCEPTING_TRADE:
-                if not self.can_roll():
-                    return True
-                elif log:
-                    self.log('Roll first')
-            elif log:
-                self.log(f'Cant trade, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_accept_decline_trade(self._game.record), log)
     
+    @memoized
     def can_confirm_trade(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.CONFIRMING_TRADE:
-                if not self.can_roll():
-                    return True
-                elif log:
-                    self.log('Roll first')
-            elif log:
-                self.log(f'Cant trade, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_confirm_trade(self._game.record), log)
 
+    @memoized
     def can_buy_dev_card(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if self._game.current_player.can_buy_dev_card():
-                    if not self.can_roll():
-                        if self._game.n_dev_cards > 0:
-                            return True
-                        elif log:
-                            self.log('No Dev Cards left')
-                    elif log:
-                        self.log('Roll first')
-                elif log:
-                    self.log(f'{self._game.current_player} could not afford a Dev Card')
-            elif log:
-                self.log(f'Cant buy dev card, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_buy_dev_card(self._game.record), log)
 
     def is_moving_robber(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.MOVING_ROBBER:
-                return True
-            elif log:
-                self.log('Cant move robber')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_move_robber(self._game.record), log)
 
+    @memoized
     def can_play_knight(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if not self._game.knight_played_this_turn:
-                    if self._game.current_player.can_play_knight(self._game.turn):
-                        return True
-                    elif log:
-                        self.log(f'{self._game.current_player} has no valid knight card')
-                elif log:
-                    self.log(f'Knight was already played this turn')
-            elif log:
-                self.log(f'Cant play knight, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_play_knight(self._game.record), log)
     
+    @memoized
     def can_play_monopoly(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if self._game.current_player.can_play_monopoly(self._game.turn):
-                    return True
-                elif log:
-                    self.log(f'{self._game.current_player} has no valid monopoly card')
-            elif log:
-                self.log(f'Cant play monopoly, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_play_monopoly(self._game.record), log)
 
+    @memoized
     def can_play_road_builder(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if self._game.current_player.can_play_road_builder(self._game.turn):
-                    if len(self._game.legal_road_placements()) >= 2:
-                        return True
-                elif log:
-                    self.log(f'{self._game.current_player} has no valid road builder card')
-            elif log:
-                self.log(f'Cant play road builder, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
-
+        reason = check_play_road_builder(self._game.record)
+        if reason is None and len(self._game.legal_road_placements()) < 2:
+            reason = ''
+        return self._allowed(reason, log)
 
+    @memoized
     def can_play_year_plenty(self, log=False) -> bool:
-        if self.game_has_started():
-            if self._state == GameStates.INGAME:
-                if self._game.current_player.can_play_plenty(self._game.turn):
-                    return True
-                elif log:
-                    self.log(f'{self._game.current_player} has no valid plenty card')
-            elif log:
-                self.log(f'Cant play plenty, current state {self._state}')
-        elif log:
-            self.log('Game has not started')
-        return False
+        return self._allowed(check_play_year_plenty(self._game.record), log)
 
     def __repr__(self):
-        return self._state.value
+        return self.state.value
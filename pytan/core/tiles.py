@@ -55,6 +55,27 @@ PROB_TO_PROD = {
     12: 1
 }
 
+def scale_counts(counts: dict, total: int) -> dict:
+    # Apportion total proportionally to counts, leftovers go to the largest remainders
+    base = sum(counts.values())
+    quotas = {key: count * total / base for key, count in counts.items()}
+    scaled = {key: int(quota) for key, quota in quotas.items()}
+    leftover = total - sum(scaled.values())
+    for key in sorted(quotas, key=lambda k: quotas[k] - scaled[k], reverse=True)[:leftover]:
+        scaled[key] += 1
+    return scaled
+
+def tile_counts(n_tiles: int) -> dict[TileTypes, int]:
+    # TILE_COUNTS scaled to n_tiles, always keeping at least one desert for the robber
+    deserts = max(1, round(n_tiles * TILE_COUNTS[TileTypes.DESERT] / sum(TILE_COUNTS.values())))
+    resources = {tile: count for tile, count in TILE_COUNTS.items() if tile != TileTypes.DESERT}
+    counts = scale_counts(resources, n_tiles - deserts)
+    counts[TileTypes.DESERT] = deserts
+    return counts
+
+def prob_counts(n_tiles: int) -> dict[int, int]:
+    return scale_counts(PROB_COUNTS, n_tiles)
+
 CatanTile = namedtuple('CatanTile', ['coord', 'prob', 'tile_type', 'prod_points'])
 
 def create_tile(coord: int, prob: int, tile_type: TileTypes, prod_points: int):
@@ -0,0 +1,93 @@
+from pytan.core import hexmesh
+from pytan.core.cards import ResourceCards, DevCards, RESOURCE_CARD_COUNTS, DEV_CARD_COUNTS
+from pytan.core.piece import Piece, PieceTypes
+from pytan.core.state import GameStates
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+
+# 64 bit Zobrist keys, a position hash is the XOR of the keys of everything in it.
+# Counts of zero have a zero key so missing and zero dict entries hash the same.
+ZOBRIST_SEED = 0x5EED
+MAX_PLAYERS = 4
+MAX_FREE_ROADS = 2
+
+RESOURCE_IDX = {card: i for i, card in enumerate(ResourceCards)}
+DEV_CARD_IDX = {card: i for i, card in enumerate(DevCards)}
+STATE_IDX = {state: i for i, state in enumerate(GameStates)}
+N_CARDS = sum(RESOURCE_CARD_COUNTS.values()) + 1
+N_DEV_CARDS = sum(DEV_CARD_COUNTS.values()) + 1
+
+ZobristKeys = namedtuple('ZobristKeys', ['nodes', 'edges', 'robber', 'hands', 'dev_cards', 'new_dev_cards', 'bank', 'turn'])
+
+@lru_cache(maxsize=None)
+def zobrist_keys(n_layers: int) -> ZobristKeys:
+    # Board keys by coordinate, the rest by player slot, card and count
+    topology = hexmesh.get_topology(n_layers)
+    rng = np.random.default_rng([ZOBRIST_SEED, n_layers])
+    def keys(*shape: int, zero_counts: bool = False) -> list:
+        table = rng.integers(0, 1 << 64, size=shape, dtype=np.uint64, endpoint=False)
+        if zero_counts:
+            table[..., 0] = 0
+        return table.tolist()
+    return ZobristKeys(
+        dict(zip(topology.nodes, keys(topology.n_nodes, MAX_PLAYERS, len(PieceTypes)))),
+        dict(zip(topology.edges, keys(topology.n_edges, MAX_PLAYERS))),
+        dict(zip(topology.tiles, keys(len(topology.tiles)))),
+        keys(MAX_PLAYERS, len(ResourceCards), N_CARDS, zero_counts=True),
+        keys(MAX_PLAYERS, len(DevCards), N_DEV_CARDS, zero_counts=True),
+        keys(MAX_PLAYERS, len(DevCards), N_DEV_CARDS, zero_counts=True),
+        keys(len(ResourceCards), N_CARDS),
+        keys(MAX_PLAYERS, len(GameStates), 2, 2, MAX_FREE_ROADS + 1)
+    )
+
+def piece_hash(keys: ZobristKeys, piece: Piece, slot: int) -> int:
+    if piece.piece_type == PieceTypes.ROAD:
+        return keys.edges[piece.coord][slot]
+    return keys.nodes[piece.coord][slot][piece.piece_type.value]
+
+def robber_hash(keys: ZobristKeys, robber: Piece) -> int:
+    return keys.robber[robber.coord] if robber else 0
+
+def player_hash(keys: ZobristKeys, slot: int, resource_cards: dict, dev_cards: list, turn: int) -> int:
+    # Hand and held dev cards, cards bought this turn are not playable yet
+    h = 0
+    hand = keys.hands[slot]
+    for card, n in resource_cards.items():
+        h ^= hand[RESOURCE_IDX[card]][n]
+    if dev_cards:
+        counts = [0] * len(DevCards)
+        new_counts = [0] * len(DevCards)
+        for card, t in dev_cards:
+            if t < turn:
+                counts[DEV_CARD_IDX[card]] += 1
+            else:
+                new_counts[DEV_CARD_IDX[card]] += 1
+        for i, n in enumerate(counts):
+            h ^= keys.dev_cards[slot][i][n] ^ keys.new_dev_cards[slot][i][new_counts[i]]
+    return h
+
+def bank_hash(keys: ZobristKeys, resource_card_counts: dict) -> int:
+    h = 0
+    for card, n in resource_card_counts.items():
+        h ^= keys.bank[RESOURCE_IDX[card]][n]
+    return h
+
+def turn_hash(keys: ZobristKeys, current_player_idx: int, state: GameStates, has_rolled: bool, knight_played: bool, free_roads: int) -> int:
+    return keys.turn[current_player_idx][STATE_IDX[state]][has_rolled][knight_played][free_roads]
+
+def position_hash(state: dict) -> int:
+    # From scratch over a Game.get_state() dict
+    board = state['board']
+    keys = zobrist_keys(board['layout'].n_layers)
+    slots = {player['id']: i for i, player in enumerate(state['players'])}
+    h = robber_hash(keys, board['robber'])
+    for piece in board['nodes'] + board['edges']:
+        if piece is not None:
+            h ^= piece_hash(keys, piece, slots[piece.owner_id])
+    for slot, player in enumerate(state['players']):
+        h ^= player_hash(keys, slot, player['resource_cards'], player['dev_cards'], state['turn'])
+    h ^= bank_hash(keys, state['resource_card_counts'])
+    h ^= turn_hash(keys, state['current_player_idx'], state['state'], state['has_rolled'],
+                   state['knight_played_this_turn'], state['free_roads'])
+    return h
@@ -129,13 +129,39 @@ class Logger(object):
     def restore(self, state: dict):
         self.console_log = state['console_log']
         self.raw_log = state['raw_log']
-        self.log_path = state['log_path']
+        self._log_path = state['log_path']
         self._all_logs = state['all_logs'].copy()
         self._raw_logs = state['raw_logs'].copy()
         self._start = state['start']
 
+    def fork(self) -> 'Logger':
+        # Copy that skips the log directory setup of __init__
+        logger = Logger.__new__(Logger)
+        logger.__dict__.update(self.__dict__)
+        logger._all_logs = self._all_logs.copy()
+        logger._raw_logs = self._raw_logs.copy()
+        return logger
+
     @staticmethod
     def create_from_state(state: dict) -> 'Logger':
         logger = Logger()
         logger.restore(state)
-        return logger
\ No newline at end of file
+        return logger
+
+class NullLogger(Logger):
+    # Drops every entry, for running the game rules without keeping a record
+    def __init__(self):
+        self.reset()
+        self._log_path = None
+        self.log_file = None
+        self.log_file_path = None
+        self.console_log = False
+        self.raw_log = False
+
+    def log(self, text: str, end: str = '\n'):
+        pass
+
+    def log_action(self, function: str, *params: tuple):
+        pass
+
+NULL_LOGGER = NullLogger()
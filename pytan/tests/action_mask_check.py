@@ -0,0 +1,74 @@
+from pytan.ai.env import CatanEnv
+from pytan.ai.agents import RandomAgent, GreedyAgent
+from pytan.ai.actions import MAX_DISCARD
+from pytan.core.player import Player
+from pytan.core.cards import ResourceCards
+from pytan.core.state import GameStates
+import numpy as np
+import random
+
+def make_env(agent_type: type = RandomAgent, **kwargs) -> CatanEnv:
+    agents = [agent_type(Player(f'P{i}', i, color)) for i, color in enumerate(['red', 'blue', 'white', 'orange'])]
+    return CatanEnv(agents, lean=True, **kwargs)
+
+def normalized(action: tuple) -> tuple:
+    function, args = action
+    if function == 'discard':
+        return (function, tuple(sorted((card.value, n) for card, n in args[0])))
+    return (function, repr(args))
+
+def check_mask(env: CatanEnv):
+    # The ids of the mask are exactly the tuples of legal_actions
+    from_mask = {normalized(env.action(i)) for i in np.flatnonzero(env.legal_action_mask())}
+    from_list = {normalized(action) for action in env.legal_actions}
+    assert from_mask == from_list, (env.game.state, from_mask ^ from_list)
+
+def playout(agent_type: type, seed: int, max_turns: int = 300) -> int:
+    random.seed(seed)
+    env = make_env(agent_type, discard_limit=8 if seed % 2 else None, sample_discards=seed % 4 == 3)
+    env.reset()
+    steps = 0
+    while not env.game.is_over and env.game.turn < max_turns:
+        check_mask(env)
+        if seed % 2:
+            env.step(int(random.choice(np.flatnonzero(env.legal_action_mask()))))
+        else:
+            env.step(env.current_player.choose_action(env))
+        steps += 1
+    return steps
+
+def big_hand_seven(**kwargs) -> CatanEnv:
+    # Everyone holds 45 cards when a seven is rolled
+    random.seed(0)
+    env = make_env(**kwargs)
+    env.reset()
+    while not env.game.state.can_roll():
+        env.step(env.current_player.choose_action(env))
+    state = env.game.get_state()
+    for player in state['players']:
+        player['resource_cards'] = {card: 9 for card in ResourceCards}
+    env.game.restore(state)
+    env.game.roll(7)
+    assert env.game.state == GameStates.DISCARDING
+    return env
+
+def check_big_hands():
+    for kwargs in [{}, {'discard_limit': 5}, {'discard_limit': 5, 'sample_discards': True}]:
+        env = big_hand_seven(**kwargs)
+        while env.game.state == GameStates.DISCARDING:
+            check_mask(env)
+            for _, [discard] in env.legal_actions:
+                assert sum(n for _, n in discard) == MAX_DISCARD, discard
+            if 'discard_limit' in kwargs:
+                assert len(env.legal_actions) <= kwargs['discard_limit']
+            player = env.game.current_player
+            env.step(int(np.flatnonzero(env.legal_action_mask())[0]))
+            assert player.n_resource_cards == 45 - MAX_DISCARD
+
+if __name__ == '__main__':
+    for agent_type in [RandomAgent, GreedyAgent]:
+        for seed in range(4):
+            steps = playout(agent_type, seed)
+            print(f'{agent_type.__name__} seed {seed}: mask matched legal_actions on {steps} steps')
+    check_big_hands()
+    print(f'45 card hands discard {MAX_DISCARD} cards, as ids and as tuples')
@@ -0,0 +1,103 @@
+from pytan.core.game import Game
+from pytan.core.player import Player
+from pytan.core.state import GameStates
+from pytan.core.batch import BatchGame
+import numpy as np
+import time
+
+FIELDS = ['hands', 'bank', 'node_owners', 'node_types', 'edge_owners', 'robber', 'phase', 'current_player',
+          'has_rolled', 'current_roll', 'turn', 'roads', 'settlements', 'cities', 'longest_road_chains',
+          'longest_road', 'discarding', 'victims']
+
+def new_games(n_games: int, n_players: int, seed: int) -> list[Game]:
+    games = []
+    for s in np.random.default_rng(seed).random(n_games).tolist():
+        players = [Player(f'P{i}', i, color) for i, color in enumerate(['red', 'blue', 'white', 'orange'][:n_players])]
+        game = Game(players=players, seed=s, lean=True)
+        game.start_game()
+        games.append(game)
+    return games
+
+def game_mask(batch: BatchGame, i: int, game: Game) -> np.ndarray:
+    # What Game itself accepts, in the action ids of the batch
+    layout = batch.action_layout
+    topology = batch.topology
+    state = game.state
+    mask = np.zeros(layout.size, dtype=bool)
+    mask[layout.roll] = bool(state.can_roll())
+    mask[layout.pass_turn] = state.can_pass_turn()
+    mask[layout.discard] = state.can_discard()
+    if state.can_build_road() or state == GameStates.STARTING_ROAD:
+        # Starting roads are offered on every edge of the settlement, built ones fail
+        for coord in game.legal_road_placements():
+            if game.board.edges[coord] is None:
+                mask[layout.road + topology.edge_index[coord]] = True
+    if state.can_build_settlement() or state == GameStates.STARTING_SETTLEMENT:
+        for coord in game.legal_settlement_placements():
+            mask[layout.settlement + topology.node_index[coord]] = True
+    if state.can_build_city():
+        for coord in game.legal_city_placements():
+            mask[layout.city + topology.node_index[coord]] = True
+    if state.is_moving_robber():
+        for coord in game.board.legal_robber_placements():
+            mask[layout.robber + topology.tile_index[coord]] = True
+    if state.can_steal():
+        for player in game.players_to_steal_from:
+            mask[layout.steal + game.players.index(player)] = True
+    return mask
+
+def check_lockstep(n_games: int, n_players: int, seed: int, max_steps: int = 5000) -> int:
+    # Both engines get the same actions, dice, discards and stolen cards
+    games = new_games(n_games, n_players, seed)
+    batch = BatchGame.create_from_states([game.get_state() for game in games], seed=seed)
+    rng = np.random.default_rng(seed)
+    steps = 0
+    while not batch.is_over.all() and steps < max_steps:
+        mask = batch.legal_mask()
+        for i, game in enumerate(games):
+            assert (mask[i] == game_mask(batch, i, game)).all(), f'seed {seed} step {steps} game {i} legality'
+        actions = np.where(mask.any(1), (rng.random(mask.shape) * mask).argmax(1), -1)
+        dice = rng.integers(1, 7, size=(n_games, 2)).sum(1)
+        discards = np.zeros((n_games, 5), dtype=np.int16)
+        stolen = np.zeros(n_games, dtype=np.intp)
+        current = batch.current_player
+        for i, game in enumerate(games):
+            a = actions[i]
+            if a == batch.action_layout.discard:
+                hand = batch.hands[i, current[i]]
+                cards = rng.choice(np.repeat(np.arange(5), hand), hand.sum() // 2, replace=False)
+                discards[i] = np.bincount(cards, minlength=5)
+            if a < 0:
+                continue
+            function, args = batch.game_action(i, a, discards[i])
+            if function == 'roll':
+                args = [int(dice[i])]
+            before = game.current_turn_player.hand
+            getattr(game, function)(*args)
+            if function == 'steal':
+                stolen[i] = np.flatnonzero(np.subtract(game.current_turn_player.hand, before))[0]
+        assert batch.step(actions, dice, discards, stolen)[actions >= 0].all(), f'seed {seed} step {steps} rejected'
+        fresh = BatchGame.create_from_states([game.get_state() for game in games])
+        for field in FIELDS:
+            assert (getattr(batch, field) == getattr(fresh, field)).all(), f'seed {seed} step {steps} {field}'
+        steps += 1
+    return steps
+
+def benchmark(n_games: int, n_players: int, n_steps: int = 200):
+    games = new_games(n_games, n_players, 0)
+    batch = BatchGame.create_from_states([game.get_state() for game in games], seed=0)
+    rng = np.random.default_rng(0)
+    t = time.perf_counter()
+    for _ in range(n_steps):
+        mask = batch.legal_mask()
+        batch.step(np.where(mask.any(1), (rng.random(mask.shape) * mask).argmax(1), -1))
+    t = time.perf_counter() - t
+    print(f'{n_games:>5} games: {n_games * n_steps / t:>9.0f} game steps/s')
+
+if __name__ == '__main__':
+    for seed in range(4):
+        n_players = 2 + seed % 3
+        steps = check_lockstep(24, n_players, seed)
+        print(f'seed {seed} players {n_players}: {steps} lockstep steps matched')
+    for n_games in [1, 16, 256, 1024]:
+        benchmark(n_games, 4)
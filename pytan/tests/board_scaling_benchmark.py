@@ -0,0 +1,88 @@
+from pytan.core.board import Board
+from pytan.core.arrayboard import ArrayBoard
+from pytan.core.bitboard import BitBoard
+from pytan.core.player import Player
+from pytan.core.piece import Piece
+from pytan.core.longestroad import road_components, longest_road_chain
+from pytan.core import reducer
+import random
+import time
+
+LAYERS = [2, 3, 4, 6, 8, 10, 12]
+
+def populate(board: Board, players: list[Player], rng: random.Random):
+    # Settlements scale with the board, each one followed by a short run of roads
+    n_settlements = max(2, board.topology.n_tiles // 10)
+    for _ in range(n_settlements):
+        for player in players:
+            placements = sorted(board.legal_starting_settlement_placements(player.id))
+            if not placements:
+                return
+            board.build_settlement(rng.choice(placements), player)
+            for _ in range(3):
+                roads = sorted(board.legal_road_placements(player.id))
+                if roads:
+                    board.build_road(rng.choice(roads), player)
+
+def per_call(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+def bench(board_type: type, n_layers: int, repeats: int = 20):
+    players = [Player(f'P{i}', i, color) for i, color in enumerate(['red', 'blue', 'white', 'orange'])]
+    board = board_type(seed=1, n_layers=n_layers)
+    populate(board, players, random.Random(n_layers))
+
+    def legal_placements():
+        for player in players:
+            board.legal_road_placements(player.id)
+            board.legal_settlement_placements(player.id)
+            board.legal_city_placements(player.id)
+
+    state = board.get_state()
+    topology = board.topology
+    print(f'{n_layers:>6} {topology.n_tiles:>6} {topology.n_nodes:>6} {topology.n_edges:>6} {len(board.occupied_nodes):>6} {len(board.occupied_edges):>6}'
+          f' {per_call(legal_placements, repeats):>10.1f}'
+          f' {per_call(board.get_state, repeats):>10.1f}'
+          f' {per_call(lambda: board_type.create_from_state(state), repeats):>10.1f}')
+
+def bench_rules(n_layers: int, repeats: int = 20):
+    # The indexes of the game record the rules read, independent of the board backend
+    players = [Player(f'P{i}', i, color) for i, color in enumerate(['red', 'blue', 'white', 'orange'])]
+    board = Board(seed=1, n_layers=n_layers)
+    populate(board, players, random.Random(n_layers))
+    state = board.get_state()
+    record = reducer.new_game(board.layout, board.robber, [player.record() for player in players])
+    record = reducer.indexed(record._replace(nodes=state['nodes'], edges=state['edges']))
+    topology = board.topology
+
+    def roll_distribution():
+        for roll in range(2, 13):
+            reducer.production(record, roll)
+
+    def longest_road():
+        # Full recompute from the player's roads, not the incremental path
+        for player in players:
+            def is_blocked(node: int) -> bool:
+                piece = board.nodes[node]
+                return isinstance(piece, Piece) and piece.owner_id != player.id
+            longest_road_chain(road_components(set(board.friendly_roads(player.id)), topology, is_blocked))
+
+    print(f'{n_layers:>6} {topology.n_tiles:>6} {topology.n_nodes:>6} {topology.n_edges:>6}'
+          f' {per_call(roll_distribution, repeats):>10.1f}'
+          f' {per_call(longest_road, repeats):>10.1f}'
+          f' {per_call(lambda: reducer.indexed(record), repeats):>10.1f}')
+
+if __name__ == '__main__':
+    for board_type in [Board, ArrayBoard, BitBoard]:
+        print(f'\n{board_type.__name__} - microseconds per call, legal placements cover all 4 players')
+        print(f'{"layers":>6} {"tiles":>6} {"nodes":>6} {"edges":>6} {"towns":>6} {"roads":>6}'
+              f' {"legal":>10} {"get_state":>10} {"restore":>10}')
+        for n_layers in LAYERS:
+            bench(board_type, n_layers)
+    print('\nGameRecord indexes - microseconds per call, longest road covers all 4 players')
+    print(f'{"layers":>6} {"tiles":>6} {"nodes":>6} {"edges":>6} {"rolls":>10} {"longest":>10} {"indexed":>10}')
+    for n_layers in LAYERS:
+        bench_rules(n_layers)
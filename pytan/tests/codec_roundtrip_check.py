@@ -0,0 +1,161 @@
+from pytan.ai.env import CatanEnv
+from pytan.ai.agents import RandomAgent
+from pytan.core.game import Game
+from pytan.core.player import Player
+from pytan.core.cards import ResourceCards, DevCards
+from pytan.core.codec import encode_state, decode_state, HEADER, DOUBLE, GAME_FIELDS, PRNG_KIND, COUNTER, COUNTER_FIELDS, STREAM_LENGTH, \
+    CODEC_VERSION, _unpack_seed
+from pytan.core.rng import CounterRNG, CounterState
+import pickle
+import random
+import time
+
+def without_logger(state: dict) -> dict:
+    state = state.copy()
+    state.pop('logger')
+    return state
+
+def perturb(state: dict, rng: random.Random) -> dict:
+    # Random hands, dev cards and pending trades so the fuzz covers more than reachable states
+    state = without_logger(state)
+    state['players'] = [p.copy() for p in state['players']]
+    for player in state['players']:
+        cards = list(ResourceCards)
+        rng.shuffle(cards)
+        player['resource_cards'] = {card: rng.randint(0, 30) for card in cards[:rng.randint(0, len(cards))]}
+        player['dev_cards'] = [(rng.choice(list(DevCards)), rng.randint(0, 500)) for _ in range(rng.randint(0, 10))]
+    resources = list(ResourceCards)
+    state['give_trade'] = [(card, rng.randint(1, 9)) for card in rng.sample(resources, rng.randint(0, 5))]
+    state['want_trade'] = [(card, rng.randint(1, 9)) for card in rng.sample(resources, rng.randint(0, 5))]
+    ids = [p['id'] for p in state['players']]
+    state['players_to_steal_from'] = rng.sample(ids, rng.randint(0, len(ids)))
+    state['discarding_players'] = rng.sample(ids, rng.randint(0, len(ids)))
+    return state
+
+def check_roundtrip(state: dict):
+    data = encode_state(state)
+    decoded = decode_state(data)
+    assert decoded == state, [k for k in state if state[k] != decoded.get(k)]
+    for a, b in zip(decoded['players'], state['players']):
+        assert list(a['resource_cards']) == list(b['resource_cards'])
+    assert encode_state(decoded) == data
+
+def fuzz(seed: int, max_steps: int = 2000) -> int:
+    random.seed(seed)
+    rng = random.Random(seed)
+    agents = [RandomAgent(Player(f'P{i}', i, color)) for i, color in enumerate(['red', 'blue', 'white', 'orange'])]
+    env = CatanEnv(agents, lean=True)
+    game = env.game
+    env.reset()
+    steps = 0
+    while not game.is_over and steps < max_steps:
+        state = without_logger(game.get_state())
+        check_roundtrip(state)
+        check_roundtrip(perturb(game.get_state(), rng))
+        if steps % 50 == 0:
+            # A game restored from bytes plays on exactly like the original
+            restored = Game.from_bytes(game.to_bytes(), lean=True)
+            for _ in range(20):
+                if game.is_over:
+                    break
+                action = env.current_player.choose_action(env)
+                env.step(action)
+                function, args = action
+                getattr(restored, function)(*args)
+                assert without_logger(restored.get_state()) == without_logger(game.get_state())
+                steps += 1
+            continue
+        env.step(env.current_player.choose_action(env))
+        steps += 1
+    return steps
+
+def check_seeds():
+    # Seeds that are not doubles still deal the same board after a round trip
+    for seed in [2**60 + 1, -7, 0, 0.25, 'catan', b'\x00catan']:
+        game = Game(seed=seed, lean=True)
+        game.start_game()
+        restored = Game.from_bytes(game.to_bytes(), lean=True)
+        assert restored.board.layout.seed == seed and type(restored.board.layout.seed) == type(seed), seed
+        assert restored.board.layout.tiles == game.board.layout.tiles, seed
+        assert restored.board.layout.ports == game.board.layout.ports, seed
+
+def downgrade(data: bytes, version: int) -> bytes:
+    # The same state in the layout of an older codec version
+    magic, _, n_layers, n_players = HEADER.unpack_from(data)
+    seed, offset = _unpack_seed(data, HEADER.size, CODEC_VERSION)
+    seed_fields = DOUBLE.pack(seed) if version < 3 else data[HEADER.size:offset]
+    rest = data[offset:]
+    prng = GAME_FIELDS.size
+    (kind,) = PRNG_KIND.unpack_from(rest, prng)
+    if kind == COUNTER and version < 4:
+        # Counter states kept no stream path before version 4
+        stream = prng + PRNG_KIND.size + COUNTER_FIELDS.size
+        (length,) = STREAM_LENGTH.unpack_from(rest, stream)
+        rest = rest[:stream] + rest[stream + STREAM_LENGTH.size + 4 * length:]
+    return HEADER.pack(magic, version, n_layers, n_players) + seed_fields + rest
+
+def check_versions():
+    # Every version number decodes its own layout, a layout change without a
+    # version bump fails here. Counter states from before version 4 decode on
+    # the root stream.
+    for rng in [None, CounterRNG(0).spawn(1)[0]]:
+        game = Game(seed=0.25, lean=True, rng=rng)
+        game.start_game()
+        data = game.to_bytes()
+        state = decode_state(data)
+        for version in range(2, CODEC_VERSION + 1):
+            decoded = decode_state(downgrade(data, version))
+            if rng is not None and version < 4:
+                assert decoded['prng'] == CounterState(*state['prng'][:3], ()), version
+                decoded['prng'] = state['prng']
+            assert decoded == state, version
+
+def check_streams():
+    # Forked, restored and decoded games stay on their spawned stream, also
+    # after reseeding, so workers seeded alike keep dealing different games
+    streams = CounterRNG(0).spawn(2)
+    games = [Game(seed=0.5, lean=True, rng=rng) for rng in streams]
+    for game in games:
+        game.start_game()
+    for game in games:
+        copies = [game.fork(), Game.from_bytes(game.to_bytes(), lean=True)]
+        for copy in copies:
+            assert copy._prng.stream == game._prng.stream
+            assert copy.to_bytes() == game.to_bytes()
+        for g in [game] + copies:
+            g.set_seed(0.5, log=False)
+        assert len({g._prng.getstate() for g in [game] + copies}) == 1
+    assert games[0]._prng.getstate() != games[1]._prng.getstate()
+    assert games[0]._prng.random() != games[1]._prng.random()
+
+def benchmark(game: Game, n: int = 2000):
+    state = without_logger(game.get_state())
+    data = encode_state(state)
+    pickled = pickle.dumps(state)
+    timings = {}
+    for name, dumps, loads, blob in [('codec', encode_state, decode_state, data), ('pickle', pickle.dumps, pickle.loads, pickled)]:
+        start = time.perf_counter()
+        for _ in range(n):
+            dumps(state)
+        encode = (time.perf_counter() - start) / n
+        start = time.perf_counter()
+        for _ in range(n):
+            loads(blob)
+        decode = (time.perf_counter() - start) / n
+        timings[name] = (len(blob), encode, decode)
+    for name, (size, encode, decode) in timings.items():
+        print(f'{name:>6}: {size:6d} bytes - encode {encode * 1e6:7.1f} us - decode {decode * 1e6:7.1f} us')
+
+if __name__ == '__main__':
+    for seed in range(5):
+        steps = fuzz(seed)
+        print(f'seed {seed}: {steps} steps round tripped')
+    check_seeds()
+    print('int, float, str and bytes board seeds round tripped')
+    check_versions()
+    print(f'codec versions 2 to {CODEC_VERSION} decoded')
+    check_streams()
+    print('spawned RNG streams survive fork, restore and reseeding')
+    game = Game(lean=True)
+    game.start_game()
+    benchmark(game)
@@ -0,0 +1,78 @@
+from pytan.ai.env import CatanEnv
+from pytan.ai.agents import RandomAgent
+from pytan.core.player import Player
+from pytan.log.logging import Logger
+from types import ModuleType, FunctionType
+import random
+import time
+import sys
+import gc
+
+def deep_size(obj: object, seen: set) -> int:
+    # Bytes held by obj and everything it references, shared objects counted once
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (type, ModuleType, FunctionType)):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        stack.extend(gc.get_referents(o))
+    return size
+
+def play(seed: int, max_turns: int, history_limit: int = None) -> tuple[CatanEnv, list[dict], float]:
+    # Random game that also keeps the full snapshot per action the old history stored
+    random.seed(seed)
+    agents = [RandomAgent(Player(f'P{i}', i, color)) for i, color in enumerate(['red', 'blue', 'white', 'orange'])]
+    env = CatanEnv(agents, logger=Logger(console_log=False), history_limit=history_limit)
+    env.reset()
+    game = env.game
+    # Nobody wins, the game runs until max_turns
+    game.POINTS_TO_WIN = 1000
+    snapshots = [game.get_state()]
+    snapshot_t = 0
+    while not game.is_over and game.turn < max_turns:
+        env.step(env.current_player.choose_action(env))
+        start = time.perf_counter()
+        snapshots.append(game.get_state())
+        snapshot_t += time.perf_counter() - start
+    return env, snapshots, snapshot_t / len(snapshots)
+
+if __name__ == '__main__':
+    for max_turns in [50, 150, 300, 600]:
+        env, snapshots, snapshot_t = play(1, max_turns)
+        game = env.game
+        journal = game.stored_states
+        # Objects the current state refers to are held anyway, only count history
+        live = set()
+        deep_size(game.get_state(), live)
+
+        start = time.perf_counter()
+        undos = 0
+        while game.can_undo:
+            game.undo(update=False)
+            undos += 1
+        undo_t = (time.perf_counter() - start) / undos
+        start = time.perf_counter()
+        while game.can_redo:
+            game.redo(update=False)
+        redo_t = (time.perf_counter() - start) / undos
+
+        snapshot_bytes = deep_size(snapshots, set(live))
+        journal_bytes = deep_size(journal, set(live))
+        print(f'turns: {game.turn:>3} actions: {len(journal):>5} - '
+              f'full snapshots: {snapshot_bytes / 1e6:7.2f}MB - '
+              f'delta journal: {journal_bytes / 1e6:6.2f}MB ({len(journal.keyframes)} keyframes, counter {game.history_nbytes / 1e6:6.2f}MB) - '
+              f'ratio: {snapshot_bytes / journal_bytes:5.1f}x - '
+              f'get_state: {snapshot_t * 1e6:6.1f}us undo: {undo_t * 1e6:6.1f}us redo: {redo_t * 1e6:6.1f}us')
+
+    # Bounded history, only the last history_limit undo steps are kept
+    for history_limit in [None, 1000, 250, 50]:
+        env, _, _ = play(1, 300, history_limit)
+        game = env.game
+        live = set()
+        deep_size(game.get_state(), live)
+        journal_bytes = deep_size(game.stored_states, live)
+        print(f'history_limit: {str(history_limit):>4} - kept: {len(game.stored_states):>5} evicted: {game.stored_states.evicted:>5} - '
+              f'journal: {journal_bytes / 1e6:6.2f}MB counter: {game.history_nbytes / 1e6:6.2f}MB')
@@ -0,0 +1,31 @@
+from pytan.ai.env import CatanEnv
+from pytan.ai.agents import RandomAgent, GreedyAgent
+from pytan.core.player import Player
+from pytan.log.logging import Logger
+import random
+import time
+
+def games_per_second(agent_type: type, lean: bool, n_games: int) -> tuple[float, float]:
+    random.seed(0)
+    agents = [agent_type(Player(f'P{i}', i, color)) for i, color in enumerate(['red', 'blue', 'white', 'orange'])]
+    env = CatanEnv(agents, logger=None if lean else Logger(console_log=False), lean=lean)
+    game = env.game
+    actions = 0
+    start = time.perf_counter()
+    for _ in range(n_games):
+        env.reset()
+        while not game.is_over:
+            env.step(env.current_player.choose_action(env))
+            actions += 1
+    elapsed = time.perf_counter() - start
+    return n_games / elapsed, actions / elapsed
+
+if __name__ == '__main__':
+    for agent_type, n_games in [(RandomAgent, 20), (GreedyAgent, 3)]:
+        print(f'\n{agent_type.__name__} x4, {n_games} games')
+        results = {}
+        for lean in [False, True]:
+            results[lean] = games_per_second(agent_type, lean, n_games)
+            games, actions = results[lean]
+            print(f'lean: {str(lean):>5} - {games:6.2f} games/s - {actions:8.1f} actions/s')
+        print(f'speedup: {results[True][0] / results[False][0]:.2f}x')
@@ -0,0 +1,83 @@
+from pytan.core.board import Board
+from pytan.core.player import Player
+from pytan.core.piece import Piece
+from pytan.core.longestroad import road_components, longest_road_chain, add_road
+import time
+
+def exhaustive_longest_road(board: Board, player_id: int) -> int:
+    # Reference trail search without memoization, explores every trail
+    topology = board.topology
+    roads = set(board.friendly_roads(player_id))
+    best = 0
+    def explore(node: int, used: frozenset, length: int):
+        nonlocal best
+        best = max(best, length)
+        piece = board.nodes[node]
+        if used and isinstance(piece, Piece) and piece.owner_id != player_id:
+            return
+        for edge in topology.node_edges[node]:
+            if edge in roads and edge not in used:
+                n1, n2 = topology.edge_nodes[edge]
+                explore(n2 if n1 == node else n1, used | {edge}, length + 1)
+    for road in roads:
+        for node in topology.edge_nodes[road]:
+            explore(node, frozenset(), 0)
+    return best
+
+def honeycomb(board: Board) -> list[int]:
+    # 15 roads around the three hexes meeting at the center node, the most looped network
+    roads = []
+    for tile in [0x55, 0x57, 0x35]:
+        for edge in board.topology.tile_edges[tile]:
+            if edge not in roads:
+                roads.append(edge)
+    return roads
+
+def snake(board: Board) -> list[int]:
+    roads = [0x55 + 0x01]
+    while len(roads) < 15:
+        for edge in board.topology.edge_edges[roads[-1]]:
+            if edge not in roads and all(edge not in board.topology.edge_edges[r] for r in roads[:-1]):
+                roads.append(edge)
+                break
+    return roads
+
+def bench(name: str, shape, repeats: int = 20):
+    player = Player('bench', 0, 'red')
+    board = Board(seed=1)
+    topology = board.topology
+    roads = shape(board)
+    for road in roads:
+        board.build_road(road, player)
+
+    def is_blocked(node: int) -> bool:
+        piece = board.nodes[node]
+        return isinstance(piece, Piece) and piece.owner_id != player.id
+
+    build_t = 0
+    for _ in range(repeats):
+        components = ()
+        start = time.perf_counter()
+        for road in roads:
+            components = add_road(components, road, topology, is_blocked)
+            longest_road_chain(components)
+        build_t += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        chain = longest_road_chain(road_components(set(roads), topology, is_blocked))
+    rebuild_t = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference = exhaustive_longest_road(board, player.id)
+    reference_t = time.perf_counter() - start
+
+    assert chain == reference
+    print(f'{name:<10} roads: {len(roads):>2} chain: {chain:>2} - '
+          f'incremental per road: {build_t / repeats / len(roads) * 1e6:8.1f}us - '
+          f'full recompute: {rebuild_t / repeats * 1e6:8.1f}us - '
+          f'exhaustive search: {reference_t * 1e6:10.1f}us')
+
+if __name__ == '__main__':
+    bench('snake', snake)
+    bench('honeycomb', honeycomb)
@@ -0,0 +1,36 @@
+from pytan.ai.env import CatanEnv
+from pytan.ai.agents import RandomAgent
+from pytan.core.player import Player
+from pytan.core.zobrist import position_hash
+from pytan.log.logging import Logger
+import random
+
+def check_playout(seed: int, lean: bool) -> int:
+    # The incremental hash must match a from scratch one after every action
+    random.seed(seed)
+    agents = [RandomAgent(Player(f'P{i}', i, color)) for i, color in enumerate(['red', 'blue', 'white', 'orange'])]
+    env = CatanEnv(agents, logger=None if lean else Logger(console_log=False), lean=lean, undoable=True)
+    game = env.game
+    env.reset()
+    steps = 0
+    while not game.is_over:
+        h = game.position_hash
+        assert h == position_hash(game.get_state()), f'seed {seed} step {steps}'
+        action = env.current_player.choose_action(env)
+        if steps % 7 == 0:
+            # Unstepping restores the hash along with the position
+            env.step(action)
+            env.unstep()
+            assert game.position_hash == h, f'seed {seed} step {steps} unstep'
+        env.step(action)
+        steps += 1
+    assert game.position_hash == position_hash(game.get_state())
+    fork = game.fork()
+    assert fork.position_hash == game.position_hash
+    return steps
+
+if __name__ == '__main__':
+    for seed in range(10):
+        for lean in [False, True]:
+            steps = check_playout(seed, lean)
+            print(f'seed {seed} lean {str(lean):>5}: {steps} steps, hash matched')
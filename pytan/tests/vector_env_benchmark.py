@@ -0,0 +1,46 @@
+from pytan.ai.env import CatanEnv
+from pytan.ai.vector_env import VectorCatanEnv
+from pytan.ai.agents import RandomAgent
+from pytan.core.player import Player
+from functools import partial
+import numpy as np
+import time
+
+def make_env(n_players: int) -> CatanEnv:
+    agents = [RandomAgent(Player(f'P{i}', i, color)) for i, color in enumerate(['red', 'blue', 'white', 'orange'][:n_players])]
+    return CatanEnv(agents, lean=True)
+
+def random_actions(rng: np.random.Generator, masks: np.ndarray) -> np.ndarray:
+    return (rng.random(masks.shape) * masks).argmax(1)
+
+def single_steps_per_second(n_steps: int) -> float:
+    # The same policy on one env in process, for reference
+    env = make_env(4)
+    rng = np.random.default_rng(0)
+    env.reset()
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        _, _, done, _ = env.step(int(random_actions(rng, env.legal_action_mask()[None])[0]))
+        if done:
+            env.reset()
+    return n_steps / (time.perf_counter() - start)
+
+def vector_steps_per_second(n_workers: int, n_steps: int) -> tuple[float, int]:
+    envs = VectorCatanEnv([partial(make_env, 4) for _ in range(n_workers)])
+    rng = np.random.default_rng(0)
+    envs.reset(seed=0)
+    games = 0
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        _, _, terminated, _, _ = envs.step(random_actions(rng, envs.legal_action_masks))
+        games += terminated.sum()
+    elapsed = time.perf_counter() - start
+    envs.close()
+    return n_workers * n_steps / elapsed, games
+
+if __name__ == '__main__':
+    n_steps = 2000
+    print(f'in process: {single_steps_per_second(n_steps):8.0f} env steps/s')
+    for n_workers in [1, 2, 4, 8]:
+        steps, games = vector_steps_per_second(n_workers, n_steps)
+        print(f'{n_workers} workers: {steps:8.0f} env steps/s - {games} games finished')
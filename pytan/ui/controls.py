@@ -853,11 +853,11 @@ class TradingFrame(tk.LabelFrame):
                 return
             port = PortTypes(order[give.index(non_zero_give[0])])
             if non_zero_give[0] / 2 == non_zero_want[0]:
-                if self.game.board.is_player_on_port(self.game.current_player.id, port):
+                if self.game.is_player_on_port(self.game.current_player.id, port):
                     self.set_bank()
                     return
             if non_zero_give[0] / 3 == non_zero_want[0]:
-                if self.game.board.is_player_on_port(self.game.current_player.id, PortTypes.ANY):
+                if self.game.is_player_on_port(self.game.current_player.id, PortTypes.ANY):
                     self.set_bank()
                     return
         if self.bank_var.get():